@@ -2,17 +2,41 @@
 # 1) IMPORTACIONES Y CONFIGURACIÓN BÁSICA
 # ============================================================
 import os
+import sys
+import re
+import csv
+import json
+import argparse
+import atexit
 import calendar
 import hashlib
+import mimetypes
+import multiprocessing
+import random
+import shutil
 import sqlite3
 import secrets
+import subprocess
+import tempfile
 import uuid
 from datetime import datetime, date, timedelta
 from typing import Union
 
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import logging
+import queue
+import threading
+import time
+import bisect
+import tracemalloc
+from itertools import islice
+import base64
+import http.client
+import http.server
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs, unquote
+from urllib.request import pathname2url
 
 # tkcalendar para DateEntry (calendario desplegable)
 try:
@@ -28,6 +52,20 @@ try:
 except Exception:
     PANDAS_OK = False
 
+# --- openpyxl opcional: exportación (write_only) y lectura (read_only) de Excel fila por fila ---
+try:
+    import openpyxl
+    OPENPYXL_OK = True
+except Exception:
+    OPENPYXL_OK = False
+
+# --- Pillow opcional: miniaturas de los adjuntos de imagen ---
+try:
+    from PIL import Image
+    PIL_OK = True
+except Exception:
+    PIL_OK = False
+
 # Archivo de base de datos (SQLite)
 ARCHIVO_BD = "mantenimiento_es.db"
 ICONO_APP_ICO = "escudouvm.ico"   # recomendado para Windows
@@ -153,6 +191,23 @@ def aplicar_estilo_global():
                      borderwidth=0)
     estilo.map("Danger.TButton", background=[("active", "#F87171")])
 
+    # Días de calendario según su carga de trabajo (niveles de UMBRALES_CARGA, sección 6.17)
+    for nivel, color in enumerate(COLORES_CARGA):
+        estilo.configure(f"Carga{nivel}.TButton",
+                         font=("Segoe UI", 10, "bold"),
+                         padding=4,
+                         background=color,
+                         foreground=texto,
+                         borderwidth=1)
+        estilo.map(f"Carga{nivel}.TButton",
+                   background=[("active", primario)],
+                   foreground=[("active", "#0B1220")])
+        estilo.configure(f"Carga{nivel}.TLabel",
+                         font=("Segoe UI", 11),
+                         padding=8,
+                         background=color,
+                         foreground=texto)
+
     # Treeview
     estilo.configure("Treeview",
                      background=superficie,
@@ -256,6 +311,21 @@ def crear_usuario(con, usuario: str, contrasena: str, rol: str) -> None:
         )
 
 
+def actualizar_usuario(con, uid: int, usuario: str, rol: str, nueva_contrasena=None) -> None:
+    """Edita nombre y rol (y contraseña si se indica). Lanza sqlite3.IntegrityError si el nombre ya existe."""
+    with con:
+        con.execute("UPDATE usuarios SET usuario=?, rol=? WHERE id=?", (usuario, rol, uid))
+        if nueva_contrasena:
+            sal = secrets.token_hex(16)
+            hash_pwd = crear_hash(nueva_contrasena, sal)
+            con.execute("UPDATE usuarios SET hash_contrasena=?, sal=? WHERE id=?", (hash_pwd, sal, uid))
+
+
+def eliminar_usuario(con, uid: int) -> None:
+    with con:
+        con.execute("DELETE FROM usuarios WHERE id=?", (uid,))
+
+
 def verificar_usuario(con, usuario: str, contrasena: str):
     cur = con.execute(
         "SELECT id, usuario, hash_contrasena, sal, rol FROM usuarios WHERE usuario=?",
@@ -273,11 +343,242 @@ def verificar_usuario(con, usuario: str, contrasena: str):
 # ============================================================
 # 4) INICIALIZACIÓN DE BD (TABLAS, SEED, MIGRACIONES SUAVES)
 # ============================================================
+def abrir_conexion(archivo_bd=ARCHIVO_BD, **kwargs):
+    """Conexión adicional a una BD ya inicializada (hilos de trabajo, servicio HTTP)."""
+    con = sqlite3.connect(archivo_bd, **kwargs)
+    con.execute("PRAGMA foreign_keys = ON;")
+    return con
+
+
+def cerrar_conexion(con) -> None:
+    """Cierra con PRAGMA optimize: SQLite analiza lo que las consultas de esta conexión echaron en falta."""
+    try:
+        con.execute("PRAGMA optimize;")
+    except sqlite3.Error as e:
+        logging.debug("PRAGMA optimize al cerrar: %s", e)
+    con.close()
+
+
+# Tablas registradas en el diario de cambios -> su clave primaria
+TABLAS_CON_DIARIO = {
+    "equipos": "id_equipo",
+    "mantenimientos": "id_mantenimiento",
+    "historicos": "id_historico",
+    "usuarios": "id",
+}
+
+
+def crear_triggers_diario(con, tabla: str, pk: str) -> None:
+    """Triggers que anotan en `cambios` cada alta, edición y baja de `tabla`.
+
+    Si un UPDATE cambia la clave primaria se anota la baja de la clave vieja y la edición de la nueva.
+    """
+    con.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_diario_i AFTER INSERT ON {tabla}
+        BEGIN
+            INSERT INTO cambios(tabla, clave, operacion) VALUES('{tabla}', NEW.{pk}, 'I');
+        END;
+    """)
+    con.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_diario_u AFTER UPDATE ON {tabla}
+        BEGIN
+            INSERT INTO cambios(tabla, clave, operacion)
+            SELECT '{tabla}', OLD.{pk}, 'D' WHERE OLD.{pk} IS NOT NEW.{pk};
+            INSERT INTO cambios(tabla, clave, operacion) VALUES('{tabla}', NEW.{pk}, 'U');
+        END;
+    """)
+    con.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_diario_d AFTER DELETE ON {tabla}
+        BEGIN
+            INSERT INTO cambios(tabla, clave, operacion) VALUES('{tabla}', OLD.{pk}, 'D');
+        END;
+    """)
+
+
+# mantenimientos e históricos: clave entera `id` (alias del rowid) y el ID público de texto como UNIQUE.
+# {nombre} deja crear con la misma definición la tabla nueva de migrar_clave_entera().
+DDL_TABLAS_CLAVE_ENTERA = {
+    "mantenimientos": """
+        CREATE TABLE IF NOT EXISTS {nombre}(
+            id INTEGER PRIMARY KEY,
+            id_mantenimiento TEXT NOT NULL UNIQUE,
+            equipo_id TEXT NOT NULL,
+            fecha TEXT NOT NULL,
+            tipo TEXT CHECK(tipo IN ('Preventivo','Correctivo')) NOT NULL,
+            notas TEXT,
+            estado TEXT CHECK(estado IN ('Pendiente','Completado')) NOT NULL DEFAULT 'Pendiente',
+            proveedor TEXT,
+            costo REAL DEFAULT 0,
+            creado_por INTEGER,
+            registrado_en TEXT,
+            FOREIGN KEY(equipo_id) REFERENCES equipos(id_equipo) ON DELETE CASCADE ON UPDATE CASCADE,
+            FOREIGN KEY(creado_por) REFERENCES usuarios(id) ON DELETE SET NULL
+        );
+    """,
+    "historicos": """
+        CREATE TABLE IF NOT EXISTS {nombre}(
+            id INTEGER PRIMARY KEY,
+            id_historico TEXT NOT NULL UNIQUE,
+            id_mantenimiento TEXT,
+            equipo_id TEXT,
+            fecha TEXT,
+            tipo TEXT,
+            notas TEXT,
+            estado TEXT,
+            proveedor TEXT,
+            costo REAL,
+            creado_por INTEGER,
+            registrado_en TEXT
+        );
+    """,
+}
+
+# Índices secundarios de esas tablas. Todos llevan implícito `id` al final: es el desempate del
+# orden (fecha DESC, id DESC) de las listas y de la paginación por llave.
+INDICES_CLAVE_ENTERA = {
+    "mantenimientos": (
+        # orden de la lista, archivado y alertas por rango de fechas
+        "CREATE INDEX IF NOT EXISTS idx_mantenimientos_fecha ON mantenimientos(fecha);",
+        # último mantenimiento de un equipo, alertas por equipo y el ON DELETE/UPDATE CASCADE de equipos
+        "CREATE INDEX IF NOT EXISTS idx_mantenimientos_equipo ON mantenimientos(equipo_id, fecha);",
+    ),
+    "historicos": (
+        # consultar históricos por periodo y paginar por (fecha, id)
+        "CREATE INDEX IF NOT EXISTS idx_historicos_fecha ON historicos(fecha);",
+        # ¿ya se archivó este mantenimiento? (la generación de planes no debe recrearlo)
+        "CREATE INDEX IF NOT EXISTS idx_historicos_mantenimiento ON historicos(id_mantenimiento);",
+        # línea de tiempo de un equipo (rama de históricos del UNION ALL, sección 6.16)
+        "CREATE INDEX IF NOT EXISTS idx_historicos_equipo ON historicos(equipo_id, fecha);",
+    ),
+}
+LOTE_MIGRACION_CLAVES = 5000   # filas por transacción al copiar a la tabla con clave entera
+MIGRACION_CADUCA_S = 120        # sin señales del proceso que migra en este tiempo, otro la retoma
+ESPERA_MIGRACION_S = 0.5        # sondeo de los demás procesos mientras otro migra
+
+
+def tiene_clave_entera(con, tabla: str) -> bool:
+    return any(c[1] == "id" and c[5] for c in con.execute(f"PRAGMA table_info({tabla});"))
+
+
+def _reclamar_migracion(con, tabla: str, ficha: str):
+    """Bajo BEGIN IMMEDIATE: 'hecha' si ya está migrada, True si esta conexión se queda con la
+    migración (ajuste 'migracion:<tabla>'), False si otro proceso la lleva y sigue vivo."""
+    try:
+        con.execute("BEGIN IMMEDIATE;")
+    except sqlite3.OperationalError as e:
+        if _es_ocupado(e):   # el que migra está en su transacción final
+            return False
+        raise
+    try:
+        if tiene_clave_entera(con, tabla):
+            reclamada = "hecha"
+        else:
+            marca = json.loads(_ajuste_en(con, "main", f"migracion:{tabla}") or "null")
+            reclamada = not marca or time.time() - marca["latido"] >= MIGRACION_CADUCA_S
+        if reclamada is True:
+            nueva = f"{tabla}_clave_entera"
+            con.execute(f"DROP TABLE IF EXISTS {nueva};")  # restos de una migración interrumpida
+            con.execute(DDL_TABLAS_CLAVE_ENTERA[tabla].format(nombre=nueva))
+            _poner_ajuste_en(con, "main", f"migracion:{tabla}", json.dumps({"ficha": ficha, "latido": time.time()}))
+        con.execute("COMMIT;")
+    except BaseException:
+        con.execute("ROLLBACK;")
+        raise
+    return reclamada
+
+
+def _latido_migracion(con, tabla: str, ficha: str) -> None:
+    """Dentro de la transacción de un lote: renueva la marca o falla si otro proceso la retomó."""
+    marca = json.loads(_ajuste_en(con, "main", f"migracion:{tabla}") or "null")
+    if not marca or marca["ficha"] != ficha:
+        raise sqlite3.OperationalError(f"Otro proceso retomó la migración de {tabla}.")
+    _poner_ajuste_en(con, "main", f"migracion:{tabla}", json.dumps({"ficha": ficha, "latido": time.time()}))
+
+
+def migrar_clave_entera(con, tabla: str, lote=LOTE_MIGRACION_CLAVES) -> dict:
+    """Reconstruye `tabla` (mantenimientos o historicos, de BDs anteriores) con `id INTEGER PRIMARY KEY`.
+
+    La copia va por lotes en transacciones cortas: las demás conexiones siguen leyendo y escribiendo.
+    Lo que cambia mientras tanto queda en el diario y se repasa al final, en la única transacción
+    que bloquea (repaso, DROP de la tabla vieja, RENAME, índices y triggers).
+
+    Con varios procesos abriendo la misma BD, solo uno migra (marca en ajustes, renovada en cada
+    lote); los demás esperan a que termine, o la retoman si la marca deja de renovarse.
+    """
+    inicio = time.perf_counter()
+    pk = TABLAS_CON_DIARIO[tabla]
+    nueva = f"{tabla}_clave_entera"
+    ficha = uuid.uuid4().hex
+    while True:
+        reclamada = _reclamar_migracion(con, tabla, ficha)
+        if reclamada == "hecha":
+            return {"tabla": tabla, "copiadas": 0, "repasadas": 0, "migrada_por_otro": True,
+                    "segundos": round(time.perf_counter() - inicio, 3)}
+        if reclamada:
+            break
+        time.sleep(ESPERA_MIGRACION_S)
+    try:
+        return _copiar_a_clave_entera(con, tabla, pk, nueva, ficha, lote, inicio)
+    except BaseException:
+        try:
+            with con:
+                con.execute("DELETE FROM ajustes WHERE clave=? AND json_extract(valor, '$.ficha')=?",
+                            (f"migracion:{tabla}", ficha))
+        except sqlite3.Error:
+            pass   # la marca caduca sola
+        raise
+
+
+def _copiar_a_clave_entera(con, tabla, pk, nueva, ficha, lote, inicio) -> dict:
+    columnas = ", ".join(c[1] for c in con.execute(f"PRAGMA table_info({tabla});"))
+    desde = version_actual(con)
+
+    copiadas, ultimo = 0, 0
+    while True:
+        fila = con.execute(f"SELECT rowid FROM {tabla} WHERE rowid > ? ORDER BY rowid LIMIT 1 OFFSET ?;",
+                           (ultimo, lote - 1)).fetchone()
+        hasta = fila[0] if fila else None
+        with con:
+            _latido_migracion(con, tabla, ficha)
+            copiadas += con.execute(f"""
+                INSERT INTO {nueva}({columnas}) SELECT {columnas} FROM {tabla}
+                WHERE rowid > ? AND rowid <= ? ORDER BY rowid;
+            """, (ultimo, hasta if hasta is not None else 2**63 - 1)).rowcount
+        if hasta is None:
+            break
+        ultimo = hasta
+
+    con.execute("BEGIN IMMEDIATE;")
+    try:
+        _latido_migracion(con, tabla, ficha)
+        repasadas = claves_cambiadas(con, tabla, desde, version_actual(con))
+        for i in range(0, len(repasadas), TAMANO_LOTE):
+            claves = repasadas[i:i + TAMANO_LOTE]
+            marcas = ",".join("?" * len(claves))
+            con.execute(f"DELETE FROM {nueva} WHERE {pk} IN ({marcas});", claves)
+            con.execute(f"INSERT INTO {nueva}({columnas}) SELECT {columnas} FROM {tabla} WHERE {pk} IN ({marcas});",
+                        claves)
+        con.execute(f"DROP TABLE {tabla};")
+        con.execute(f"ALTER TABLE {nueva} RENAME TO {tabla};")
+        for sql in INDICES_CLAVE_ENTERA[tabla]:
+            con.execute(sql)
+        crear_triggers_diario(con, tabla, pk)
+        con.execute("DELETE FROM ajustes WHERE clave=?", (f"migracion:{tabla}",))
+        con.execute("COMMIT;")
+    except BaseException:
+        con.execute("ROLLBACK;")
+        raise
+    return {"tabla": tabla, "copiadas": copiadas, "repasadas": len(repasadas),
+            "segundos": round(time.perf_counter() - inicio, 3)}
+
+
 def iniciar_bd(archivo_bd=ARCHIVO_BD):
     """Inicializa la base de datos y retorna la conexión."""
     primera_vez = not os.path.exists(archivo_bd)
-    con = sqlite3.connect(archivo_bd)
-    con.execute("PRAGMA foreign_keys = ON;")
+    con = abrir_conexion(archivo_bd)
+    if primera_vez:
+        # antes de crear tablas; en BDs existentes lo migra mantener_bd() (requiere VACUUM)
+        con.execute("PRAGMA auto_vacuum = INCREMENTAL;")
 
     # usuarios
     con.execute("""
@@ -311,44 +612,63 @@ def iniciar_bd(archivo_bd=ARCHIVO_BD):
         con.execute("ALTER TABLE equipos ADD COLUMN creado_por INTEGER;")
     except sqlite3.OperationalError:
         pass
+    # nombre NOCASE: planes por categoría en _SQL_GENERAR_PERIODO (e.nombre = p.categoria COLLATE NOCASE)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_equipos_nombre ON equipos(nombre COLLATE NOCASE);")
+    # el selector de equipos busca en CacheEquipos (memoria): los índices de su antiguo LIKE 'texto%' sobran
+    con.execute("DROP INDEX IF EXISTS idx_equipos_id_nocase;")
+    con.execute("DROP INDEX IF EXISTS idx_equipos_ubicacion;")
+
+    # mantenimientos e historicos (definición e índices arriba, en DDL_TABLAS_CLAVE_ENTERA)
+    for tabla, ddl in DDL_TABLAS_CLAVE_ENTERA.items():
+        con.execute(ddl.format(nombre=tabla))
+    try:
+        con.execute("ALTER TABLE mantenimientos ADD COLUMN registrado_en TEXT;")
+    except sqlite3.OperationalError:
+        pass
+    for tabla, indices in INDICES_CLAVE_ENTERA.items():
+        for sql in indices:
+            con.execute(sql)
 
-    # mantenimientos (+ registrado_en)
+    # planes de mantenimiento (por equipo o por categoría = nombre del equipo)
     con.execute("""
-        CREATE TABLE IF NOT EXISTS mantenimientos(
-            id_mantenimiento TEXT PRIMARY KEY,
-            equipo_id TEXT NOT NULL,
-            fecha TEXT NOT NULL,
-            tipo TEXT CHECK(tipo IN ('Preventivo','Correctivo')) NOT NULL,
-            notas TEXT,
-            estado TEXT CHECK(estado IN ('Pendiente','Completado')) NOT NULL DEFAULT 'Pendiente',
+        CREATE TABLE IF NOT EXISTS planes(
+            id_plan INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            equipo_id TEXT,
+            categoria TEXT,
+            tipo TEXT CHECK(tipo IN ('Preventivo','Correctivo')) NOT NULL DEFAULT 'Preventivo',
+            cada_meses INTEGER NOT NULL DEFAULT 1 CHECK(cada_meses BETWEEN 1 AND 120),
+            dia INTEGER NOT NULL DEFAULT 1 CHECK(dia BETWEEN 1 AND 28),
+            inicio TEXT NOT NULL,
             proveedor TEXT,
             costo REAL DEFAULT 0,
-            creado_por INTEGER,
-            FOREIGN KEY(equipo_id) REFERENCES equipos(id_equipo) ON DELETE CASCADE ON UPDATE CASCADE,
-            FOREIGN KEY(creado_por) REFERENCES usuarios(id) ON DELETE SET NULL
+            notas TEXT,
+            activo INTEGER NOT NULL DEFAULT 1,
+            CHECK((equipo_id IS NULL) <> (categoria IS NULL)),
+            FOREIGN KEY(equipo_id) REFERENCES equipos(id_equipo) ON DELETE CASCADE ON UPDATE CASCADE
         );
     """)
-    try:
-        con.execute("ALTER TABLE mantenimientos ADD COLUMN registrado_en TEXT;")
-    except sqlite3.OperationalError:
-        pass
 
-    # historicos
+    # adjuntos: solo metadatos; el contenido vive en la carpeta adjuntos/ por su SHA-256 (sección 6.13).
+    # id_mantenimiento sin FK: el adjunto sigue al mantenimiento cuando este pasa a históricos.
     con.execute("""
-        CREATE TABLE IF NOT EXISTS historicos(
-            id_historico TEXT PRIMARY KEY,
+        CREATE TABLE IF NOT EXISTS adjuntos(
+            id_adjunto INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            tipo_mime TEXT,
+            bytes INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            id_equipo TEXT NOT NULL,
             id_mantenimiento TEXT,
-            equipo_id TEXT,
-            fecha TEXT,
-            tipo TEXT,
-            notas TEXT,
-            estado TEXT,
-            proveedor TEXT,
-            costo REAL,
-            creado_por INTEGER,
-            registrado_en TEXT
+            agregado_en TEXT NOT NULL,
+            agregado_por INTEGER,
+            FOREIGN KEY(id_equipo) REFERENCES equipos(id_equipo) ON DELETE CASCADE ON UPDATE CASCADE,
+            FOREIGN KEY(agregado_por) REFERENCES usuarios(id) ON DELETE SET NULL
         );
     """)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_adjuntos_equipo ON adjuntos(id_equipo);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_adjuntos_mantenimiento ON adjuntos(id_mantenimiento);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_adjuntos_sha256 ON adjuntos(sha256);")
 
     # ajustes
     con.execute("""
@@ -358,6 +678,26 @@ def iniciar_bd(archivo_bd=ARCHIVO_BD):
         );
     """)
 
+    # diario de cambios (lo llenan los triggers; instante en UTC con milisegundos; ver sección 6.7)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS cambios(
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            clave TEXT NOT NULL,
+            operacion TEXT CHECK(operacion IN ('I','U','D')) NOT NULL,
+            instante TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f','now'))
+        );
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_cambios_tabla ON cambios(tabla, version);")
+    with con:
+        for tabla, pk in TABLAS_CON_DIARIO.items():
+            crear_triggers_diario(con, tabla, pk)
+
+    # BD de versiones anteriores: mantenimientos e historicos con clave primaria de texto
+    for tabla in DDL_TABLAS_CLAVE_ENTERA:
+        if not tiene_clave_entera(con, tabla):
+            logging.info("Migración a clave entera: %s", migrar_clave_entera(con, tabla))
+
     # Seed
     if primera_vez:
         usuarios_semilla = [
@@ -419,24 +759,23 @@ def contar_equipos_sin_mantenimiento_en_mes(con) -> int:
     inicio_mes = date(hoy.year, hoy.month, 1).strftime("%Y-%m-%d")
     proximo_mes = date(hoy.year + (hoy.month // 12), (hoy.month % 12) + 1, 1).strftime("%Y-%m-%d")
 
-    con_mant = con.execute("""
-        SELECT COUNT(DISTINCT e.id_equipo)
-        FROM equipos e
-        JOIN mantenimientos m ON m.equipo_id = e.id_equipo
-        WHERE m.fecha >= ? AND m.fecha < ?;
+    # NOT EXISTS sobre (equipo_id, fecha) en lugar de COUNT(DISTINCT), que necesita un B-tree temporal
+    return con.execute("""
+        SELECT COUNT(*) FROM equipos e
+        WHERE NOT EXISTS (
+            SELECT 1 FROM mantenimientos m
+            WHERE m.equipo_id = e.id_equipo AND m.fecha >= ? AND m.fecha < ?
+        );
     """, (inicio_mes, proximo_mes)).fetchone()[0]
-    total = con.execute("SELECT COUNT(*) FROM equipos;").fetchone()[0]
-    return max(total - con_mant, 0)
 
 
-def revisar_alertas(con, forzar=False) -> None:
-    hoy = date.today()
-    hoy_str = hoy.strftime("%Y-%m-%d")
-
-    ultima = obtener_ajuste(con, "ultima_revision_alerta", "")
-    if (ultima == hoy_str) and (not forzar):
-        return
+def calcular_alertas(con, detallado=False) -> dict:
+    """Calcula las alertas del día sin interfaz.
 
+    Devuelve {'mensajes', 'resumen', 'fecha_alerta', 'fecha_preaviso', 'faltantes'}; `faltantes`
+    solo se cuenta el día del preaviso o si se pide `detallado` (es None en otro caso).
+    """
+    hoy = date.today()
     dia_alerta = int(obtener_ajuste(con, "dia_mantenimiento", "1") or "1")
     dias_pre = int(obtener_ajuste(con, "preaviso_dias_fin_mes", "5") or "5")
 
@@ -444,183 +783,2726 @@ def revisar_alertas(con, forzar=False) -> None:
     fin_mes = fecha_fin_de_mes(hoy)
     fecha_preaviso = fin_mes - timedelta(days=dias_pre)
 
+    faltantes = None
+    if detallado or hoy == fecha_preaviso:
+        faltantes = contar_equipos_sin_mantenimiento_en_mes(con)
+
     mensajes = []
     if hoy == fecha_alerta:
         mensajes.append("📅 ¡Mes de mantenimientos! Recuerda ejecutar y registrar los servicios programados.")
     if hoy == fecha_preaviso:
-        faltantes = contar_equipos_sin_mantenimiento_en_mes(con)
         mensajes.append(f"⏳ Quedan {dias_pre} días para cerrar el mes. "
                         f"Equipos sin mantenimiento registrado este mes: {faltantes}.")
 
-    if mensajes:
-        messagebox.showinfo("Alertas de mantenimiento", "\n\n".join(mensajes))
-        establecer_ajuste(con, "ultima_revision_alerta", hoy_str)
-        return
-
-    if forzar:
-        faltantes = contar_equipos_sin_mantenimiento_en_mes(con)
+    resumen = []
+    if faltantes is not None:
         resumen = [
             f"🔔 Próxima alerta principal (día del mes): {fecha_alerta.strftime('%Y-%m-%d')}",
             f"🔔 Alerta previa ({dias_pre} días antes del fin de mes): {fecha_preaviso.strftime('%Y-%m-%d')}",
             f"📊 Equipos SIN mantenimiento registrado este mes: {faltantes}",
         ]
-        messagebox.showinfo("Estado de alertas", "\n".join(resumen))
+    return {
+        "mensajes": mensajes,
+        "resumen": resumen,
+        "fecha_alerta": fecha_alerta.strftime("%Y-%m-%d"),
+        "fecha_preaviso": fecha_preaviso.strftime("%Y-%m-%d"),
+        "faltantes": faltantes,
+    }
 
-    establecer_ajuste(con, "ultima_revision_alerta", hoy_str)
 
+def aviso_alertas(con, forzar=False):
+    """Revisión del día sin interfaz: (titulo, texto) a mostrar o None. Registra la revisión."""
+    hoy_str = date.today().strftime("%Y-%m-%d")
 
-# ============================================================
-# 7) SELECTOR DE FECHA (FALLBACK SIN LIBRERÍAS)
-# ============================================================
-class DatePicker(tk.Toplevel):
-    """Calendario manual para elegir fecha (DD-MM-AAAA) si no hay tkcalendar."""
-    def __init__(self, master, entry_obj: tk.Entry, fecha_inicial: str = ""):
-        super().__init__(master)
-        self.title("Seleccionar fecha")
-        aplicar_icono_aplicacion(self)
-        self.resizable(False, False)
-        self.entry_obj = entry_obj
+    ultima = obtener_ajuste(con, "ultima_revision_alerta", "")
+    if (ultima == hoy_str) and (not forzar):
+        return None
 
-        # que no se pierda en fullscreen
-        self.transient(master)
-        self.grab_set()
-        self.focus_set()
-        self.attributes("-topmost", True)
-        self.bind("<Escape>", lambda e: self.destroy())
+    alertas = calcular_alertas(con, detallado=forzar)
+    aviso = None
+    if alertas["mensajes"]:
+        aviso = ("Alertas de mantenimiento", "\n\n".join(alertas["mensajes"]))
+    elif forzar:
+        aviso = ("Estado de alertas", "\n".join(alertas["resumen"]))
 
-        hoy = date.today()
-        if fecha_inicial:
-            try:
-                dt = datetime.strptime(fecha_inicial, "%d-%m-%Y").date()
-                self.year, self.month = dt.year, dt.month
-            except Exception:
-                self.year, self.month = hoy.year, hoy.month
-        else:
-            self.year, self.month = hoy.year, hoy.month
+    establecer_ajuste(con, "ultima_revision_alerta", hoy_str)
+    return aviso
 
-        body = ttk.Frame(self)
-        body.pack(padx=8, pady=8)
 
-        nav = ttk.Frame(body)
-        nav.pack(fill="x")
+def mostrar_aviso(aviso) -> None:
+    if aviso:
+        messagebox.showinfo(*aviso)
 
-        self.lb_mes = ttk.Label(nav, text="", style="Cuerpo.TLabel")
-        btn_prev = ttk.Button(nav, text="◀", width=3, style="Fantasma.TButton",
-                              command=self._prev_month)
-        btn_next = ttk.Button(nav, text="▶", width=3, style="Fantasma.TButton",
-                              command=self._next_month)
-        btn_prev.pack(side="left")
-        self.lb_mes.pack(side="left", expand=True)
-        btn_next.pack(side="right")
 
-        self.grid_dias = ttk.Frame(body)
-        self.grid_dias.pack(pady=6)
+def revisar_alertas(con, forzar=False) -> None:
+    mostrar_aviso(aviso_alertas(con, forzar))
 
-        self._render()
-        self.update_idletasks()
-        try:
-            x = self.entry_obj.winfo_rootx()
-            y = self.entry_obj.winfo_rooty() + self.entry_obj.winfo_height()
-            self.geometry(f"+{x}+{y}")
-        except Exception:
-            pass
 
-    def _prev_month(self):
-        if self.month == 1:
-            self.month = 12
-            self.year -= 1
-        else:
-            self.month -= 1
-        self._render()
+# ============================================================
+# 6.1) HISTÓRICOS (PERIODOS Y PAGINACIÓN)
+# ============================================================
+MESES = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+         "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+TAMANO_PAGINA_HISTORICOS = 200
+LARGO_VISTA_NOTAS = 80   # caracteres de notas que traen las listas; el texto completo se pide al seleccionar
+
+
+def rango_periodo(anio: int, mes: int = None):
+    """Devuelve (inicio, fin) en ISO, semiabierto, para un año completo o un mes."""
+    if mes:
+        inicio = date(anio, mes, 1)
+        fin = date(anio + (mes // 12), (mes % 12) + 1, 1)
+    else:
+        inicio = date(anio, 1, 1)
+        fin = date(anio + 1, 1, 1)
+    return inicio.strftime("%Y-%m-%d"), fin.strftime("%Y-%m-%d")
+
+
+def anios_con_historicos(con) -> list:
+    """Años disponibles (descendente). Usa MIN/MAX sobre el índice de fecha, no recorre la tabla."""
+    anio_actual = date.today().year
+    minimo = con.execute("SELECT MIN(fecha) FROM historicos WHERE fecha > '';").fetchone()[0]
+    maximo = con.execute("SELECT MAX(fecha) FROM historicos;").fetchone()[0]
+    try:
+        desde = min(int(str(minimo)[:4]), anio_actual)
+        hasta = max(int(str(maximo)[:4]), anio_actual)
+    except (TypeError, ValueError):
+        desde = hasta = anio_actual
+    return list(range(hasta, desde - 1, -1))
+
+
+def contar_historicos_por_mes(con, anio: int) -> dict:
+    """Conteo por mes de un año: {mes: registros}. Agrega por fecha sobre el índice (cubriente)."""
+    inicio, fin = rango_periodo(anio)
+    conteo = {}
+    for fecha, n in con.execute("""
+        SELECT fecha, COUNT(*) FROM historicos
+        WHERE fecha >= ? AND fecha < ?
+        GROUP BY fecha;
+    """, (inicio, fin)):
+        mes = int(fecha[5:7])
+        conteo[mes] = conteo.get(mes, 0) + n
+    return conteo
+
+
+def listar_historicos(con, anio: int, mes: int = None, cursor=None, limite=TAMANO_PAGINA_HISTORICOS) -> list:
+    """Una página de históricos del periodo, de la más reciente a la más antigua.
+
+    `cursor` es (fecha, id) de la última fila ya mostrada (paginación por llave); la clave entera `id`
+    va al final de cada fila.
+    """
+    inicio, fin = rango_periodo(anio, mes)
+    columnas = ("SELECT id_historico, id_mantenimiento, equipo_id, fecha, tipo, estado, proveedor, "
+                f"costo, substr(notas, 1, {LARGO_VISTA_NOTAS + 1}), registrado_en, creado_por, id FROM historicos ")
+    if cursor is None:
+        return con.execute(columnas + """
+            WHERE fecha >= ? AND fecha < ?
+            ORDER BY fecha DESC, id DESC LIMIT ?;
+        """, (inicio, fin, limite)).fetchall()
+    return con.execute(columnas + """
+        WHERE fecha >= ? AND fecha < ? AND (fecha, id) < (?, ?)
+        ORDER BY fecha DESC, id DESC LIMIT ?;
+    """, (inicio, fin, cursor[0], cursor[1], limite)).fetchall()
 
-    def _next_month(self):
-        if self.month == 12:
-            self.month = 1
-            self.year += 1
-        else:
-            self.month += 1
-        self._render()
 
-    def _render(self):
-        for w in self.grid_dias.winfo_children():
-            w.destroy()
-        self.lb_mes.config(text=f"{calendar.month_name[self.month]} {self.year}")
+# ============================================================
+# 6.2) SELECTOR DE EQUIPOS (AUTOCOMPLETADO; LA BÚSQUEDA ES DE LA CACHÉ, 6.9)
+# ============================================================
+LIMITE_SUGERENCIAS = 25
+RETARDO_BUSQUEDA_MS = 200
 
-        for i, dname in enumerate(["Lu","Ma","Mi","Ju","Vi","Sa","Do"]):
-            ttk.Label(self.grid_dias, text=dname, style="Cuerpo.TLabel").grid(row=0, column=i, padx=4, pady=4)
 
-        monthcal = calendar.Calendar(firstweekday=0).monthdayscalendar(self.year, self.month)
-        for r, week in enumerate(monthcal, start=1):
-            for c, day in enumerate(week):
-                if day == 0:
-                    ttk.Label(self.grid_dias, text=" ").grid(row=r, column=c, padx=2, pady=2)
-                    continue
-                def _mkcmd(yy=self.year, mm=self.month, dd=day):
-                    return lambda: self._elegir(yy, mm, dd)
-                ttk.Button(self.grid_dias, text=str(day), width=3, style="Fantasma.TButton",
-                           command=_mkcmd()).grid(row=r, column=c, padx=2, pady=2)
+def hay_equipos(con) -> bool:
+    return con.execute("SELECT 1 FROM equipos LIMIT 1;").fetchone() is not None
 
-    def _elegir(self, y, m, d):
-        self.entry_obj.delete(0, "end")
-        self.entry_obj.insert(0, f"{d:02d}-{m:02d}-{y:04d}")  # DD-MM-AAAA
-        self.destroy()
+
+# ============================================================
+# 6.3) IMPORTACIÓN DE EQUIPOS (ALTA Y ACTUALIZACIÓN POR LOTES)
+# ============================================================
+TAMANO_LOTE = 500
+COLUMNAS_EQUIPO_IMPORTABLES = ("nombre", "marca", "modelo", "serie", "ubicacion", "descripcion")
+
+
+def _texto_celda(valor) -> str:
+    """Texto limpio de una celda de Excel ('' para vacías/NaN; 101.0 -> '101')."""
+    if valor is None:
+        return ""
+    if isinstance(valor, float):
+        if valor != valor:  # NaN
+            return ""
+        if valor.is_integer():
+            return str(int(valor))
+    return str(valor).strip()
+
+
+def _fila_equipo(r: dict):
+    """Normaliza una fila de Excel a la tupla (id_equipo, nombre, marca, ...). None si no es válida."""
+    valores = tuple(_texto_celda(r.get(c)) for c in ("id_equipo",) + COLUMNAS_EQUIPO_IMPORTABLES)
+    if not valores[0] or not valores[1]:
+        return None
+    return valores
+
+
+def _sql_insertar_equipos(actualizar: bool) -> str:
+    """INSERT de equipos; con `actualizar` hace upsert que solo toca filas con cambios.
+
+    Las celdas vacías no borran el valor existente (no se sobreescribe con '').
+    """
+    sql = """
+        INSERT INTO equipos(id_equipo, nombre, marca, modelo, serie, ubicacion, descripcion, fecha_registro, creado_por)
+        VALUES(?,?,?,?,?,?,?,?,?)
+        ON CONFLICT(id_equipo) DO """
+    if not actualizar:
+        return sql + "NOTHING;"
+    nuevo = {c: f"COALESCE(NULLIF(excluded.{c}, ''), equipos.{c})" for c in COLUMNAS_EQUIPO_IMPORTABLES}
+    nuevo["nombre"] = "excluded.nombre"  # siempre presente en filas válidas
+    asignaciones = ", ".join(f"{c}={expr}" for c, expr in nuevo.items())
+    cambios = " OR ".join(f"equipos.{c} IS NOT {expr}" for c, expr in nuevo.items())
+    return sql + f"UPDATE SET {asignaciones} WHERE {cambios};"
+
+
+def _escribir_lote_equipos(con, filas: list, usuario_id, actualizar: bool, resultado: dict) -> None:
+    """Escribe un lote ya normalizado (IDs únicos) y acumula los conteos en `resultado`."""
+    marcas = ",".join("?" * len(filas))
+    existentes = con.execute(
+        f"SELECT COUNT(*) FROM equipos WHERE id_equipo IN ({marcas});", [f[0] for f in filas]
+    ).fetchone()[0]
+    fecha_reg = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cur = con.executemany(_sql_insertar_equipos(actualizar),
+                          [f + (fecha_reg, usuario_id) for f in filas])
+    insertados = len(filas) - existentes
+    actualizados = max(cur.rowcount - insertados, 0)
+    resultado["insertados"] += insertados
+    resultado["actualizados"] += actualizados
+    resultado["sin_cambios"] += existentes - actualizados
+
+
+def importar_equipos(con, filas, usuario_id=None, actualizar=False) -> dict:
+    """Importa filas (dicts con columnas de equipos) en una sola transacción, por lotes.
+
+    Sin `actualizar` solo agrega IDs nuevos; con `actualizar` también actualiza los existentes
+    (INSERT ... ON CONFLICT DO UPDATE). Devuelve los conteos de insertados, actualizados,
+    sin cambios y omitidos (filas sin ID o sin nombre).
+    """
+    resultado = {"insertados": 0, "actualizados": 0, "sin_cambios": 0, "omitidos": 0}
+    lote = {}
+    with con:
+        for r in filas:
+            fila = _fila_equipo(r)
+            if fila is None:
+                resultado["omitidos"] += 1
+                continue
+            lote[fila[0]] = fila  # un ID repetido en el archivo: gana la última fila
+            if len(lote) >= TAMANO_LOTE:
+                _escribir_lote_equipos(con, list(lote.values()), usuario_id, actualizar, resultado)
+                lote = {}
+        if lote:
+            _escribir_lote_equipos(con, list(lote.values()), usuario_id, actualizar, resultado)
+    return resultado
 
 
 # ============================================================
-# 8) DIÁLOGOS: EQUIPO / MANTENIMIENTO / USUARIO / ALERTAS
+# 6.4) LECTURA DE ARCHIVOS E IMPORTACIÓN DE MANTENIMIENTOS
 # ============================================================
-class DialogoEquipo(tk.Toplevel):
-    def __init__(self, master, titulo="Equipo", datos=None, usuario_actual=None):
-        super().__init__(master)
-        self.title(titulo)
-        aplicar_icono_aplicacion(self)
-        self.resizable(False, False)
-        self.resultado = None
-        self.usuario_actual = usuario_actual
+def falta_lector(archivo: str) -> str:
+    """Qué instalar para poder leer `archivo` ('' si ya se puede)."""
+    extension = os.path.splitext(archivo)[1].lower()
+    if extension == ".csv":
+        return ""
+    if extension == ".xls":
+        return "" if PANDAS_OK else "Instala pandas y xlrd:  pip install pandas xlrd"
+    return "" if OPENPYXL_OK or PANDAS_OK else "Instala openpyxl:  pip install openpyxl"
+
+
+def _cabeceras(valores) -> list:
+    return ["" if c is None else str(c).strip().lower() for c in valores]
+
+
+def leer_filas(archivo: str):
+    """Genera las filas (dict con columnas en minúsculas) de un Excel o CSV, sin filas vacías.
+
+    CSV y .xlsx se leen fila por fila (openpyxl en modo read_only), así que la memoria no crece
+    con el tamaño del archivo; solo los .xls antiguos se cargan completos con pandas.
+    """
+    falta = falta_lector(archivo)
+    if falta:
+        raise RuntimeError(falta)
+    extension = os.path.splitext(archivo)[1].lower()
+    if extension == ".csv":
+        with open(archivo, newline="", encoding="utf-8-sig") as f:
+            lector = csv.reader(f)
+            cabeceras = _cabeceras(next(lector, []))
+            for valores in lector:
+                if any(v.strip() for v in valores):
+                    yield dict(zip(cabeceras, valores))
+        return
+    if extension != ".xls" and OPENPYXL_OK:
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            cabeceras = _cabeceras(next(filas, ()))
+            for valores in filas:
+                if any(v is not None and str(v).strip() for v in valores):
+                    yield dict(zip(cabeceras, valores))
+        finally:
+            libro.close()
+        return
+    df = pd.read_excel(archivo)
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    df = df.dropna(how="all")  # Elimina filas completamente vacías
+    yield from df.to_dict("records")
+
+
+def _fecha_celda(valor) -> str:
+    """Fecha ISO de una celda: acepta fecha/Timestamp, 'DD-MM-AAAA' o 'AAAA-MM-DD'. '' si no es válida."""
+    if isinstance(valor, (datetime, date)):
+        return valor.strftime("%Y-%m-%d")
+    txt = _texto_celda(valor)
+    if not txt:
+        return ""
+    try:
+        return _a_iso(txt)  # si viene DD-MM-AAAA
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(txt[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return ""
 
-        marco = ttk.Frame(self, style="Card.TFrame", padding=12)
-        marco.grid(row=0, column=0, sticky="nsew")
 
-        etiquetas = ["ID de equipo *", "Nombre *", "Marca", "Modelo", "Serie", "Ubicación", "Descripción"]
-        for i, txt in enumerate(etiquetas):
-            ttk.Label(marco, text=txt, style="Cuerpo.TLabel").grid(row=i, column=0, sticky="e", padx=6, pady=4)
+def _fila_mantenimiento(r: dict):
+    """Normaliza una fila a (id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo).
 
-        self.e_id = ttk.Entry(marco, width=38, style="Entrada.TEntry")
-        self.e_nombre = ttk.Entry(marco, width=38, style="Entrada.TEntry")
-        self.e_marca = ttk.Entry(marco, width=38, style="Entrada.TEntry")
-        self.e_modelo = ttk.Entry(marco, width=38, style="Entrada.TEntry")
-        self.e_serie = ttk.Entry(marco, width=38, style="Entrada.TEntry")
-        self.e_ubic = ttk.Entry(marco, width=38, style="Entrada.TEntry")
-        self.t_desc = tk.Text(marco, width=38, height=4)
+    None si falta el equipo o la fecha no es válida.
+    """
+    eqid = _texto_celda(r.get("equipo_id"))
+    fecha = _fecha_celda(r.get("fecha"))
+    if not eqid or not fecha:
+        return None
+    idm = _texto_celda(r.get("id_mantenimiento")) or f"IMP-{uuid.uuid4().hex[:10]}"
+    tipo = _texto_celda(r.get("tipo"))
+    if tipo not in ["Preventivo", "Correctivo"]:
+        tipo = "Preventivo"
+    estado = _texto_celda(r.get("estado"))
+    if estado not in ["Pendiente", "Completado"]:
+        estado = "Pendiente"
+    try:
+        costo = float(_texto_celda(r.get("costo")) or 0)
+    except ValueError:
+        costo = 0.0
+    return (idm, eqid, fecha, tipo, _texto_celda(r.get("notas")), estado, _texto_celda(r.get("proveedor")), costo)
+
+
+def _escribir_lote_mantenimientos(con, filas: list, usuario_id, resultado: dict) -> None:
+    """Inserta un lote normalizado; descarta equipos inexistentes e IDs ya registrados."""
+    ids_eq = list({f[1] for f in filas})
+    marcas = ",".join("?" * len(ids_eq))
+    conocidos = {r[0] for r in con.execute(
+        f"SELECT id_equipo FROM equipos WHERE id_equipo IN ({marcas});", ids_eq)}
+    validas = [f for f in filas if f[1] in conocidos]
+    resultado["sin_equipo"] += len(filas) - len(validas)
+    if not validas:
+        return
+    registrado_en = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cur = con.executemany("""
+        INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo, creado_por, registrado_en)
+        VALUES(?,?,?,?,?,?,?,?,?,?)
+        ON CONFLICT(id_mantenimiento) DO NOTHING;
+    """, [f + (usuario_id, registrado_en) for f in validas])
+    resultado["insertados"] += cur.rowcount
+    resultado["duplicados"] += len(validas) - cur.rowcount
+
+
+def importar_mantenimientos(con, filas, usuario_id=None) -> dict:
+    """Importa mantenimientos por lotes en una sola transacción.
+
+    Devuelve conteos: insertados, duplicados (ID ya existente), sin_equipo y omitidos (fila inválida).
+    """
+    resultado = {"insertados": 0, "duplicados": 0, "sin_equipo": 0, "omitidos": 0}
+    lote = []
+    with con:
+        for r in filas:
+            fila = _fila_mantenimiento(r)
+            if fila is None:
+                resultado["omitidos"] += 1
+                continue
+            lote.append(fila)
+            if len(lote) >= TAMANO_LOTE:
+                _escribir_lote_mantenimientos(con, lote, usuario_id, resultado)
+                lote = []
+        if lote:
+            _escribir_lote_mantenimientos(con, lote, usuario_id, resultado)
+    return resultado
 
-        for w in (self.e_id, self.e_nombre, self.e_marca, self.e_modelo, self.e_serie, self.e_ubic, self.t_desc):
-            poner_caret_blanco(w)
 
-        self.e_id.grid(row=0, column=1, padx=6, pady=4)
-        self.e_nombre.grid(row=1, column=1, padx=6, pady=4)
-        self.e_marca.grid(row=2, column=1, padx=6, pady=4)
-        self.e_modelo.grid(row=3, column=1, padx=6, pady=4)
-        self.e_serie.grid(row=4, column=1, padx=6, pady=4)
-        self.e_ubic.grid(row=5, column=1, padx=6, pady=4)
-        self.t_desc.grid(row=6, column=1, padx=6, pady=4)
+# ============================================================
+# 6.5) MANTENIMIENTOS (ALTA Y PASO A HISTÓRICOS)
+# ============================================================
+# 48 bits aleatorios por fila: archivar miles de filas en el mismo segundo no choca
+_SQL_NUEVO_ID_HISTORICO = "'H-' || strftime('%Y%m%d%H%M%S','now','localtime') || '-' || lower(hex(randomblob(6)))"
+_COLUMNAS_A_HISTORICO = "id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo, creado_por, registrado_en"
 
-        if datos:
-            self.e_id.insert(0, datos.get("id_equipo", ""))
-            self.e_nombre.insert(0, datos.get("nombre", ""))
-            self.e_marca.insert(0, datos.get("marca", ""))
-            self.e_modelo.insert(0, datos.get("modelo", ""))
-            self.e_serie.insert(0, datos.get("serie", ""))
-            self.e_ubic.insert(0, datos.get("ubicacion", ""))
-            self.t_desc.insert("1.0", datos.get("descripcion", "") or "")
 
-        zona_botones = ttk.Frame(marco, style="Card.TFrame")
-        zona_botones.grid(row=7, column=0, columnspan=2, pady=8)
-        ttk.Button(zona_botones, text="Guardar", command=self._on_guardar, style="Success.TButton").pack(side="left", padx=6)
-        ttk.Button(zona_botones, text="Cancelar", command=self.destroy, style="Fantasma.TButton").pack(side="left", padx=6)
+def nuevo_id_mantenimiento() -> str:
+    return f"M-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
 
-        self.bind("<Return>", lambda e: self._on_guardar())
-        self.grab_set()
-        self.e_id.focus_set()
+
+def insertar_equipo(con, datos: dict, usuario_id) -> None:
+    """Alta de un equipo. Lanza sqlite3.IntegrityError si el ID ya existe."""
+    with con:
+        con.execute("""
+            INSERT INTO equipos(id_equipo, nombre, marca, modelo, serie, ubicacion, descripcion, fecha_registro, creado_por)
+            VALUES(?,?,?,?,?,?,?,?,?)
+        """, (
+            datos["id_equipo"], datos["nombre"], datos.get("marca", ""),
+            datos.get("modelo", ""), datos.get("serie", ""), datos.get("ubicacion", ""),
+            datos.get("descripcion", ""), datos.get("fecha_registro") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            usuario_id
+        ))
+
+
+# Columnas de las listas de las pestañas (sin ORDER BY, para reutilizarlas con WHERE). De las notas solo
+# se trae un extracto (un carácter de más para saber si se cortó); el texto completo lo da notas_completas()
+_SELECT_LISTA_EQUIPOS = """
+    SELECT id_equipo, nombre, marca, modelo, serie, ubicacion,
+           COALESCE(descripcion,''), COALESCE(fecha_registro,''), COALESCE(creado_por,'')
+    FROM equipos
+"""
+_SELECT_LISTA_MANTENIMIENTOS = f"""
+    SELECT m.id_mantenimiento, m.equipo_id, m.fecha, m.tipo, m.estado,
+           COALESCE(m.proveedor,''), COALESCE(m.costo,0), substr(COALESCE(m.notas,''), 1, {LARGO_VISTA_NOTAS + 1}),
+           COALESCE(m.registrado_en,''), COALESCE(m.creado_por,''), m.id
+    FROM mantenimientos m
+"""
+
+SQL_LISTA_MANTENIMIENTOS = _SELECT_LISTA_MANTENIMIENTOS + " ORDER BY m.fecha DESC, m.id DESC;"
+
+
+def actualizar_equipo(con, id_original: str, datos: dict) -> None:
+    """Edita un equipo (el ID puede cambiar; los mantenimientos siguen por ON UPDATE CASCADE)."""
+    with con:
+        con.execute("""
+            UPDATE equipos
+            SET id_equipo=?, nombre=?, marca=?, modelo=?, serie=?, ubicacion=?, descripcion=?
+            WHERE id_equipo=?
+        """, (
+            datos["id_equipo"], datos["nombre"], datos["marca"],
+            datos["modelo"], datos["serie"], datos["ubicacion"],
+            datos["descripcion"], id_original
+        ))
+
+
+def eliminar_equipo(con, id_equipo: str) -> None:
+    with con:
+        con.execute("DELETE FROM equipos WHERE id_equipo=?", (id_equipo,))
+
+
+def obtener_mantenimiento(con, id_mantenimiento: str):
+    """Datos editables de un mantenimiento (dict) o None."""
+    fila = con.execute("""
+        SELECT id_mantenimiento, equipo_id, fecha, tipo, estado,
+               COALESCE(proveedor,''), COALESCE(costo,0), COALESCE(notas,'')
+        FROM mantenimientos WHERE id_mantenimiento=?
+    """, (id_mantenimiento,)).fetchone()
+    if not fila:
+        return None
+    return {
+        "id_mantenimiento": fila[0], "equipo_id": fila[1], "fecha": fila[2],
+        "tipo": fila[3], "estado": fila[4], "proveedor": fila[5], "costo": fila[6], "notas": fila[7]
+    }
+
+
+def notas_completas(con, tabla: str, id_: str) -> str:
+    """Texto completo de las notas de un mantenimiento o histórico ('' si ya no existe)."""
+    if tabla not in ("mantenimientos", "historicos"):
+        raise ValueError(f"Tabla sin notas: {tabla}")
+    fila = con.execute(f"SELECT COALESCE(notas,'') FROM {tabla} WHERE {TABLAS_CON_DIARIO[tabla]}=?", (id_,)).fetchone()
+    return fila[0] if fila else ""
+
+
+def actualizar_mantenimiento(con, id_mantenimiento: str, datos: dict) -> None:
+    with con:
+        con.execute("""
+            UPDATE mantenimientos
+            SET equipo_id=?, fecha=?, tipo=?, notas=?, estado=?, proveedor=?, costo=?
+            WHERE id_mantenimiento=?
+        """, (
+            datos["equipo_id"], datos["fecha"], datos["tipo"],
+            datos["notas"], datos["estado"], datos["proveedor"],
+            datos["costo"], id_mantenimiento
+        ))
+
+
+def cambiar_estado_mantenimiento(con, id_mantenimiento: str, estado: str) -> bool:
+    """Cambia el estado; False si el mantenimiento no existe."""
+    with con:
+        cur = con.execute("UPDATE mantenimientos SET estado=? WHERE id_mantenimiento=?", (estado, id_mantenimiento))
+    return cur.rowcount > 0
+
+
+def cambiar_estado_mantenimientos(con, ids: list, estado: str) -> int:
+    """Cambia el estado de varios mantenimientos en una transacción; devuelve cuántos cambiaron."""
+    with con:
+        cur = con.executemany("UPDATE mantenimientos SET estado=? WHERE id_mantenimiento=? AND estado IS NOT ?",
+                              [(estado, mid, estado) for mid in ids])
+    return cur.rowcount
+
+
+def asignar_proveedor(con, ids: list, proveedor: str) -> int:
+    """Reasigna el proveedor de varios mantenimientos en una transacción; devuelve cuántos cambiaron."""
+    with con:
+        cur = con.executemany("UPDATE mantenimientos SET proveedor=? WHERE id_mantenimiento=? AND proveedor IS NOT ?",
+                              [(proveedor, mid, proveedor) for mid in ids])
+    return cur.rowcount
+
+
+def mover_equipos(con, ids: list, ubicacion: str) -> int:
+    """Cambia la ubicación de varios equipos en una transacción; devuelve cuántos cambiaron."""
+    with con:
+        cur = con.executemany("UPDATE equipos SET ubicacion=? WHERE id_equipo=? AND ubicacion IS NOT ?",
+                              [(ubicacion, eid, ubicacion) for eid in ids])
+    return cur.rowcount
+
+
+def insertar_mantenimiento(con, datos: dict, usuario_id) -> None:
+    """Registra un mantenimiento; el último del mismo equipo pasa antes a históricos.
+
+    Lanza sqlite3.IntegrityError si el ID ya existe o el equipo no existe (y no se archiva nada).
+    """
+    with con:
+        anterior = con.execute("""
+            SELECT id_mantenimiento FROM mantenimientos WHERE equipo_id=? ORDER BY fecha DESC LIMIT 1
+        """, (datos["equipo_id"],)).fetchone()
+        if anterior:
+            con.execute(f"""
+                INSERT INTO historicos(id_historico, {_COLUMNAS_A_HISTORICO})
+                SELECT {_SQL_NUEVO_ID_HISTORICO}, {_COLUMNAS_A_HISTORICO}
+                FROM mantenimientos WHERE id_mantenimiento=?;
+            """, anterior)
+            con.execute("DELETE FROM mantenimientos WHERE id_mantenimiento=?", anterior)
+        con.execute("""
+            INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo, creado_por, registrado_en)
+            VALUES(?,?,?,?,?,?,?,?,?,?)
+        """, (
+            datos["id_mantenimiento"], datos["equipo_id"], datos["fecha"],
+            datos["tipo"], datos["notas"], datos["estado"],
+            datos["proveedor"], datos["costo"], usuario_id,
+            datos["registrado_en"]
+        ))
+
+
+def archivar_mantenimientos(con, antes_de: str) -> int:
+    """Mueve a históricos los mantenimientos Completados con fecha anterior a `antes_de` (ISO)."""
+    with con:
+        con.execute(f"""
+            INSERT INTO historicos(id_historico, {_COLUMNAS_A_HISTORICO})
+            SELECT {_SQL_NUEVO_ID_HISTORICO}, {_COLUMNAS_A_HISTORICO}
+            FROM mantenimientos WHERE estado='Completado' AND fecha < ?;
+        """, (antes_de,))
+        cur = con.execute("DELETE FROM mantenimientos WHERE estado='Completado' AND fecha < ?;", (antes_de,))
+    return cur.rowcount
+
+
+# ============================================================
+# 6.6) EXPORTACIÓN (STREAMING) Y RESPALDO
+# ============================================================
+CONSULTAS_EXPORTACION = {
+    "equipos": """
+        SELECT id_equipo, nombre, marca, modelo, serie, ubicacion, descripcion, fecha_registro, creado_por
+        FROM equipos ORDER BY nombre;
+    """,
+    "mantenimientos": """
+        SELECT id_mantenimiento, equipo_id, fecha, tipo, estado, proveedor, costo, notas, registrado_en, creado_por
+        FROM mantenimientos
+        ORDER BY fecha DESC;
+    """,
+    "historicos": """
+        SELECT id_historico, id_mantenimiento, equipo_id, fecha, tipo, estado, proveedor, costo, notas, registrado_en, creado_por
+        FROM historicos
+        ORDER BY fecha DESC;
+    """,
+}
+
+
+def exportar_consulta(con, consulta: str, archivo: str, params=(), hoja="Datos") -> int:
+    """Escribe el resultado de una consulta a .xlsx o .csv fila por fila. Devuelve filas escritas.
+
+    El cursor se recorre sin cargarlo completo; para Excel se usa openpyxl en modo write_only.
+    """
+    cur = con.execute(consulta, params)
+    columnas = [d[0] for d in cur.description]
+    n = 0
+    if archivo.lower().endswith(".csv"):
+        with open(archivo, "w", newline="", encoding="utf-8-sig") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(columnas)
+            for fila in cur:
+                escritor.writerow(fila)
+                n += 1
+        return n
+    if not OPENPYXL_OK:
+        raise RuntimeError("Instala openpyxl:  pip install openpyxl")
+    libro = openpyxl.Workbook(write_only=True)
+    hoja_ws = libro.create_sheet(hoja)
+    hoja_ws.append(columnas)
+    for fila in cur:
+        hoja_ws.append(list(fila))
+        n += 1
+    libro.save(archivo)
+    return n
+
+
+def exportar_tabla(con, tabla: str, archivo: str) -> int:
+    return exportar_consulta(con, CONSULTAS_EXPORTACION[tabla], archivo, hoja=tabla)
+
+
+# Clave primaria y columnas de cada tabla exportable (también las usa la API)
+COLUMNAS_TABLAS = {
+    "equipos": ("id_equipo", ("id_equipo", "nombre", "marca", "modelo", "serie", "ubicacion",
+                              "descripcion", "fecha_registro", "creado_por")),
+    "mantenimientos": ("id_mantenimiento", ("id_mantenimiento", "equipo_id", "fecha", "tipo", "estado",
+                                            "proveedor", "costo", "notas", "registrado_en", "creado_por")),
+    "historicos": ("id_historico", ("id_historico", "id_mantenimiento", "equipo_id", "fecha", "tipo", "estado",
+                                    "proveedor", "costo", "notas", "registrado_en", "creado_por")),
+}
+
+
+CARPETA_RESPALDOS = "respaldos"      # junto a la BD
+PAGINAS_POR_PASO_RESPALDO = 256      # entre pasos otras conexiones pueden seguir escribiendo
+PAUSA_PASO_RESPALDO = 0.005          # segundos
+GENERACIONES_RESPALDO = 7
+INTERVALO_RESPALDO_HORAS = 24        # 0 desactiva el respaldo automático
+INTERVALO_REVISION_RESPALDO_MS = 10 * 60 * 1000  # la interfaz revisa cada 10 min si ya toca
+
+
+def verificar_integridad(con) -> str:
+    """Resultado de PRAGMA integrity_check ('ok' si la BD está sana)."""
+    return "; ".join(r[0] for r in con.execute("PRAGMA integrity_check;"))
+
+
+def respaldar_bd(con, destino: str, paginas=PAGINAS_POR_PASO_RESPALDO) -> str:
+    """Copia consistente de la BD abierta a `destino` con la API de respaldo de SQLite.
+
+    Se copia por pasos de `paginas` páginas a un temporal, que solo se renombra a `destino`
+    si pasa PRAGMA integrity_check.
+    """
+    carpeta = os.path.dirname(os.path.abspath(destino))
+    os.makedirs(carpeta, exist_ok=True)
+    temporal = destino + ".tmp"
+    copia = sqlite3.connect(temporal)
+    try:
+        con.backup(copia, pages=paginas, sleep=PAUSA_PASO_RESPALDO)
+        resultado = verificar_integridad(copia)
+    finally:
+        copia.close()
+    if resultado != "ok":
+        os.remove(temporal)
+        raise sqlite3.DatabaseError(f"La copia no pasó la verificación de integridad: {resultado}")
+    os.replace(temporal, destino)
+    return destino
+
+
+def carpeta_respaldos(con) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_bd(con))), CARPETA_RESPALDOS)
+
+
+def listar_respaldos(con, carpeta=None) -> list:
+    """Generaciones de respaldo de esta BD, de la más reciente a la más antigua."""
+    carpeta = carpeta or carpeta_respaldos(con)
+    if not os.path.isdir(carpeta):
+        return []
+    base = os.path.splitext(os.path.basename(ruta_bd(con)))[0]
+    patron = re.compile(re.escape(base) + r"-\d{8}-\d{6}\.db")
+    nombres = sorted((n for n in os.listdir(carpeta) if patron.fullmatch(n)), reverse=True)
+    return [os.path.join(carpeta, n) for n in nombres]
+
+
+def respaldo_rotativo(con, carpeta=None, generaciones=None) -> dict:
+    """Nueva generación en la carpeta de respaldos; se conservan solo las `generaciones` más recientes."""
+    carpeta = carpeta or carpeta_respaldos(con)
+    if generaciones is None:
+        generaciones = int(obtener_ajuste(con, "respaldo_generaciones", str(GENERACIONES_RESPALDO)))
+    base = os.path.splitext(os.path.basename(ruta_bd(con)))[0]
+    ahora = datetime.now()
+    inicio = time.perf_counter()
+    destino = respaldar_bd(con, os.path.join(carpeta, f"{base}-{ahora.strftime('%Y%m%d-%H%M%S')}.db"))
+    segundos = time.perf_counter() - inicio
+    eliminados = []
+    for viejo in listar_respaldos(con, carpeta)[max(generaciones, 1):]:
+        os.remove(viejo)
+        eliminados.append(viejo)
+    establecer_ajuste(con, "ultimo_respaldo", ahora.strftime("%Y-%m-%d %H:%M:%S"))
+    return {"destino": destino, "bytes": os.path.getsize(destino),
+            "segundos": round(segundos, 3), "eliminados": eliminados}
+
+
+def respaldo_pendiente(con) -> bool:
+    """True si pasó el intervalo configurado (ajuste respaldo_intervalo_horas) desde el último respaldo."""
+    horas = float(obtener_ajuste(con, "respaldo_intervalo_horas", str(INTERVALO_RESPALDO_HORAS)) or 0)
+    if horas <= 0:
+        return False
+    ultimo = obtener_ajuste(con, "ultimo_respaldo", "")
+    try:
+        return datetime.now() - datetime.strptime(ultimo, "%Y-%m-%d %H:%M:%S") >= timedelta(hours=horas)
+    except ValueError:
+        return True
+
+
+def restaurar_bd(con, origen: str) -> dict:
+    """Reemplaza el contenido de la BD abierta por el respaldo `origen`.
+
+    El respaldo se verifica antes de tocar nada y el estado actual se guarda como
+    '<bd>-<fecha>-previo.db' (fuera de la rotación). Al final se reaplican las migraciones
+    por si el respaldo es de una versión anterior del programa.
+    """
+    if not os.path.isfile(origen):
+        raise FileNotFoundError(f"No existe el respaldo '{origen}'.")
+    fuente = sqlite3.connect(origen)
+    try:
+        resultado = verificar_integridad(fuente)
+        if resultado != "ok":
+            raise sqlite3.DatabaseError(f"El respaldo no pasó la verificación de integridad: {resultado}")
+        base = os.path.splitext(os.path.basename(ruta_bd(con)))[0]
+        previo = respaldar_bd(con, os.path.join(carpeta_respaldos(con),
+                                                f"{base}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-previo.db"))
+        fuente.backup(con, pages=PAGINAS_POR_PASO_RESPALDO, sleep=PAUSA_PASO_RESPALDO)
+    finally:
+        fuente.close()
+    iniciar_bd(ruta_bd(con)).close()
+    return {"origen": origen, "previo": previo}
+
+
+# ============================================================
+# 6.7) DIARIO DE CAMBIOS (REFRESCO INCREMENTAL Y EXPORTACIÓN DELTA)
+# ============================================================
+LIMITE_CAMBIOS = 1000          # filas del diario por consulta (API / CLI)
+LIMITE_REFRESCO_INCREMENTAL = 500  # con más claves cambiadas conviene recargar la lista completa
+
+# Consulta de lista y clave primaria de cada tabla que se refresca por incrementos
+_LISTAS_INCREMENTALES = {
+    "equipos": (_SELECT_LISTA_EQUIPOS, "id_equipo"),
+    "mantenimientos": (_SELECT_LISTA_MANTENIMIENTOS, "m.id_mantenimiento"),
+}
+
+
+def version_actual(con) -> int:
+    """Última versión del diario (0 si está vacío)."""
+    return con.execute("SELECT COALESCE(MAX(version), 0) FROM cambios").fetchone()[0]
+
+
+def version_tabla(con, tabla: str) -> int:
+    """Última versión del diario para una tabla (usa el índice (tabla, version))."""
+    return con.execute("SELECT COALESCE(MAX(version), 0) FROM cambios WHERE tabla=?", (tabla,)).fetchone()[0]
+
+
+def cambios_desde(con, version: int, tablas=None, limite=LIMITE_CAMBIOS) -> list:
+    """Entradas del diario posteriores a `version`: [(version, tabla, clave, operacion, instante), ...]."""
+    if tablas:
+        marcas = ",".join("?" * len(tablas))
+        return con.execute(f"""
+            SELECT version, tabla, clave, operacion, instante FROM cambios
+            WHERE tabla IN ({marcas}) AND version > ?
+            ORDER BY version LIMIT ?
+        """, (*tablas, version, limite)).fetchall()
+    return con.execute("""
+        SELECT version, tabla, clave, operacion, instante FROM cambios
+        WHERE version > ? ORDER BY version LIMIT ?
+    """, (version, limite)).fetchall()
+
+
+def claves_cambiadas(con, tabla: str, desde: int, hasta: int) -> list:
+    """Claves de `tabla` con alguna entrada en el diario en (desde, hasta], sin repetir.
+
+    Se deduplica aquí y no con DISTINCT, que obligaría a SQLite a un B-tree temporal.
+    """
+    return list(dict.fromkeys(r[0] for r in con.execute("""
+        SELECT clave FROM cambios WHERE tabla=? AND version > ? AND version <= ?
+    """, (tabla, desde, hasta))))
+
+
+def delta_lista(con, tabla: str, desde: int, limite=LIMITE_REFRESCO_INCREMENTAL):
+    """Lo necesario para poner al día una lista que estaba en la versión `desde`.
+
+    Devuelve (version, filas, borrados): las filas actuales de las claves que cambiaron y las claves
+    que ya no existen. Si cambiaron más de `limite` claves, o el diario quedó detrás de `desde`
+    (se restauró un respaldo), devuelve (version, None, None) y la lista debe recargarse completa.
+    """
+    version = version_tabla(con, tabla)
+    if version < desde:
+        return version, None, None
+    claves = claves_cambiadas(con, tabla, desde, version)
+    if len(claves) > limite:
+        return version, None, None
+    select, pk = _LISTAS_INCREMENTALES[tabla]
+    filas = []
+    for i in range(0, len(claves), TAMANO_LOTE):
+        lote = claves[i:i + TAMANO_LOTE]
+        filas += con.execute(f"{select} WHERE {pk} IN ({','.join('?' * len(lote))})", lote).fetchall()
+    vigentes = {str(f[0]) for f in filas}
+    return version, filas, [k for k in claves if k not in vigentes]
+
+
+def _clave_cursor_exportacion(destino: str, tabla: str) -> str:
+    return f"exportacion_delta:{destino}:{tabla}"
+
+
+def exportar_delta(con, tabla: str, archivo: str, destino: str) -> dict:
+    """Exporta solo lo que cambió en `tabla` desde la última exportación a `destino`.
+
+    Cada fila lleva `operacion` (I alta, U edición, D baja) y la `version` del diario; las bajas
+    solo traen la clave. La primera vez (sin cursor en ajustes) se exporta la tabla completa como
+    altas. El cursor se guarda solo si el archivo se escribió bien.
+    """
+    pk, columnas = COLUMNAS_TABLAS[tabla]
+    clave_ajuste = _clave_cursor_exportacion(destino, tabla)
+    desde = obtener_ajuste(con, clave_ajuste)
+    con.execute("BEGIN")  # una sola instantánea para la versión y las filas
+    try:
+        hasta = version_actual(con)
+        if desde is None:
+            sql = f"SELECT 'I' AS operacion, ? AS version, {', '.join(columnas)} FROM {tabla} ORDER BY {pk};"
+            params = (hasta,)
+        else:
+            resto = ", ".join(f"t.{c}" for c in columnas if c != pk)
+            sql = f"""
+                WITH d AS (
+                    SELECT clave, MAX(version) AS version, MAX(operacion='I') AS alta
+                    FROM cambios WHERE tabla=? AND version > ? AND version <= ?
+                    GROUP BY clave
+                )
+                SELECT CASE WHEN t.{pk} IS NULL THEN 'D' WHEN d.alta THEN 'I' ELSE 'U' END AS operacion,
+                       d.version, d.clave AS {pk}, {resto}
+                FROM d LEFT JOIN {tabla} t ON t.{pk} = d.clave
+                ORDER BY d.version;
+            """
+            params = (tabla, int(desde), hasta)
+        filas = exportar_consulta(con, sql, archivo, params, hoja=tabla)
+    finally:
+        con.rollback()
+    establecer_ajuste(con, clave_ajuste, str(hasta))
+    return {"tabla": tabla, "archivo": archivo, "destino": destino, "desde": None if desde is None else int(desde),
+            "hasta": hasta, "filas": filas, "completa": desde is None}
+
+
+# ============================================================
+# 6.8) IMPORTACIÓN DE CARPETAS (VARIOS ARCHIVOS EN PARALELO)
+# ============================================================
+EXTENSIONES_IMPORTABLES = (".xlsx", ".xls", ".csv")
+
+
+def archivos_importables(carpeta: str) -> list:
+    """Excel/CSV de la carpeta (sin subcarpetas ni archivos de bloqueo '~$' de Excel), ordenados."""
+    return [os.path.join(carpeta, n) for n in sorted(os.listdir(carpeta))
+            if n.lower().endswith(EXTENSIONES_IMPORTABLES) and not n.startswith("~$")
+            and os.path.isfile(os.path.join(carpeta, n))]
+
+
+def _analizar_archivo(archivo: str, tabla: str) -> dict:
+    """Lee y normaliza un archivo (corre en un proceso aparte; no toca la BD).
+
+    Devuelve las filas válidas ya como tuplas y cuántas se rechazaron por inválidas.
+    """
+    normalizar = _fila_equipo if tabla == "equipos" else _fila_mantenimiento
+    filas, rechazadas = [], 0
+    try:
+        for r in leer_filas(archivo):
+            fila = normalizar(r)
+            if fila is None:
+                rechazadas += 1
+            else:
+                filas.append(fila)
+    except Exception as e:
+        return {"archivo": archivo, "filas": [], "omitidos": 0, "error": str(e)}
+    if tabla == "equipos":
+        filas = list({f[0]: f for f in filas}.values())  # ID repetido en el archivo: gana la última fila
+    return {"archivo": archivo, "filas": filas, "omitidos": rechazadas, "error": None}
+
+
+def importar_carpeta(con, carpeta: str, tabla: str, usuario_id=None, actualizar=False, procesos=None) -> dict:
+    """Importa todos los Excel/CSV de `carpeta` a `tabla` (equipos o mantenimientos).
+
+    La lectura y validación de los archivos se reparte en `procesos` procesos (por defecto uno por
+    núcleo); la escritura es de este hilo, en una sola transacción, en orden de nombre de archivo
+    (con actualizar=True un ID repetido entre archivos queda igual que en una importación en serie).
+    Solo hay unos cuantos archivos leídos en espera a la vez: la memoria no crece con la carpeta.
+    Devuelve un reporte por archivo con los mismos conteos que la importación de un archivo, más
+    los totales. Un archivo ilegible se reporta con 'error' y no detiene a los demás.
+    """
+    archivos = archivos_importables(carpeta)
+    claves = (("insertados", "actualizados", "sin_cambios", "omitidos") if tabla == "equipos"
+              else ("insertados", "duplicados", "sin_equipo", "omitidos"))
+    totales = dict.fromkeys(claves, 0)
+    reporte = []
+    inicio = time.perf_counter()
+
+    def _escribir(analisis):
+        resultado = dict.fromkeys(claves, 0)
+        resultado["omitidos"] = analisis["omitidos"]
+        filas = analisis["filas"]
+        for i in range(0, len(filas), TAMANO_LOTE):
+            if tabla == "equipos":
+                _escribir_lote_equipos(con, filas[i:i + TAMANO_LOTE], usuario_id, actualizar, resultado)
+            else:
+                _escribir_lote_mantenimientos(con, filas[i:i + TAMANO_LOTE], usuario_id, resultado)
+        for c in claves:
+            totales[c] += resultado[c]
+        reporte.append({"archivo": os.path.basename(analisis["archivo"]), "error": analisis["error"], **resultado})
+
+    procesos = procesos or os.cpu_count() or 1
+    with con:
+        if procesos == 1 or len(archivos) <= 1:
+            for archivo in archivos:
+                _escribir(_analizar_archivo(archivo, tabla))
+        else:
+            with ProcessPoolExecutor(max_workers=min(procesos, len(archivos))) as pool:
+                restantes = iter(archivos)
+                futuros = [pool.submit(_analizar_archivo, a, tabla) for a in islice(restantes, 2 * procesos)]
+                while futuros:
+                    analisis = futuros.pop(0).result()   # el resultado se suelta al escribirlo
+                    siguiente = next(restantes, None)
+                    if siguiente is not None:
+                        futuros.append(pool.submit(_analizar_archivo, siguiente, tabla))
+                    _escribir(analisis)
+                    del analisis
+    reporte.sort(key=lambda r: r["archivo"])
+    return {"tabla": tabla, "carpeta": carpeta, "archivos": reporte, "totales": totales,
+            "procesos": procesos, "segundos": round(time.perf_counter() - inicio, 3)}
+
+
+# ============================================================
+# 6.9) CACHÉ COMPARTIDA DE EQUIPOS
+# ============================================================
+class RegistroEquipo:
+    """Un equipo en la caché; con __slots__ no lleva __dict__ por instancia."""
+    __slots__ = COLUMNAS_TABLAS["equipos"][1]
+
+    def __init__(self, *valores):
+        for campo, valor in zip(self.__slots__, valores):
+            setattr(self, campo, valor)
+
+    def fila(self) -> tuple:
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+
+class CacheEquipos:
+    """Copia de `equipos` en memoria que comparten la pestaña de equipos y los diálogos.
+
+    Todos los métodos de consulta reciben una conexión y primero se ponen al día con el diario
+    de cambios: si nada cambió en equipos cuesta una consulta al índice del diario; si cambiaron
+    pocas claves solo se releen esas. Los órdenes por ID, nombre y ubicación (listas de IDs para
+    búsqueda binaria por prefijo) se rehacen solo tras un cambio. Los textos que se repiten entre
+    equipos (marca, modelo, ubicación, fecha de registro...) se guardan una sola vez.
+    """
+    # Campos que suelen repetirse entre equipos (el ID y la serie son únicos)
+    _CAMPOS_COMPARTIDOS = ("nombre", "marca", "modelo", "ubicacion", "descripcion", "fecha_registro", "creado_por")
+
+    def __init__(self):
+        self._textos = {}
+        self._por_id = {}
+        self._version = None
+        self._ordenes = None
+        self._candado = threading.RLock()
+
+    def actualizar(self, con) -> int:
+        """Pone la caché al día y devuelve la versión del diario que refleja."""
+        with self._candado:
+            version = version_tabla(con, "equipos")
+            if version == self._version:
+                return version
+            # una versión menor: el diario se reemplazó (BD restaurada) y no dice qué cambió
+            if self._version is not None and version > self._version:
+                claves = claves_cambiadas(con, "equipos", self._version, version)
+                if len(claves) <= LIMITE_REFRESCO_INCREMENTAL:
+                    self._releer(con, claves)
+                    self._version = version
+                    return version
+            self._textos = {}
+            self._por_id = {f[0]: self._registro(f) for f in con.execute(_SELECT_LISTA_EQUIPOS)}
+            self._ordenes = None
+            self._version = version
+            return version
+
+    def _releer(self, con, claves: list) -> None:
+        if not claves:
+            return
+        for clave in claves:
+            self._por_id.pop(clave, None)
+        for i in range(0, len(claves), TAMANO_LOTE):
+            lote = claves[i:i + TAMANO_LOTE]
+            for f in con.execute(f"{_SELECT_LISTA_EQUIPOS} WHERE id_equipo IN ({','.join('?' * len(lote))})", lote):
+                self._por_id[f[0]] = self._registro(f)
+        self._ordenes = None
+
+    def _registro(self, fila) -> RegistroEquipo:
+        registro = RegistroEquipo(*fila)
+        for campo in self._CAMPOS_COMPARTIDOS:
+            valor = getattr(registro, campo)
+            setattr(registro, campo, self._textos.setdefault(valor, valor))
+        return registro
+
+    def _indices(self):
+        if self._ordenes is None:
+            self._ordenes = tuple(
+                sorted(self._por_id, key=lambda i, c=campo: (getattr(self._por_id[i], c) or "").lower())
+                for campo in ("id_equipo", "nombre", "ubicacion")
+            )
+        return self._ordenes
+
+    def existe(self, con, id_equipo: str) -> bool:
+        with self._candado:
+            self.actualizar(con)
+            return id_equipo in self._por_id
+
+    def obtener(self, con, id_equipo: str):
+        with self._candado:
+            self.actualizar(con)
+            return self._por_id.get(id_equipo)
+
+    def buscar(self, con, texto: str, limite=LIMITE_SUGERENCIAS) -> list:
+        """Equipos cuyo ID, nombre o ubicación empiezan con `texto`: [(id_equipo, nombre, ubicacion)].
+
+        Sin distinguir mayúsculas; prioridad ID, luego nombre y ubicación, sin duplicados.
+        """
+        with self._candado:
+            self.actualizar(con)
+            ordenes = self._indices()
+            texto = (texto or "").strip().lower()
+            if not texto:
+                ids = ordenes[0][:limite]
+            else:
+                ids = {}
+                for campo, orden in zip(("id_equipo", "nombre", "ubicacion"), ordenes):
+                    def clave(i, c=campo):
+                        return (getattr(self._por_id[i], c) or "").lower()
+                    pos = bisect.bisect_left(orden, texto, key=clave)
+                    while pos < len(orden) and len(ids) < limite and clave(orden[pos]).startswith(texto):
+                        ids.setdefault(orden[pos], None)
+                        pos += 1
+                    if len(ids) >= limite:
+                        break
+            return [(r.id_equipo, r.nombre, r.ubicacion) for r in map(self._por_id.get, ids)]
+
+    def lista(self, con):
+        """(version, filas) de todos los equipos ordenados por nombre, como la lista de la pestaña."""
+        with self._candado:
+            version = self.actualizar(con)
+            return version, [self._por_id[i].fila() for i in self._indices()[1]]
+
+    def delta(self, con, desde: int, limite=LIMITE_REFRESCO_INCREMENTAL):
+        """Como delta_lista('equipos'), pero las filas salen de la caché en lugar de la BD."""
+        with self._candado:
+            version = self.actualizar(con)
+            if version < desde:
+                return version, None, None
+            claves = claves_cambiadas(con, "equipos", desde, version)
+            if len(claves) > limite:
+                return version, None, None
+            filas = [self._por_id[k].fila() for k in claves if k in self._por_id]
+            return version, filas, [k for k in claves if k not in self._por_id]
+
+
+_CACHES_EQUIPOS = {}
+_CANDADO_CACHES = threading.Lock()
+
+
+def cache_equipos(con) -> CacheEquipos:
+    """La caché de equipos de la BD de `con`: una sola por archivo en todo el proceso."""
+    ruta = ruta_bd(con)
+    clave = os.path.abspath(ruta) if ruta else id(con)  # BD en memoria: una por conexión
+    with _CANDADO_CACHES:
+        if clave not in _CACHES_EQUIPOS:
+            _CACHES_EQUIPOS[clave] = CacheEquipos()
+        return _CACHES_EQUIPOS[clave]
+
+
+def medir_cache_equipos(equipos=100_000) -> dict:
+    """Memoria y tiempos de la caché con `equipos` equipos sintéticos en una BD temporal."""
+    carpeta = tempfile.mkdtemp(prefix="cache_equipos_")
+    con = iniciar_bd(os.path.join(carpeta, "medicion.db"))
+    try:
+        with con:
+            con.executemany(
+                "INSERT INTO equipos(id_equipo, nombre, marca, modelo, serie, ubicacion, descripcion, fecha_registro) "
+                "VALUES(?,?,?,?,?,?,?,?)",
+                ((f"EQ-{n:06d}", f"Equipo {n % 997}", f"Marca {n % 37}", f"Modelo {n % 113}", f"S{n:08d}",
+                  f"Laboratorio {n % 41}", "", "2024-01-01 08:00:00") for n in range(equipos)))
+        cache = CacheEquipos()
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        cache.actualizar(con)
+        carga = time.perf_counter() - inicio
+        registros, _ = tracemalloc.get_traced_memory()
+        inicio = time.perf_counter()
+        cache.buscar(con, "equipo 5")
+        primera_busqueda = time.perf_counter() - inicio
+        total, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        inicio = time.perf_counter()
+        for n in range(100):
+            cache.buscar(con, f"eq-{n:03d}")
+        busqueda = (time.perf_counter() - inicio) / 100
+        actualizar_equipo(con, "EQ-000001", {"id_equipo": "EQ-000001", "nombre": "Renombrado", "marca": "",
+                                             "modelo": "", "serie": "", "ubicacion": "", "descripcion": ""})
+        inicio = time.perf_counter()
+        cache.actualizar(con)
+        incremental = time.perf_counter() - inicio
+    finally:
+        con.close()
+        shutil.rmtree(carpeta, ignore_errors=True)
+    return {
+        "equipos": equipos,
+        "bytes_registros": registros,
+        "bytes_con_indices": total,
+        "bytes_por_equipo": round(total / max(equipos, 1), 1),
+        "mb_por_100k": round(total / max(equipos, 1) * 100_000 / 2**20, 1),
+        "ms_carga": round(carga * 1000, 1),
+        "ms_primera_busqueda": round(primera_busqueda * 1000, 1),
+        "ms_busqueda": round(busqueda * 1000, 3),
+        "ms_refresco_incremental": round(incremental * 1000, 3),
+    }
+
+
+# ============================================================
+# 6.10) PLANES DE MANTENIMIENTO (GENERACIÓN MENSUAL DE ÓRDENES)
+# ============================================================
+COLUMNAS_PLAN = ("id_plan", "nombre", "equipo_id", "categoria", "tipo", "cada_meses", "dia",
+                 "inicio", "proveedor", "costo", "notas", "activo")
+
+# Un plan toca en el periodo si ya empezó y han pasado múltiplos de `cada_meses` desde `inicio`
+# ('AAAA-MM'). Los equipos se eligen por ID o por nombre (categoría, sin distinguir mayúsculas);
+# las dos ramas del UNION usan el índice correspondiente de equipos (CROSS JOIN fija el orden: con
+# estadísticas de ANALYZE el planificador prefería recorrer equipos completo). El ID es determinista
+# (P-AAAAMM-plan-equipo), así que repetir la generación no duplica: ON CONFLICT lo salta y
+# NOT EXISTS evita recrear las órdenes que ya pasaron a históricos.
+_SQL_GENERAR_PERIODO = """
+    INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo, creado_por, registrado_en)
+    WITH vigentes AS (
+        SELECT * FROM planes
+        WHERE activo
+          AND :mes >= CAST(substr(inicio, 1, 4) AS INTEGER) * 12 + CAST(substr(inicio, 6, 2) AS INTEGER)
+          AND (:mes - (CAST(substr(inicio, 1, 4) AS INTEGER) * 12 + CAST(substr(inicio, 6, 2) AS INTEGER))) % cada_meses = 0
+    ),
+    ordenes AS (
+        SELECT p.id_plan, p.nombre, p.tipo, p.dia, p.proveedor, p.costo, p.notas, e.id_equipo
+        FROM vigentes p CROSS JOIN equipos e ON e.id_equipo = p.equipo_id
+        UNION ALL
+        SELECT p.id_plan, p.nombre, p.tipo, p.dia, p.proveedor, p.costo, p.notas, e.id_equipo
+        FROM vigentes p CROSS JOIN equipos e ON e.nombre = p.categoria COLLATE NOCASE
+    )
+    SELECT 'P-' || :periodo || '-' || o.id_plan || '-' || o.id_equipo,
+           o.id_equipo, :prefijo_fecha || printf('%02d', o.dia), o.tipo,
+           COALESCE(NULLIF(o.notas, ''), 'Plan: ' || o.nombre), 'Pendiente',
+           COALESCE(o.proveedor, ''), COALESCE(o.costo, 0), :usuario, :ahora
+    FROM ordenes o
+    WHERE NOT EXISTS (
+        SELECT 1 FROM historicos h WHERE h.id_mantenimiento = 'P-' || :periodo || '-' || o.id_plan || '-' || o.id_equipo
+    )
+    ON CONFLICT(id_mantenimiento) DO NOTHING;
+"""
+
+
+def _validar_plan(datos: dict) -> tuple:
+    """Tupla de columnas (sin id_plan) de un plan; ValueError si algo no cuadra."""
+    nombre = (datos.get("nombre") or "").strip()
+    equipo_id = (datos.get("equipo_id") or "").strip() or None
+    categoria = (datos.get("categoria") or "").strip() or None
+    if not nombre:
+        raise ValueError("El plan necesita un nombre.")
+    if (equipo_id is None) == (categoria is None):
+        raise ValueError("Indica un equipo o una categoría (no ambos).")
+    inicio = (datos.get("inicio") or "").strip()
+    try:
+        datetime.strptime(inicio, "%Y-%m")
+    except ValueError:
+        raise ValueError("El primer periodo debe ser AAAA-MM.") from None
+    try:
+        cada_meses, dia = int(datos.get("cada_meses") or 1), int(datos.get("dia") or 1)
+        costo = float(datos.get("costo") or 0)
+    except ValueError:
+        raise ValueError("Cada, día y costo deben ser numéricos.") from None
+    if not (1 <= cada_meses <= 120 and 1 <= dia <= 28):
+        raise ValueError("Rangos válidos: cada 1–120 meses, día 1–28.")
+    return (nombre, equipo_id, categoria, datos.get("tipo") or "Preventivo", cada_meses,
+            dia, inicio, datos.get("proveedor") or "", costo,
+            datos.get("notas") or "", 1 if datos.get("activo", True) else 0)
+
+
+def listar_planes(con) -> list:
+    return con.execute(f"SELECT {', '.join(COLUMNAS_PLAN)} FROM planes ORDER BY nombre, id_plan;").fetchall()
+
+
+def crear_plan(con, datos: dict) -> int:
+    """Alta de un plan. Lanza ValueError si los datos no son válidos o IntegrityError si el equipo no existe."""
+    with con:
+        cur = con.execute(f"INSERT INTO planes({', '.join(COLUMNAS_PLAN[1:])}) VALUES({','.join('?' * 11)})",
+                          _validar_plan(datos))
+    return cur.lastrowid
+
+
+def actualizar_plan(con, id_plan: int, datos: dict) -> None:
+    with con:
+        con.execute(f"UPDATE planes SET {', '.join(c + '=?' for c in COLUMNAS_PLAN[1:])} WHERE id_plan=?",
+                    _validar_plan(datos) + (id_plan,))
+
+
+def eliminar_plan(con, id_plan: int) -> None:
+    """Borra el plan; las órdenes ya generadas se conservan."""
+    with con:
+        con.execute("DELETE FROM planes WHERE id_plan=?", (id_plan,))
+
+
+def siguiente_periodo(hoy=None) -> str:
+    """'AAAA-MM' del mes siguiente a `hoy`."""
+    hoy = hoy or date.today()
+    return f"{hoy.year + hoy.month // 12}-{hoy.month % 12 + 1:02d}"
+
+
+def generar_periodo(con, periodo: str, usuario_id=None) -> dict:
+    """Crea en un solo INSERT ... SELECT las órdenes Pendientes que los planes activos deben en `periodo`
+    ('AAAA-MM'). Es idempotente: repetirla no crea duplicados."""
+    inicio = datetime.strptime(periodo, "%Y-%m")
+    parametros = {
+        "mes": inicio.year * 12 + inicio.month,
+        "periodo": inicio.strftime("%Y%m"),
+        "prefijo_fecha": inicio.strftime("%Y-%m-"),
+        "usuario": usuario_id,
+        "ahora": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    reloj = time.perf_counter()
+    with con:
+        cur = con.execute(_SQL_GENERAR_PERIODO, parametros)
+    return {"periodo": periodo, "generados": cur.rowcount, "segundos": round(time.perf_counter() - reloj, 3)}
+
+
+# ============================================================
+# 6.11) PLANES DE CONSULTA (VERIFICACIÓN CONTRA REGRESIONES)
+# ============================================================
+# Consultas calientes: nombre -> (llamada a la capa de datos, presupuesto en ms, tablas o alias que
+# puede recorrer completos). Se ejecuta la función real; sus sentencias se capturan con el trace de
+# sqlite3 y pasan por EXPLAIN QUERY PLAN. Un SCAN no declarado o un B-tree temporal (ORDER BY,
+# DISTINCT o GROUP BY sin índice) es una falla. Presupuestos para el conjunto sintético por defecto.
+CONSULTAS_CALIENTES = {
+    "lista_equipos": (lambda con, m: con.execute(_SELECT_LISTA_EQUIPOS).fetchall(), 400, ("equipos",)),
+    "lista_mantenimientos": (lambda con, m: con.execute(SQL_LISTA_MANTENIMIENTOS).fetchall(), 1200, ("m",)),
+    "alertas": (lambda con, m: calcular_alertas(con, detallado=True), 300, ("e",)),
+    "historicos_anios": (lambda con, m: anios_con_historicos(con), 10, ()),
+    "historicos_por_mes": (lambda con, m: contar_historicos_por_mes(con, m["anio"]), 150, ()),
+    "historicos_pagina": (lambda con, m: listar_historicos(con, m["anio"], m["mes"]), 20, ()),
+    "historicos_pagina_siguiente": (lambda con, m: listar_historicos(con, m["anio"], m["mes"], m["cursor"]), 20, ()),
+    "obtener_mantenimiento": (lambda con, m: obtener_mantenimiento(con, m["id_mantenimiento"]), 5, ()),
+    "insertar_mantenimiento": (lambda con, m: insertar_mantenimiento(con, {
+        "id_mantenimiento": nuevo_id_mantenimiento(), "equipo_id": m["id_equipo"], "fecha": m["hoy"],
+        "tipo": "Correctivo", "notas": "", "estado": "Pendiente", "proveedor": "", "costo": 0,
+        "registrado_en": m["hoy"]}, None), 60, ()),
+    "cambiar_estado_lote": (lambda con, m: cambiar_estado_mantenimientos(con, m["lote"], "Completado"), 100, ()),
+    "asignar_proveedor_lote": (lambda con, m: asignar_proveedor(con, m["lote"], "Proveedor X"), 100, ()),
+    "archivar": (lambda con, m: archivar_mantenimientos(con, m["archivar_antes"]), 800, ()),
+    "generar_periodo": (lambda con, m: generar_periodo(con, m["periodo"]), 800, ("planes", "p")),
+    "version_tabla": (lambda con, m: version_tabla(con, "mantenimientos"), 5, ()),
+    "cambios_desde": (lambda con, m: cambios_desde(con, m["version"]), 30, ()),
+    "cambios_desde_tabla": (lambda con, m: cambios_desde(con, m["version"], ["mantenimientos"]), 30, ()),
+    "delta_lista": (lambda con, m: delta_lista(con, "mantenimientos", m["version"]), 60, ()),
+    "api_pagina_equipos": (lambda con, m: _api_listar(con, "equipos", {"despues": [m["id_equipo"]]}), 20, ()),
+    "api_pagina_mantenimientos": (lambda con, m: _api_listar(con, "mantenimientos", {"despues": [m["id_mantenimiento"]]}), 20, ()),
+    "api_pagina_historicos": (lambda con, m: _api_listar(con, "historicos", {"despues": [m["id_historico"]]}), 20, ()),
+    "api_obtener_equipo": (lambda con, m: _api_obtener(con, "equipos", m["id_equipo"]), 5, ()),
+    "adjuntos_mantenimiento": (lambda con, m: listar_adjuntos(con, id_mantenimiento=m["id_mantenimiento"]), 5, ()),
+    "adjuntos_equipo": (lambda con, m: listar_adjuntos(con, m["id_equipo"]), 5, ()),
+    "linea_tiempo_equipo": (lambda con, m: list(linea_de_tiempo(con, m["id_equipo"])), 10, ()),
+    "linea_tiempo_pagina_siguiente": (lambda con, m: pagina_linea_de_tiempo(
+        con, m["id_equipo"], pagina_linea_de_tiempo(con, m["id_equipo"], limite=3)[1]), 5, ()),
+    "carga_mes": (lambda con, m: conteo_por_dia(con, int(m["hoy"][:4]), int(m["hoy"][5:7])), 10, ()),
+}
+
+
+def _datos_sinteticos(con, equipos: int) -> dict:
+    """Llena una BD recién creada y devuelve la muestra de parámetros para CONSULTAS_CALIENTES.
+
+    Cinco mantenimientos por equipo en los últimos dos años y cinco históricos por equipo antes.
+    """
+    hoy = date.today()
+    dias = [(hoy - timedelta(days=d)).strftime("%Y-%m-%d") for d in range(2200)]
+    with con:
+        con.executemany(
+            "INSERT INTO equipos(id_equipo, nombre, marca, modelo, serie, ubicacion, descripcion, fecha_registro) "
+            "VALUES(?,?,?,?,?,?,?,?)",
+            ((f"EQ-{n:06d}", f"Equipo {n % 50}", f"Marca {n % 37}", f"Modelo {n % 113}", f"S{n:08d}",
+              f"Laboratorio {n % 41}", "", "2024-01-01 08:00:00") for n in range(equipos)))
+        con.executemany(
+            "INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo, registrado_en) "
+            "VALUES(?,?,?,?,?,?,?,?,?)",
+            ((f"M-{n:07d}", f"EQ-{n % equipos:06d}", dias[n * 37 % 730], ("Preventivo", "Correctivo")[n % 2],
+              "Servicio de rutina", ("Pendiente", "Completado")[n % 3 > 0], f"Proveedor {n % 23}", 150.0,
+              "2024-01-01 08:00:00") for n in range(equipos * 5)))
+        con.executemany(
+            "INSERT INTO historicos(id_historico, id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo) "
+            "VALUES(?,?,?,?,?,?,?,?,?)",
+            ((f"H-{n:07d}", f"MH-{n:07d}", f"EQ-{n % equipos:06d}", dias[730 + n * 53 % 1460], "Preventivo",
+              "Servicio anterior", "Completado", f"Proveedor {n % 23}", 150.0) for n in range(equipos * 5)))
+    for n in range(0, equipos, 100):
+        crear_plan(con, {"nombre": f"Plan {n}", "equipo_id": f"EQ-{n:06d}", "inicio": "2024-01"})
+    for n in range(5):
+        crear_plan(con, {"nombre": f"Plan categoría {n}", "categoria": f"equipo {n}", "inicio": "2024-01", "cada_meses": 2})
+
+    anio, mes = int(dias[800][:4]), int(dias[800][5:7])
+    pagina = listar_historicos(con, anio, mes)
+    return {
+        "hoy": hoy.strftime("%Y-%m-%d"),
+        "anio": anio,
+        "mes": mes,
+        "cursor": (pagina[-1][3], pagina[-1][-1]) if pagina else None,
+        "id_equipo": f"EQ-{equipos // 2:06d}",
+        "id_mantenimiento": f"M-{equipos:07d}",
+        "id_historico": f"H-{equipos:07d}",
+        "lote": [f"M-{n:07d}" for n in range(0, min(equipos * 5, 5000), 100)],
+        "archivar_antes": dias[700],
+        "periodo": siguiente_periodo(),
+        "version": version_actual(con) - 500,
+    }
+
+
+def _problemas_plan(detalles: list, recorre: tuple) -> list:
+    problemas = []
+    for detalle in detalles:
+        if "USE TEMP B-TREE" in detalle:
+            problemas.append(detalle)
+        elif detalle.startswith("SCAN ") and not detalle.startswith("SCAN CONSTANT ROW") \
+                and detalle.split()[1] not in recorre:
+            problemas.append(detalle)
+    return problemas
+
+
+def verificar_consultas(equipos=20_000, holgura=1.0) -> dict:
+    """Corre cada consulta de CONSULTAS_CALIENTES sobre una BD sintética temporal.
+
+    Devuelve el detalle por consulta y `fallas`: las que recorren una tabla sin índice, ordenan con un
+    B-tree temporal o exceden su presupuesto (multiplicado por `holgura`).
+    """
+    carpeta = tempfile.mkdtemp(prefix="consultas_")
+    con = iniciar_bd(os.path.join(carpeta, "verificacion.db"))
+    try:
+        inicio = time.perf_counter()
+        muestra = _datos_sinteticos(con, equipos)
+        con.execute("ANALYZE;")
+        preparacion = time.perf_counter() - inicio
+        consultas, fallas = [], []
+        for nombre, (llamada, presupuesto, recorre) in CONSULTAS_CALIENTES.items():
+            sentencias = []
+            con.set_trace_callback(sentencias.append)
+            try:
+                inicio = time.perf_counter()
+                llamada(con, muestra)
+                ms = (time.perf_counter() - inicio) * 1000
+            finally:
+                con.set_trace_callback(None)
+            problemas = []
+            for sql in dict.fromkeys(sentencias):
+                if sql.split(None, 1)[0].upper() not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+                    continue
+                detalles = [f[3] for f in con.execute("EXPLAIN QUERY PLAN " + sql)]
+                problemas += _problemas_plan(detalles, recorre)
+            if ms > presupuesto * holgura:
+                problemas.append(f"{ms:.1f} ms excede el presupuesto de {presupuesto * holgura:g} ms")
+            if problemas:
+                fallas.append(nombre)
+            consultas.append({"nombre": nombre, "ms": round(ms, 2), "presupuesto_ms": presupuesto * holgura,
+                              "problemas": list(dict.fromkeys(problemas))})
+    finally:
+        con.close()
+        shutil.rmtree(carpeta, ignore_errors=True)
+    return {
+        "equipos": equipos,
+        "segundos_preparacion": round(preparacion, 2),
+        "consultas": consultas,
+        "fallas": fallas,
+    }
+
+
+def medir_claves_enteras(filas=200_000, busquedas=20_000) -> dict:
+    """Índices y búsquedas de mantenimientos con la clave de texto anterior y con la clave entera.
+
+    Crea una BD temporal con el esquema anterior y `filas` mantenimientos, mide, la migra con
+    iniciar_bd() (que llama a migrar_clave_entera) y vuelve a medir.
+    """
+    carpeta = tempfile.mkdtemp(prefix="claves_enteras_")
+    archivo = os.path.join(carpeta, "medicion.db")
+    equipos = max(filas // 10, 1)
+    hoy = date.today()
+    # mismo formato que los IDs de la interfaz: M-AAAAMMDDHHMMSS-xxxxxx
+    ids = [f"M-{hoy - timedelta(days=n * 37 % 730):%Y%m%d}{n % 86400:06d}-{n * 2654435761 % 16**6:06x}"
+           for n in range(filas)]
+    muestra = [ids[n * 7919 % filas] for n in range(min(busquedas, filas))]
+
+    def _tamanos(con):
+        try:
+            return dict(con.execute("""
+                SELECT s.name, SUM(s.pgsize) FROM dbstat s JOIN sqlite_master m ON m.name = s.name
+                WHERE m.tbl_name = 'mantenimientos' GROUP BY s.name ORDER BY s.name;
+            """))
+        except sqlite3.OperationalError:  # SQLite compilado sin la tabla virtual dbstat
+            return {}
+
+    def _us_por_consulta(con, sql, parametros):
+        for p in parametros[:1000]:  # calienta la caché de páginas
+            con.execute(sql, p).fetchall()
+        inicio = time.perf_counter()
+        for p in parametros:
+            con.execute(sql, p).fetchall()
+        return round((time.perf_counter() - inicio) / len(parametros) * 1e6, 2)
+
+    try:
+        con = sqlite3.connect(archivo)
+        try:
+            con.executescript("""
+                CREATE TABLE equipos(
+                    id_equipo TEXT PRIMARY KEY, nombre TEXT NOT NULL, marca TEXT, modelo TEXT, serie TEXT,
+                    ubicacion TEXT, descripcion TEXT
+                );
+                CREATE TABLE mantenimientos(
+                    id_mantenimiento TEXT PRIMARY KEY, equipo_id TEXT NOT NULL, fecha TEXT NOT NULL,
+                    tipo TEXT NOT NULL, notas TEXT, estado TEXT NOT NULL DEFAULT 'Pendiente', proveedor TEXT,
+                    costo REAL DEFAULT 0, creado_por INTEGER, registrado_en TEXT,
+                    FOREIGN KEY(equipo_id) REFERENCES equipos(id_equipo) ON DELETE CASCADE ON UPDATE CASCADE
+                );
+                CREATE INDEX idx_mantenimientos_fecha ON mantenimientos(fecha, id_mantenimiento);
+                CREATE INDEX idx_mantenimientos_equipo ON mantenimientos(equipo_id, fecha);
+            """)
+            with con:
+                con.executemany("INSERT INTO equipos(id_equipo, nombre) VALUES(?, ?)",
+                                ((f"EQ-{n:06d}", f"Equipo {n % 50}") for n in range(equipos)))
+                con.executemany(
+                    "INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo) "
+                    "VALUES(?,?,?,?,?,?,?,?)",
+                    ((ids[n], f"EQ-{n % equipos:06d}", f"{ids[n][2:6]}-{ids[n][6:8]}-{ids[n][8:10]}",
+                      ("Preventivo", "Correctivo")[n % 2], "Servicio de rutina", ("Pendiente", "Completado")[n % 3 > 0],
+                      f"Proveedor {n % 23}", 150.0) for n in range(filas)))
+            cursores = [con.execute("SELECT fecha, id_mantenimiento FROM mantenimientos WHERE id_mantenimiento=?",
+                                    (clave,)).fetchone() for clave in muestra[:2000]]
+            antes = {
+                "bytes": _tamanos(con),
+                "us_por_id_publico": _us_por_consulta(
+                    con, "SELECT fecha, estado, costo FROM mantenimientos WHERE id_mantenimiento=?",
+                    [(clave,) for clave in muestra]),
+                "us_por_pagina": _us_por_consulta(con, """
+                    SELECT id_mantenimiento, fecha, estado FROM mantenimientos WHERE (fecha, id_mantenimiento) < (?, ?)
+                    ORDER BY fecha DESC, id_mantenimiento DESC LIMIT 50
+                """, cursores),
+            }
+        finally:
+            con.close()
+
+        inicio = time.perf_counter()
+        con = iniciar_bd(archivo)
+        migracion = time.perf_counter() - inicio
+        try:
+            enteros = [con.execute("SELECT id FROM mantenimientos WHERE id_mantenimiento=?", (clave,)).fetchone()
+                       for clave in muestra]
+            cursores = [con.execute("SELECT fecha, id FROM mantenimientos WHERE id_mantenimiento=?",
+                                    (clave,)).fetchone() for clave in muestra[:2000]]
+            despues = {
+                "bytes": _tamanos(con),
+                "us_por_id": _us_por_consulta(con, "SELECT fecha, estado, costo FROM mantenimientos WHERE id=?", enteros),
+                "us_por_id_publico": _us_por_consulta(
+                    con, "SELECT fecha, estado, costo FROM mantenimientos WHERE id_mantenimiento=?",
+                    [(clave,) for clave in muestra]),
+                "us_por_pagina": _us_por_consulta(con, """
+                    SELECT id_mantenimiento, fecha, estado FROM mantenimientos WHERE (fecha, id) < (?, ?)
+                    ORDER BY fecha DESC, id DESC LIMIT 50
+                """, cursores),
+            }
+        finally:
+            con.close()
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+    return {
+        "filas": filas,
+        "busquedas": len(muestra),
+        "clave_texto": antes,
+        "clave_entera": despues,
+        "segundos_migracion": round(migracion, 2),
+    }
+
+
+# ============================================================
+# 6.12) MANTENIMIENTO DE LA BD (ESTADÍSTICAS Y COMPACTACIÓN)
+# ============================================================
+CAMBIOS_PARA_ANALYZE = 5000           # entradas del diario desde el último ANALYZE para darlo por viejo
+LIMITE_ANALISIS = 2000                # PRAGMA analysis_limit: ANALYZE muestrea en vez de leer tablas completas
+PAGINAS_VACUUM_POR_PASO = 512         # páginas libres que devuelve cada paso en reposo (2 MB con páginas de 4 KB)
+BYTES_MIGRACION_EN_REPOSO = 200 * 2**20   # más grande que esto, el VACUUM de migración solo se hace por CLI
+REPOSO_MANTENIMIENTO_BD_S = 120       # segundos sin teclado ni ratón para considerar la interfaz en reposo
+INTERVALO_MANTENIMIENTO_BD_MS = 60 * 1000
+
+
+def _bytes_bd(con) -> int:
+    return con.execute("PRAGMA page_count;").fetchone()[0] * con.execute("PRAGMA page_size;").fetchone()[0]
+
+
+def estadisticas_viejas(con) -> bool:
+    """True si nunca se corrió ANALYZE o el diario registra muchos cambios desde entonces."""
+    if not con.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1';").fetchone():
+        return True
+    desde = int(obtener_ajuste(con, "analyze_version", "0") or 0)
+    return version_actual(con) - desde >= CAMBIOS_PARA_ANALYZE
+
+
+def mantener_bd(con, paginas=PAGINAS_VACUUM_POR_PASO, compactar=False, analizar=False) -> dict:
+    """Un paso de mantenimiento, pensado para correr cuando nadie está usando la BD.
+
+    - Si la BD aún no tiene auto_vacuum=INCREMENTAL la migra con un VACUUM completo (solo si es
+      pequeña o se pide `compactar`; es la única parte no acotada).
+    - ANALYZE (muestreado) si las estadísticas están viejas o se pide `analizar`.
+    - Devuelve al sistema hasta `paginas` páginas libres (None: todas).
+
+    Si hizo algo, guarda el resultado (tiempo y tamaño antes/después) en el ajuste 'mantenimiento_bd'.
+    """
+    reloj = time.perf_counter()
+    antes = _bytes_bd(con)
+    res = {"bytes_antes": antes, "migrado": False, "analizado": False, "paginas_liberadas": 0}
+
+    if con.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2 and (compactar or antes <= BYTES_MIGRACION_EN_REPOSO):
+        con.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+        con.execute("VACUUM;")  # el cambio de modo solo se aplica al reconstruir el archivo
+        res["migrado"] = True
+
+    if analizar or estadisticas_viejas(con):
+        version = version_actual(con)
+        con.execute(f"PRAGMA analysis_limit = {LIMITE_ANALISIS};")
+        con.execute("ANALYZE;")
+        establecer_ajuste(con, "analyze_version", str(version))
+        res["analizado"] = True
+
+    libres = con.execute("PRAGMA freelist_count;").fetchone()[0]
+    if libres and con.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2:
+        paso = "" if paginas is None else f"({int(paginas)})"
+        # con execute() el módulo sqlite3 da un solo paso (una página); executescript corre hasta el final
+        con.executescript(f"PRAGMA incremental_vacuum{paso};")
+        res["paginas_liberadas"] = libres - con.execute("PRAGMA freelist_count;").fetchone()[0]
+    res["paginas_libres"] = con.execute("PRAGMA freelist_count;").fetchone()[0]
+
+    res["bytes_despues"] = _bytes_bd(con)
+    res["segundos"] = round(time.perf_counter() - reloj, 3)
+    if res["migrado"] or res["analizado"] or res["paginas_liberadas"]:
+        res["instante"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        establecer_ajuste(con, "mantenimiento_bd", json.dumps(res))
+    return res
+
+
+# ============================================================
+# 6.13) ADJUNTOS (ALMACÉN POR CONTENIDO)
+# ============================================================
+CARPETA_ADJUNTOS = "adjuntos"          # junto a la BD: adjuntos/ab/abcdef… (SHA-256 del contenido)
+TAMANO_BLOQUE_ADJUNTO = 1024 * 1024    # se copian y hashean por bloques; nunca completos en memoria ni en la BD
+LADO_MINIATURA = 96
+GRACIA_LIMPIEZA_ADJUNTOS_S = 3600      # un contenido recién escrito puede no tener aún su fila en adjuntos
+COLUMNAS_ADJUNTO = ("id_adjunto", "nombre", "tipo_mime", "bytes", "sha256", "id_equipo", "id_mantenimiento",
+                    "agregado_en", "agregado_por")
+
+
+def carpeta_adjuntos(con) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(ruta_bd(con))), CARPETA_ADJUNTOS)
+
+
+def ruta_adjunto(carpeta: str, sha256: str) -> str:
+    return os.path.join(carpeta, sha256[:2], sha256)
+
+
+def ruta_miniatura(carpeta: str, sha256: str) -> str:
+    return os.path.join(carpeta, "miniaturas", f"{sha256}.png")
+
+
+_carpeta_abiertos = None   # temporal de la sesión con las copias de los adjuntos abiertos
+
+
+def carpeta_adjuntos_abiertos() -> str:
+    """Carpeta temporal (una por sesión) donde se copian los adjuntos para abrirlos; se borra al salir."""
+    global _carpeta_abiertos
+    with _CANDADO_CACHES:
+        if _carpeta_abiertos is None:
+            _carpeta_abiertos = tempfile.mkdtemp(prefix="adjuntos-abiertos-")
+            atexit.register(shutil.rmtree, _carpeta_abiertos, True)
+        return _carpeta_abiertos
+
+
+def copia_para_abrir(con, id_adjunto: int) -> str:
+    """Ruta de una copia del adjunto en la carpeta de la sesión; si ya se abrió, se reutiliza sin copiar."""
+    adjunto = obtener_adjunto(con, id_adjunto)
+    destino = os.path.join(carpeta_adjuntos_abiertos(), adjunto["sha256"][:16], adjunto["nombre"])
+    if not os.path.exists(destino):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        parcial = destino + ".parcial"
+        copiar_adjunto(con, id_adjunto, parcial)
+        os.replace(parcial, destino)
+    return destino
+
+
+def _guardar_contenido(carpeta: str, fuente) -> tuple:
+    """Copia `fuente` (archivo binario abierto) al almacén calculando su SHA-256 en la misma pasada.
+
+    Devuelve (sha256, bytes). Si el contenido ya estaba no se duplica (solo se actualiza su fecha,
+    para que una limpieza simultánea no lo tome por huérfano).
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    digesto, total = hashlib.sha256(), 0
+    fd, temporal = tempfile.mkstemp(dir=carpeta, prefix=".entrante-")
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            for bloque in iter(lambda: fuente.read(TAMANO_BLOQUE_ADJUNTO), b""):
+                digesto.update(bloque)
+                destino.write(bloque)
+                total += len(bloque)
+            destino.flush()
+            os.fsync(destino.fileno())
+        sha256 = digesto.hexdigest()
+        ruta = ruta_adjunto(carpeta, sha256)
+        if os.path.exists(ruta):
+            os.remove(temporal)
+            os.utime(ruta)
+        else:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return sha256, total
+
+
+def agregar_adjunto(con, archivo: str, id_equipo=None, id_mantenimiento=None, usuario_id=None) -> int:
+    """Guarda `archivo` en el almacén y lo liga a un equipo o a un mantenimiento; devuelve id_adjunto.
+
+    Con `id_mantenimiento` el equipo se toma del mantenimiento (vigente o ya en históricos).
+    Lanza ValueError si el mantenimiento no existe o IntegrityError si el equipo no existe.
+    """
+    if id_mantenimiento:
+        fila = con.execute("""
+            SELECT equipo_id FROM mantenimientos WHERE id_mantenimiento=?
+            UNION ALL
+            SELECT equipo_id FROM historicos WHERE id_mantenimiento=?
+            LIMIT 1
+        """, (id_mantenimiento, id_mantenimiento)).fetchone()
+        if not fila:
+            raise ValueError(f"No existe el mantenimiento '{id_mantenimiento}'.")
+        id_equipo = fila[0]
+    if not id_equipo:
+        raise ValueError("Indica el equipo o el mantenimiento del adjunto.")
+    with open(archivo, "rb") as fuente:
+        sha256, total = _guardar_contenido(carpeta_adjuntos(con), fuente)
+    nombre = os.path.basename(archivo)
+    with con:
+        cur = con.execute(f"INSERT INTO adjuntos({', '.join(COLUMNAS_ADJUNTO[1:])}) VALUES({','.join('?' * 8)})", (
+            nombre, mimetypes.guess_type(nombre)[0] or "application/octet-stream", total, sha256,
+            id_equipo, id_mantenimiento or None, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), usuario_id))
+    return cur.lastrowid
+
+
+def listar_adjuntos(con, id_equipo=None, id_mantenimiento=None) -> list:
+    """Adjuntos de un mantenimiento o, si solo se da el equipo, todos los del equipo (incluye los de sus mantenimientos)."""
+    columnas = f"SELECT {', '.join(COLUMNAS_ADJUNTO)} FROM adjuntos "
+    if id_mantenimiento:
+        return con.execute(columnas + "WHERE id_mantenimiento=? ORDER BY id_adjunto;", (id_mantenimiento,)).fetchall()
+    return con.execute(columnas + "WHERE id_equipo=? ORDER BY id_adjunto;", (id_equipo,)).fetchall()
+
+
+def obtener_adjunto(con, id_adjunto: int) -> dict:
+    fila = con.execute(f"SELECT {', '.join(COLUMNAS_ADJUNTO)} FROM adjuntos WHERE id_adjunto=?", (id_adjunto,)).fetchone()
+    if not fila:
+        raise ValueError(f"No existe el adjunto {id_adjunto}.")
+    return dict(zip(COLUMNAS_ADJUNTO, fila))
+
+
+def copiar_adjunto(con, id_adjunto: int, destino: str) -> int:
+    """Copia el contenido de un adjunto a `destino` por bloques; devuelve los bytes copiados."""
+    adjunto = obtener_adjunto(con, id_adjunto)
+    with open(ruta_adjunto(carpeta_adjuntos(con), adjunto["sha256"]), "rb") as fuente, open(destino, "wb") as salida:
+        shutil.copyfileobj(fuente, salida, TAMANO_BLOQUE_ADJUNTO)
+    return adjunto["bytes"]
+
+
+def _borrar_contenido(carpeta: str, sha256: str) -> int:
+    liberados = 0
+    for ruta in (ruta_adjunto(carpeta, sha256), ruta_miniatura(carpeta, sha256)):
+        try:
+            liberados += os.path.getsize(ruta)
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+    return liberados
+
+
+def eliminar_adjunto(con, id_adjunto: int, gracia_s=GRACIA_LIMPIEZA_ADJUNTOS_S) -> None:
+    """Quita el adjunto; el contenido se borra del disco si ningún otro adjunto lo usa.
+
+    Como en limpiar_adjuntos, un contenido modificado en los últimos `gracia_s` segundos se deja:
+    otro agregar_adjunto pudo reutilizarlo y aún no insertar su fila. Lo quita la próxima limpieza.
+    """
+    with con:
+        fila = con.execute("SELECT sha256 FROM adjuntos WHERE id_adjunto=?", (id_adjunto,)).fetchone()
+        con.execute("DELETE FROM adjuntos WHERE id_adjunto=?", (id_adjunto,))
+        en_uso = fila and con.execute("SELECT 1 FROM adjuntos WHERE sha256=? LIMIT 1", fila).fetchone()
+    if fila and not en_uso:
+        carpeta = carpeta_adjuntos(con)
+        try:
+            reciente = os.path.getmtime(ruta_adjunto(carpeta, fila[0])) >= time.time() - gracia_s
+        except FileNotFoundError:
+            reciente = False
+        if not reciente:
+            _borrar_contenido(carpeta, fila[0])
+
+
+def limpiar_adjuntos(con, gracia_s=GRACIA_LIMPIEZA_ADJUNTOS_S) -> dict:
+    """Borra contenidos sin adjunto que los use (p. ej. tras eliminar un equipo) y copias a medio escribir.
+
+    Recorre la carpeta con scandir; solo toca archivos sin modificar en `gracia_s` segundos.
+    """
+    carpeta = carpeta_adjuntos(con)
+    limite = time.time() - gracia_s
+    res = {"revisados": 0, "borrados": 0, "bytes_liberados": 0}
+    if not os.path.isdir(carpeta):
+        return res
+    for entrada in os.scandir(carpeta):
+        if entrada.is_file() and entrada.name.startswith(".entrante-") and entrada.stat().st_mtime < limite:
+            res["bytes_liberados"] += entrada.stat().st_size
+            os.remove(entrada.path)
+            continue
+        if not (entrada.is_dir() and len(entrada.name) == 2):
+            continue
+        for archivo in os.scandir(entrada.path):
+            res["revisados"] += 1
+            if archivo.stat().st_mtime >= limite:
+                continue
+            if not con.execute("SELECT 1 FROM adjuntos WHERE sha256=? LIMIT 1", (archivo.name,)).fetchone():
+                res["bytes_liberados"] += _borrar_contenido(carpeta, archivo.name)
+                res["borrados"] += 1
+    return res
+
+
+def miniatura_adjunto(carpeta: str, sha256: str, tipo_mime: str):
+    """Ruta de la miniatura PNG del adjunto (se genera una vez y queda en disco) o None si no es imagen o no hay Pillow.
+
+    Para JPEG, `draft` decodifica ya reducido: la foto completa no llega a memoria.
+    """
+    if not PIL_OK or not (tipo_mime or "").startswith("image/"):
+        return None
+    destino = ruta_miniatura(carpeta, sha256)
+    if os.path.exists(destino):
+        return destino
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    with Image.open(ruta_adjunto(carpeta, sha256)) as imagen:
+        imagen.draft("RGB", (LADO_MINIATURA, LADO_MINIATURA))
+        imagen.thumbnail((LADO_MINIATURA, LADO_MINIATURA))
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".png")
+        with os.fdopen(fd, "wb") as salida:
+            imagen.convert("RGBA").save(salida, "PNG")
+    os.replace(temporal, destino)
+    return destino
+
+
+# ============================================================
+# 6.14) FEDERACIÓN DE LABORATORIOS (VARIAS BD EN SOLO LECTURA)
+# ============================================================
+# Reportes de campus. Cada medida es COUNT o SUM: se calcula dentro de cada BD adjunta (con sus
+# índices) en una sola sentencia UNION ALL y el total del campus es la suma de los parciales.
+# `origen` recibe el esquema del laboratorio; :inicio y :fin son el año pedido.
+REPORTES_FEDERADOS = {
+    "inventario": {
+        "origen": "{esquema}.equipos",
+        "grupo": {},
+        "medidas": {"equipos": "COUNT(*)"},
+    },
+    "estado": {
+        "origen": "{esquema}.mantenimientos",
+        "grupo": {"estado": "estado"},
+        "medidas": {"mantenimientos": "COUNT(*)", "costo": "COALESCE(SUM(costo), 0)"},
+    },
+    "servicios_por_mes": {
+        "origen": "(SELECT fecha, costo FROM {esquema}.mantenimientos WHERE fecha >= :inicio AND fecha < :fin "
+                  "UNION ALL SELECT fecha, costo FROM {esquema}.historicos WHERE fecha >= :inicio AND fecha < :fin)",
+        "grupo": {"mes": "substr(fecha, 1, 7)"},
+        "medidas": {"servicios": "COUNT(*)", "costo": "COALESCE(SUM(costo), 0)"},
+    },
+    "proveedores": {
+        "origen": "(SELECT proveedor, costo FROM {esquema}.mantenimientos WHERE fecha >= :inicio AND fecha < :fin "
+                  "UNION ALL SELECT proveedor, costo FROM {esquema}.historicos WHERE fecha >= :inicio AND fecha < :fin)",
+        "grupo": {"proveedor": "COALESCE(proveedor, '')"},
+        "medidas": {"servicios": "COUNT(*)", "costo": "COALESCE(SUM(costo), 0)"},
+    },
+}
+LIMITE_FILAS_FEDERADAS = 1000   # consultas libres (--sql) sobre las vistas
+
+
+def labs_federados(con) -> dict:
+    """{lab: archivo} de la federación (ajuste 'federacion_labs')."""
+    return json.loads(obtener_ajuste(con, "federacion_labs", "{}") or "{}")
+
+
+def configurar_lab(con, lab: str, archivo=None) -> dict:
+    """Agrega un laboratorio a la federación (o lo quita con archivo=None); devuelve la configuración."""
+    labs = labs_federados(con)
+    if archivo is None:
+        labs.pop(lab, None)
+    else:
+        labs[lab] = os.path.abspath(archivo)
+    establecer_ajuste(con, "federacion_labs", json.dumps(labs, ensure_ascii=False))
+    return labs
+
+
+def _literal_sql(texto) -> str:
+    return "'" + str(texto).replace("'", "''") + "'"
+
+
+def abrir_federacion(labs: dict):
+    """Conexión en memoria con cada BD de `labs` adjunta en solo lectura; devuelve (con, {lab: esquema}).
+
+    Crea las vistas TEMP fed_equipos, fed_mantenimientos y fed_historicos: las de cada laboratorio
+    unidas con UNION ALL y una columna `lab`. Nada se copia y los archivos no se modifican.
+    """
+    if not labs:
+        raise ValueError("No hay laboratorios en la federación.")
+    con = sqlite3.connect(":memory:", uri=True)
+    maximo = con.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(labs) > maximo:
+        con.close()
+        raise ValueError(f"SQLite admite {maximo} bases adjuntas por conexión; hay {len(labs)} laboratorios.")
+    esquemas = {}
+    for n, (lab, archivo) in enumerate(sorted(labs.items())):
+        esquema = f"lab{n}"
+        try:
+            con.execute(f"ATTACH DATABASE ? AS {esquema};", (f"file:{pathname2url(os.path.abspath(archivo))}?mode=ro",))
+            con.execute(f"SELECT 1 FROM {esquema}.equipos LIMIT 1;")
+        except sqlite3.Error as e:
+            con.close()
+            raise ValueError(f"No se pudo abrir el laboratorio '{lab}' ({archivo}): {e}") from None
+        esquemas[lab] = esquema
+    for tabla, (_clave, columnas) in COLUMNAS_TABLAS.items():
+        partes = [f"SELECT {_literal_sql(lab)} AS lab, {', '.join(columnas)} FROM {esquema}.{tabla}"
+                  for lab, esquema in esquemas.items()]
+        con.execute(f"CREATE TEMP VIEW fed_{tabla} AS {' UNION ALL '.join(partes)};")
+    con.execute("PRAGMA query_only = ON;")
+    return con, esquemas
+
+
+def reporte_federado(con, esquemas: dict, nombre: str, anio=None) -> dict:
+    """Corre un reporte de REPORTES_FEDERADOS: parciales por laboratorio y total del campus."""
+    reporte = REPORTES_FEDERADOS[nombre]
+    grupo, medidas = reporte["grupo"], reporte["medidas"]
+    seleccion = ", ".join(f"{expr} AS {alias}" for alias, expr in (*grupo.items(), *medidas.items()))
+    agrupar = f" GROUP BY {', '.join(grupo.values())}" if grupo else ""
+    partes = [f"SELECT {_literal_sql(lab)} AS lab, {seleccion} FROM {reporte['origen'].format(esquema=esquema)}{agrupar}"
+              for lab, esquema in esquemas.items()]
+    inicio, fin = rango_periodo(anio or date.today().year)
+    columnas = ("lab", *grupo, *medidas)
+    por_lab = [dict(zip(columnas, f))
+               for f in con.execute(" UNION ALL ".join(partes), {"inicio": inicio, "fin": fin})]
+
+    campus = {}
+    for fila in por_lab:
+        clave = tuple(fila[g] for g in grupo)
+        total = campus.setdefault(clave, {**dict(zip(grupo, clave)), **{m: 0 for m in medidas}})
+        for m in medidas:
+            total[m] += fila[m] or 0
+    return {
+        "reporte": nombre,
+        "anio": anio,
+        "labs": list(esquemas),
+        "por_lab": por_lab,
+        "campus": [campus[k] for k in sorted(campus, key=lambda k: tuple(str(v) for v in k))],
+    }
+
+
+def consulta_federada(con, sql: str, limite=LIMITE_FILAS_FEDERADAS) -> dict:
+    """SELECT libre sobre las vistas fed_*; la conexión es de solo lectura."""
+    cur = con.execute(sql)
+    columnas = [d[0] for d in cur.description or ()]
+    filas = cur.fetchmany(limite)
+    return {"columnas": columnas, "filas": filas, "truncado": cur.fetchone() is not None}
+
+
+# ============================================================
+# 6.15) SINCRONIZACIÓN ENTRE RÉPLICAS (COPIAS DE LA BD)
+# ============================================================
+# Solo se intercambian las claves que el diario registra desde el último punto de sincronización
+# de la pareja (ajuste 'sync:<replica_id de la otra>' en cada copia). Si la misma clave cambió en las
+# dos, gana la última escritura según el diario (instante UTC); en empate, el replica_id mayor.
+# Archivar mueve un mantenimiento de una tabla a otra en una sola operación: sus filas en
+# mantenimientos e históricos se deciden juntas, con el último cambio de cualquiera de ellas.
+# Usuarios no viaja: sus IDs son autoincrementales y chocarían entre copias; un creado_por que no
+# existe en el destino llega como NULL (se cuenta en 'sin_usuario').
+TABLAS_SINCRONIZADAS = ("equipos", "mantenimientos", "historicos")   # en orden de dependencia
+
+
+def _ajuste_en(con, esquema: str, clave: str):
+    fila = con.execute(f"SELECT valor FROM {esquema}.ajustes WHERE clave=?", (clave,)).fetchone()
+    return fila[0] if fila else None
+
+
+def _poner_ajuste_en(con, esquema: str, clave: str, valor: str) -> None:
+    con.execute(f"INSERT INTO {esquema}.ajustes(clave, valor) VALUES(?, ?) "
+                "ON CONFLICT(clave) DO UPDATE SET valor=excluded.valor;", (clave, valor))
+
+
+def replica_id(con) -> str:
+    """Identificador de esta copia de la BD (se crea la primera vez que se pide)."""
+    valor = obtener_ajuste(con, "replica_id")
+    if not valor:
+        valor = uuid.uuid4().hex
+        establecer_ajuste(con, "replica_id", valor)
+    return valor
+
+
+def _version_en(con, esquema: str) -> int:
+    return con.execute(f"SELECT COALESCE(MAX(version), 0) FROM {esquema}.cambios").fetchone()[0]
+
+
+def _base_comun(con) -> int:
+    """Última versión en que los diarios de main y otra coinciden: el momento en que se copió el archivo.
+
+    Búsqueda binaria (los diarios de dos copias son iguales hasta que divergen); 0 si no tienen historia común.
+    """
+    def igual(version):
+        consulta = "SELECT tabla, clave, operacion, instante FROM {}.cambios WHERE version=?"
+        propia = con.execute(consulta.format("main"), (version,)).fetchone()
+        return propia is not None and propia == con.execute(consulta.format("otra"), (version,)).fetchone()
+
+    bajo, alto = 0, min(_version_en(con, "main"), _version_en(con, "otra"))
+    while bajo < alto:
+        medio = (bajo + alto + 1) // 2
+        if igual(medio):
+            bajo = medio
+        else:
+            alto = medio - 1
+    return bajo
+
+
+def _ultimos_cambios(con, esquema: str, tabla: str, desde: int) -> dict:
+    """{clave: instante de su último cambio} para las entradas del diario posteriores a `desde`."""
+    return {clave: instante for clave, instante in con.execute(f"""
+        SELECT clave, instante FROM {esquema}.cambios WHERE tabla=? AND version > ? ORDER BY version
+    """, (tabla, desde))}
+
+
+def _mantenimiento_de(con, tabla: str, clave: str):
+    """id_mantenimiento al que pertenece la fila (de main o, si ahí ya no está, de otra)."""
+    if tabla == "mantenimientos":
+        return clave
+    fila = con.execute("""
+        SELECT id_mantenimiento FROM main.historicos WHERE id_historico=? AND id_mantenimiento IS NOT NULL
+        UNION ALL
+        SELECT id_mantenimiento FROM otra.historicos WHERE id_historico=? AND id_mantenimiento IS NOT NULL
+        LIMIT 1
+    """, (clave, clave)).fetchone()
+    return fila[0] if fila else ("historico", clave)   # sin mantenimiento conocido: se decide sola
+
+
+def sincronizar(con, archivo: str) -> dict:
+    """Intercambia con la copia `archivo` las filas cambiadas desde el último punto común; devuelve el informe.
+
+    Todo ocurre en una transacción sobre los dos archivos (la copia se adjunta como 'otra').
+    """
+    if os.path.abspath(archivo) == os.path.abspath(ruta_bd(con)):
+        raise ValueError("No se puede sincronizar una BD consigo misma.")
+    if not os.path.isfile(archivo):   # iniciar_bd crearía una BD vacía y se le exportaría todo
+        raise FileNotFoundError(f"No existe la copia '{archivo}'.")
+    iniciar_bd(archivo).close()  # la otra copia puede venir de una versión anterior del programa
+    reloj = time.perf_counter()
+    propia_id = replica_id(con)
+    con.execute("ATTACH DATABASE ? AS otra;", (archivo,))
+    try:
+        con.execute("BEGIN IMMEDIATE;")
+        try:
+            otra_id = _ajuste_en(con, "otra", "replica_id")
+            if not otra_id or otra_id == propia_id:   # copia hecha a mano del archivo: se le da identidad propia
+                otra_id = uuid.uuid4().hex
+                _poner_ajuste_en(con, "otra", "replica_id", otra_id)
+            version_a, version_b = _version_en(con, "main"), _version_en(con, "otra")
+            punto = json.loads(_ajuste_en(con, "main", f"sync:{otra_id}") or "null")
+            if punto and punto["propia"] <= version_a and punto["otra"] <= version_b:
+                base_a, base_b = punto["propia"], punto["otra"]
+            else:
+                base_a = base_b = _base_comun(con)
+            informe = {"replica": propia_id, "otra_replica": otra_id, "base": [base_a, base_b],
+                       "tablas": {}, "conflictos": []}
+            usuarios = {"main": None, "otra": None}
+            escrituras = []   # (tabla, esquema destino, columnas, filas a escribir, claves a borrar)
+            cambios = {(esquema, tabla): _ultimos_cambios(con, esquema, tabla, base)
+                       for tabla in TABLAS_SINCRONIZADAS for esquema, base in (("main", base_a), ("otra", base_b))}
+            unidad = {}                          # (tabla, clave) -> id_mantenimiento
+            ultimo = {"main": {}, "otra": {}}    # id_mantenimiento -> último cambio de sus filas en cada copia
+            for esquema in ultimo:
+                for tabla in ("mantenimientos", "historicos"):
+                    for clave, instante in cambios[(esquema, tabla)].items():
+                        if (tabla, clave) not in unidad:
+                            unidad[(tabla, clave)] = _mantenimiento_de(con, tabla, clave)
+                        previo = ultimo[esquema].get(unidad[(tabla, clave)])
+                        ultimo[esquema][unidad[(tabla, clave)]] = max(previo or instante, instante)
+
+            for tabla in TABLAS_SINCRONIZADAS:
+                pk = TABLAS_CON_DIARIO[tabla]
+                # la clave entera `id` es local de cada copia: las filas viajan por su ID público
+                columnas = [c[1] for c in con.execute(f"PRAGMA main.table_info({tabla});") if c[1] != "id"]
+                leer = f"SELECT {', '.join(columnas)} FROM {{}}.{tabla} WHERE {pk}=?"
+                en_a, en_b = cambios[("main", tabla)], cambios[("otra", tabla)]
+                cuenta = {"a_otra": 0, "desde_otra": 0, "iguales": 0, "conflictos": 0, "sin_usuario": 0}
+                hacia = {"main": ([], []), "otra": ([], [])}
+                for clave in sorted(en_a.keys() | en_b.keys()):
+                    fila_a = con.execute(leer.format("main"), (clave,)).fetchone()
+                    fila_b = con.execute(leer.format("otra"), (clave,)).fetchone()
+                    if fila_a == fila_b:
+                        cuenta["iguales"] += 1
+                        continue
+                    if (tabla, clave) in unidad:
+                        cambio_a = ultimo["main"].get(unidad[(tabla, clave)])
+                        cambio_b = ultimo["otra"].get(unidad[(tabla, clave)])
+                    else:
+                        cambio_a, cambio_b = en_a.get(clave), en_b.get(clave)
+                    if cambio_a is not None and cambio_b is not None:
+                        gana_a = (cambio_a, propia_id) > (cambio_b, otra_id)
+                        cuenta["conflictos"] += 1
+                        informe["conflictos"].append({"tabla": tabla, "clave": clave,
+                                                      "gana": "propia" if gana_a else "otra",
+                                                      "instante_propia": cambio_a, "instante_otra": cambio_b})
+                    else:
+                        gana_a = cambio_a is not None
+                    fila, destino = (fila_a, "otra") if gana_a else (fila_b, "main")
+                    cuenta["a_otra" if gana_a else "desde_otra"] += 1
+                    if fila is None:
+                        hacia[destino][1].append((clave,))
+                    else:
+                        hacia[destino][0].append(list(fila))
+                informe["tablas"][tabla] = cuenta
+                for destino, (filas, borrados) in hacia.items():
+                    if "creado_por" in columnas and filas:   # el usuario puede no existir en la otra copia
+                        if usuarios[destino] is None:
+                            usuarios[destino] = {r[0] for r in con.execute(f"SELECT id FROM {destino}.usuarios")}
+                        i = columnas.index("creado_por")
+                        for fila in filas:
+                            if fila[i] is not None and fila[i] not in usuarios[destino]:
+                                fila[i] = None
+                                cuenta["sin_usuario"] += 1
+                    escrituras.append((tabla, destino, columnas, filas, borrados))
+
+            # altas y cambios de padres a hijos; bajas de hijos a padres (un ID de equipo renombrado
+            # llega como alta del nuevo + baja del viejo: sus mantenimientos ya se movieron antes)
+            for tabla, destino, columnas, filas, _borrados in escrituras:
+                if filas:
+                    pk = TABLAS_CON_DIARIO[tabla]
+                    con.executemany(f"""
+                        INSERT INTO {destino}.{tabla}({', '.join(columnas)}) VALUES({','.join('?' * len(columnas))})
+                        ON CONFLICT({pk}) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in columnas if c != pk)}
+                    """, filas)
+            for tabla, destino, _columnas, _filas, borrados in reversed(escrituras):
+                if borrados:
+                    con.executemany(f"DELETE FROM {destino}.{tabla} WHERE {TABLAS_CON_DIARIO[tabla]}=?", borrados)
+
+            # el punto se toma después de escribir: lo que esta sincronización copió no vuelve a viajar
+            version_a, version_b = _version_en(con, "main"), _version_en(con, "otra")
+            _poner_ajuste_en(con, "main", f"sync:{otra_id}", json.dumps({"propia": version_a, "otra": version_b}))
+            _poner_ajuste_en(con, "otra", f"sync:{propia_id}", json.dumps({"propia": version_b, "otra": version_a}))
+            con.execute("COMMIT;")
+        except BaseException:
+            con.execute("ROLLBACK;")
+            raise
+    finally:
+        con.execute("DETACH DATABASE otra;")
+    informe["punto"] = [version_a, version_b]
+    informe["segundos"] = round(time.perf_counter() - reloj, 3)
+    return informe
+
+
+def crear_replica(con, destino: str) -> dict:
+    """Copia verificada de la BD para trabajar fuera de línea, con identidad propia y punto de sincronización."""
+    respaldar_bd(con, destino)
+    copia = abrir_conexion(destino)
+    try:
+        version = version_actual(copia)
+        copia_id = uuid.uuid4().hex
+        establecer_ajuste(copia, "replica_id", copia_id)
+        establecer_ajuste(copia, f"sync:{replica_id(con)}", json.dumps({"propia": version, "otra": version}))
+    finally:
+        copia.close()
+    establecer_ajuste(con, f"sync:{copia_id}", json.dumps({"propia": version, "otra": version}))
+    return {"destino": destino, "replica": copia_id, "version": version}
+
+
+# ============================================================
+# 6.16) LÍNEA DE TIEMPO POR EQUIPO (VIGENTES + HISTÓRICOS)
+# ============================================================
+# Cada rama del UNION ALL recorre su índice (equipo_id, fecha), con el id implícito como desempate,
+# y SQLite mezcla las dos ramas ya ordenadas (MERGE): no hay ordenamiento y cada página lee solo lo
+# que muestra. El cursor guarda la última fila mostrada de cada rama, así que no depende de cómo
+# se intercalen las dos tablas cuando coinciden fecha e id.
+TAMANO_PAGINA_LINEA = 200
+COLUMNAS_LINEA = ("origen", "clave", "fecha", "tipo", "estado", "proveedor", "costo", "notas", "id")
+_DESDE_EL_FINAL = ("\uffff", 2**63 - 1)   # mayor que cualquier (fecha, id)
+
+_SQL_LINEA = f"""
+    SELECT 'M' AS origen, id_mantenimiento, fecha, tipo, estado, proveedor, costo,
+           substr(notas, 1, {LARGO_VISTA_NOTAS + 1}), id
+    FROM mantenimientos WHERE equipo_id = :equipo AND (fecha, id) < (:fecha_m, :id_m)
+    UNION ALL
+    SELECT 'H', id_historico, fecha, tipo, estado, proveedor, costo,
+           substr(notas, 1, {LARGO_VISTA_NOTAS + 1}), id
+    FROM historicos WHERE equipo_id = :equipo AND (fecha, id) < (:fecha_h, :id_h)
+    ORDER BY 3 DESC, 9 DESC LIMIT :limite
+"""
+
+
+def resumen_linea_de_tiempo(con, id_equipo: str) -> dict:
+    """Servicios y costo totales del equipo (vigentes + históricos) y servicios por tipo.
+
+    Cuenta las mismas filas que recorren las páginas: sin fecha no entran en _SQL_LINEA, tampoco aquí.
+    """
+    resumen = {"servicios": 0, "costo": 0.0, "por_tipo": {}}
+    for tipo, costo in con.execute("""
+        SELECT tipo, costo FROM mantenimientos WHERE equipo_id = ? AND fecha IS NOT NULL
+        UNION ALL
+        SELECT tipo, costo FROM historicos WHERE equipo_id = ? AND fecha IS NOT NULL
+    """, (id_equipo, id_equipo)):
+        resumen["servicios"] += 1
+        resumen["costo"] += costo or 0
+        resumen["por_tipo"][tipo] = resumen["por_tipo"].get(tipo, 0) + 1
+    resumen["costo"] = round(resumen["costo"], 2)
+    return resumen
+
+
+def pagina_linea_de_tiempo(con, id_equipo: str, cursor=None, limite=TAMANO_PAGINA_LINEA):
+    """Una página de la línea de tiempo, de lo más reciente a lo más antiguo: (filas, cursor siguiente).
+
+    `cursor` es {origen: (fecha, id)} con la última fila mostrada de cada tabla ('M' vigentes,
+    'H' históricos); None para la primera página.
+    """
+    cursor = dict(cursor or {})
+    fecha_m, id_m = cursor.get("M", _DESDE_EL_FINAL)
+    fecha_h, id_h = cursor.get("H", _DESDE_EL_FINAL)
+    filas = con.execute(_SQL_LINEA, {"equipo": id_equipo, "fecha_m": fecha_m, "id_m": id_m,
+                                     "fecha_h": fecha_h, "id_h": id_h, "limite": limite}).fetchall()
+    for fila in filas:
+        cursor[fila[0]] = (fila[2], fila[8])
+    return filas, cursor
+
+
+def linea_de_tiempo(con, id_equipo: str, tamano=TAMANO_PAGINA_LINEA):
+    """Generador para el ejecutor: primero el resumen (dict) y luego la línea de tiempo por páginas.
+
+    Cada fila es un dict de COLUMNAS_LINEA más el acumulado cronológico hasta ella: `numero`
+    (servicio n.º), `costo_acumulado` y `por_tipo` ({tipo: servicios}). Como la lista va de lo
+    más reciente a lo más antiguo, el acumulado parte del total y se descuenta fila a fila. Todo
+    se lee en una transacción para que el resumen y las páginas vean los mismos datos.
+    """
+    propia = not con.in_transaction
+    if propia:
+        con.execute("BEGIN;")
+    try:
+        resumen = resumen_linea_de_tiempo(con, id_equipo)
+        yield resumen
+        numero, costo, por_tipo = resumen["servicios"], resumen["costo"], dict(resumen["por_tipo"])
+        cursor = None
+        while True:
+            filas, cursor = pagina_linea_de_tiempo(con, id_equipo, cursor, tamano)
+            if not filas:
+                return
+            pagina = []
+            for fila in filas:
+                registro = dict(zip(COLUMNAS_LINEA, fila))
+                registro.update(numero=numero, costo_acumulado=round(costo, 2), por_tipo=dict(por_tipo))
+                numero -= 1
+                costo -= registro["costo"] or 0
+                por_tipo[registro["tipo"]] = por_tipo.get(registro["tipo"], 0) - 1
+                pagina.append(registro)
+            yield pagina
+    finally:
+        if propia:
+            con.commit()
+
+
+# ============================================================
+# 6.17) CARGA DE TRABAJO POR DÍA (CALENDARIOS)
+# ============================================================
+# Los calendarios muestran cuántos mantenimientos hay ya en cada día. Un mes cuesta una sola
+# consulta agrupada por rango sobre el índice de fecha (cubriente: no lee la tabla). Los meses ya
+# contados se guardan por BD y se descartan todos en cuanto el diario registra un cambio en
+# mantenimientos (una fecha editada mueve la cuenta de un mes a otro).
+UMBRALES_CARGA = (1, 3, 6)   # mantenimientos por día desde los que sube el nivel: 1 bajo, 2 medio, 3 alto
+COLORES_CARGA = ("#101826", "#1E3A5F", "#8A6A16", "#8B1E1E")   # fondo por nivel (0 = sin mantenimientos)
+MESES_VECINOS_CARGA = 1      # meses que se cuentan antes y después del visible, para cambiar de mes sin esperar
+MAX_MESES_CARGA = 36         # meses guardados por BD
+
+
+def nivel_carga(n: int) -> int:
+    """Nivel de carga (0..len(UMBRALES_CARGA)) para `n` mantenimientos en un día."""
+    return bisect.bisect_right(UMBRALES_CARGA, n or 0)
+
+
+def mes_vecino(anio: int, mes: int, desplazamiento: int):
+    """(anio, mes) desplazado `desplazamiento` meses."""
+    indice = anio * 12 + (mes - 1) + desplazamiento
+    return indice // 12, indice % 12 + 1
+
+
+def conteo_por_dia(con, anio: int, mes: int) -> dict:
+    """{día del mes: mantenimientos} del mes; los días sin mantenimientos no aparecen."""
+    inicio, fin = rango_periodo(anio, mes)
+    return {int(fecha[8:10]): n for fecha, n in con.execute("""
+        SELECT fecha, COUNT(*) FROM mantenimientos WHERE fecha >= ? AND fecha < ? GROUP BY fecha
+    """, (inicio, fin))}
+
+
+class CacheCarga:
+    """Conteos por día ya calculados, por mes. Vale mientras no cambie la versión de mantenimientos."""
+
+    def __init__(self):
+        self._meses = {}
+        self._version = None
+        self._candado = threading.Lock()
+
+    def mes(self, con, anio: int, mes: int) -> dict:
+        with self._candado:
+            version = version_tabla(con, "mantenimientos")
+            if version != self._version:
+                self._meses.clear()
+                self._version = version
+            clave = (anio, mes)
+            if clave not in self._meses:
+                if len(self._meses) >= MAX_MESES_CARGA:
+                    del self._meses[next(iter(self._meses))]   # el contado hace más tiempo
+                self._meses[clave] = conteo_por_dia(con, anio, mes)
+            return self._meses[clave]
+
+    def meses(self, con, anio: int, mes: int, vecinos=MESES_VECINOS_CARGA) -> dict:
+        """{(anio, mes): conteos} del mes pedido y de sus vecinos, en una sola lectura."""
+        propia = not con.in_transaction
+        if propia:
+            con.execute("BEGIN;")
+        try:
+            return {m: self.mes(con, *m)
+                    for m in (mes_vecino(anio, mes, d) for d in range(-vecinos, vecinos + 1))}
+        finally:
+            if propia:
+                con.commit()
+
+
+_CACHES_CARGA = {}
+
+
+def cache_carga(con) -> CacheCarga:
+    """La caché de carga por día de la BD de `con` (una por archivo, como cache_equipos)."""
+    ruta = ruta_bd(con)
+    clave = os.path.abspath(ruta) if ruta else id(con)
+    with _CANDADO_CACHES:
+        if clave not in _CACHES_CARGA:
+            _CACHES_CARGA[clave] = CacheCarga()
+        return _CACHES_CARGA[clave]
+
+
+# ============================================================
+# 6.18) PRUEBA DE CONTENCIÓN (VARIOS PROCESOS SOBRE EL MISMO ARCHIVO)
+# ============================================================
+# Simula varias PCs de laboratorio escribiendo en la misma BD compartida: cada proceso abre su
+# conexión y repite la mezcla de operaciones con las funciones de la capa de datos. Las
+# escrituras empiezan con BEGIN IMMEDIATE: lo que tarda en obtenerse el candado de escritura (más
+# los intentos fallidos y sus pausas) es la espera por bloqueo que se reporta. Un SQLITE_BUSY que
+# llega a Python (se agotó el busy_timeout) se reintenta con pausa exponencial. La interfaz no
+# reintenta: EjecutorBD muestra el error, así que cada operación con reintento es un aviso de
+# "base de datos bloqueada" que el usuario habría visto.
+MEZCLA_CONTENCION = {"agregar": 30, "editar": 25, "completar": 20, "archivar": 5, "consultar": 20}   # pesos
+MODOS_DIARIO_CONTENCION = ("delete", "wal")
+ESPERAS_CONTENCION_MS = (0, 100, 5000)        # PRAGMA busy_timeout a probar
+REINTENTOS_CONTENCION = 50                    # por operación, antes de darla por fallida
+PAUSA_REINTENTO_S = (0.001, 0.1)              # pausa inicial y máxima entre reintentos
+
+_barrera_contencion = None   # en cada proceso de trabajo: todos empiezan a la vez
+
+
+def _iniciar_proceso_contencion(barrera) -> None:
+    global _barrera_contencion
+    _barrera_contencion = barrera
+
+
+def _es_ocupado(error) -> bool:
+    """True si el error es SQLITE_BUSY / SQLITE_LOCKED (BD ocupada por otra conexión)."""
+    codigo = getattr(error, "sqlite_errorcode", None)
+    if codigo is not None:
+        return codigo & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(error) or "busy" in str(error)
+
+
+def _operacion_contencion(con, operacion: str, azar, equipos: int, hoy: str):
+    """Una operación de la mezcla. Devuelve el instante en que se obtuvo el candado de escritura."""
+    if operacion == "consultar":   # refresco de la lista como lo pide la pestaña
+        version_tabla(con, "mantenimientos")
+        cur = con.execute(SQL_LISTA_MANTENIMIENTOS)
+        cur.fetchmany(TAMANO_LOTE_UI)
+        cur.close()   # un cursor a medias conserva el candado de lectura
+        return time.perf_counter()
+    con.execute("BEGIN IMMEDIATE;")
+    obtenido = time.perf_counter()
+    if operacion == "agregar":
+        dia = date.today() - timedelta(days=azar.randrange(60))
+        insertar_mantenimiento(con, {
+            "id_mantenimiento": nuevo_id_mantenimiento(),
+            "equipo_id": f"EQ-{azar.randrange(equipos):05d}", "fecha": dia.strftime("%Y-%m-%d"),
+            "tipo": azar.choice(("Preventivo", "Correctivo")), "notas": "Prueba de contención",
+            "estado": "Pendiente", "proveedor": "", "costo": azar.randrange(100), "registrado_en": hoy}, None)
+    elif operacion == "archivar":
+        archivar_mantenimientos(con, (date.today() - timedelta(days=45)).strftime("%Y-%m-%d"))
+    else:
+        maximo = con.execute("SELECT MAX(id) FROM mantenimientos").fetchone()[0] or 0
+        filas = con.execute("""
+            SELECT id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo
+            FROM mantenimientos WHERE id >= ? ORDER BY id LIMIT ?
+        """, (azar.randint(0, maximo), 1 if operacion == "editar" else 5)).fetchall()
+        if operacion == "editar" and filas:
+            datos = dict(zip(("id_mantenimiento", "equipo_id", "fecha", "tipo", "notas", "estado", "proveedor", "costo"),
+                             filas[0]))
+            actualizar_mantenimiento(con, datos["id_mantenimiento"],
+                                     {**datos, "proveedor": f"Proveedor {azar.randrange(10)}", "costo": azar.randrange(500)})
+        else:
+            cambiar_estado_mantenimientos(con, [f[0] for f in filas], "Completado")
+    if con.in_transaction:   # nada que escribir (p. ej. sin filas): cerrar la transacción igual
+        con.commit()
+    return obtenido
+
+
+def _trabajador_contencion(archivo: str, modo: str, espera_ms: int, operaciones: int, equipos: int, semilla: int) -> dict:
+    """Proceso de trabajo: abre su conexión y corre `operaciones` de la mezcla; devuelve sus mediciones."""
+    azar = random.Random(semilla)
+    nombres, pesos = list(MEZCLA_CONTENCION), list(MEZCLA_CONTENCION.values())
+    hoy = date.today().strftime("%Y-%m-%d")
+    con = abrir_conexion(archivo, timeout=espera_ms / 1000)
+    con.execute(f"PRAGMA journal_mode = {modo};")
+    res = {"latencias": {n: [] for n in nombres}, "esperas": [], "reintentos": 0,
+           "con_reintento": 0, "fallidas": 0, "errores": []}
+    if _barrera_contencion is not None:
+        _barrera_contencion.wait(timeout=60)
+    res["inicio"] = time.time()
+    try:
+        for operacion in azar.choices(nombres, pesos, k=operaciones):
+            t0 = time.perf_counter()
+            pausa = PAUSA_REINTENTO_S[0]
+            for intento in range(REINTENTOS_CONTENCION + 1):
+                inicio_intento = time.perf_counter()
+                try:
+                    obtenido = _operacion_contencion(con, operacion, azar, equipos, hoy)
+                except sqlite3.OperationalError as e:
+                    if con.in_transaction:
+                        con.rollback()
+                    if not _es_ocupado(e):
+                        raise
+                    res["reintentos"] += 1
+                    time.sleep(pausa * (0.5 + azar.random()))
+                    pausa = min(pausa * 2, PAUSA_REINTENTO_S[1])
+                    continue
+                except sqlite3.IntegrityError as e:   # p. ej. un ID repetido: no es contención
+                    if con.in_transaction:
+                        con.rollback()
+                    res["errores"].append(str(e))
+                    break
+                fin = time.perf_counter()
+                res["latencias"][operacion].append(fin - t0)
+                res["esperas"].append((inicio_intento - t0) + (obtenido - inicio_intento))
+                res["con_reintento"] += intento > 0
+                break
+            else:
+                res["fallidas"] += 1
+    finally:
+        res["fin"] = time.time()
+        con.close()
+    return res
+
+
+def _bd_contencion(carpeta: str, equipos: int, mantenimientos: int) -> str:
+    """BD base de la prueba: `equipos` equipos y `mantenimientos` vigentes en los últimos 90 días."""
+    archivo = os.path.join(carpeta, "base.db")
+    con = iniciar_bd(archivo)
+    importar_equipos(con, ({"id_equipo": f"EQ-{i:05d}", "nombre": f"Equipo {i}", "ubicacion": f"Lab {i % 20}"}
+                           for i in range(equipos)))
+    hoy = date.today()
+    with con:
+        con.executemany("""
+            INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, estado, costo, registrado_en)
+            VALUES(?, ?, ?, ?, ?, ?, ?)
+        """, [(f"M-BASE-{i:06d}", f"EQ-{i % equipos:05d}", (hoy - timedelta(days=i % 90)).strftime("%Y-%m-%d"),
+               ("Preventivo", "Correctivo")[i % 3 == 0], ("Pendiente", "Completado")[i % 2], i % 100,
+               hoy.strftime("%Y-%m-%d")) for i in range(mantenimientos)])
+    con.execute("ANALYZE;")
+    con.close()
+    return archivo
+
+
+def prueba_contencion(procesos=4, operaciones=300, modos=MODOS_DIARIO_CONTENCION, esperas_ms=ESPERAS_CONTENCION_MS,
+                      equipos=500, mantenimientos=5000) -> dict:
+    """Corre la mezcla de MEZCLA_CONTENCION con `procesos` procesos para cada modo de diario y busy_timeout.
+
+    Cada combinación parte de una copia nueva de la misma BD temporal. Por combinación reporta
+    operaciones por segundo, percentiles de latencia (total y por operación), reintentos por
+    SQLITE_BUSY, operaciones que no lo lograron y la espera por candado de escritura.
+    """
+    carpeta = tempfile.mkdtemp(prefix="contencion-")
+    try:
+        base = _bd_contencion(carpeta, equipos, mantenimientos)
+        resultados = []
+        for modo in modos:
+            for espera_ms in esperas_ms:
+                archivo = os.path.join(carpeta, f"{modo}-{espera_ms}.db")
+                shutil.copyfile(base, archivo)
+                con = abrir_conexion(archivo)
+                modo_real = con.execute(f"PRAGMA journal_mode = {modo};").fetchone()[0]   # WAL queda en el archivo
+                con.close()
+                barrera = multiprocessing.Barrier(procesos)
+                with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso_contencion,
+                                         initargs=(barrera,)) as pool:
+                    partes = [f.result() for f in [
+                        pool.submit(_trabajador_contencion, archivo, modo, espera_ms, operaciones, equipos,
+                                    1000 * espera_ms + n)
+                        for n in range(procesos)]]
+
+                por_operacion = {}
+                for nombre in MEZCLA_CONTENCION:
+                    lat = sorted(x for p in partes for x in p["latencias"][nombre])
+                    por_operacion[nombre] = {"n": len(lat), **{c: round(_percentil(lat, q) * 1000, 2)
+                                                               for c, q in (("p50_ms", 50), ("p95_ms", 95))}}
+                latencias = sorted(x for p in partes for lista in p["latencias"].values() for x in lista)
+                esperas = sorted(x for p in partes for x in p["esperas"])
+                segundos = max(p["fin"] for p in partes) - min(p["inicio"] for p in partes)
+                con = abrir_conexion(archivo)
+                integridad = verificar_integridad(con)
+                con.close()
+                resultados.append({
+                    "modo": modo_real,
+                    "busy_timeout_ms": espera_ms,
+                    "operaciones": len(latencias),
+                    "segundos": round(segundos, 3),
+                    "operaciones_por_segundo": round(len(latencias) / segundos, 1) if segundos else 0.0,
+                    "latencia_ms": {c: round(_percentil(latencias, q) * 1000, 2)
+                                    for c, q in (("p50", 50), ("p95", 95), ("p99", 99))}
+                                   | {"max": round((latencias[-1] if latencias else 0) * 1000, 2)},
+                    "por_operacion": por_operacion,
+                    "reintentos_busy": sum(p["reintentos"] for p in partes),
+                    "operaciones_con_reintento": sum(p["con_reintento"] for p in partes),
+                    "fallidas": sum(p["fallidas"] for p in partes),
+                    "errores": sum(len(p["errores"]) for p in partes),
+                    "espera_bloqueo_ms": {"total": round(sum(esperas) * 1000, 1),
+                                          "p95": round(_percentil(esperas, 95) * 1000, 2),
+                                          "max": round((esperas[-1] if esperas else 0) * 1000, 2)},
+                    "integridad": integridad,
+                })
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+    return {"procesos": procesos, "operaciones_por_proceso": operaciones, "mezcla": MEZCLA_CONTENCION,
+            "resultados": resultados}
+
+
+# ============================================================
+# 7) SELECTOR DE FECHA (FALLBACK SIN LIBRERÍAS)
+# ============================================================
+class DatePicker(tk.Toplevel):
+    """Calendario manual para elegir fecha (DD-MM-AAAA) si no hay tkcalendar.
+
+    Con `ejecutor` (o `con`) cada día muestra los mantenimientos que ya tiene (sección 6.17).
+    """
+    def __init__(self, master, entry_obj: tk.Entry, fecha_inicial: str = "", ejecutor=None, con=None):
+        super().__init__(master)
+        self.title("Seleccionar fecha")
+        aplicar_icono_aplicacion(self)
+        self.resizable(False, False)
+        self.entry_obj = entry_obj
+        self._botones = {}   # día -> botón del mes visible
+        self._conteos = (ConteosCalendario(self, ejecutor, self._al_llegar_conteos, con)
+                         if ejecutor is not None or con is not None else None)
+
+        # que no se pierda en fullscreen
+        self.transient(master)
+        self.grab_set()
+        self.focus_set()
+        self.attributes("-topmost", True)
+        self.bind("<Escape>", lambda e: self.destroy())
+
+        hoy = date.today()
+        if fecha_inicial:
+            try:
+                dt = datetime.strptime(fecha_inicial, "%d-%m-%Y").date()
+                self.year, self.month = dt.year, dt.month
+            except Exception:
+                self.year, self.month = hoy.year, hoy.month
+        else:
+            self.year, self.month = hoy.year, hoy.month
+
+        body = ttk.Frame(self)
+        body.pack(padx=8, pady=8)
+
+        nav = ttk.Frame(body)
+        nav.pack(fill="x")
+
+        self.lb_mes = ttk.Label(nav, text="", style="Cuerpo.TLabel")
+        btn_prev = ttk.Button(nav, text="◀", width=3, style="Fantasma.TButton",
+                              command=self._prev_month)
+        btn_next = ttk.Button(nav, text="▶", width=3, style="Fantasma.TButton",
+                              command=self._next_month)
+        btn_prev.pack(side="left")
+        self.lb_mes.pack(side="left", expand=True)
+        btn_next.pack(side="right")
+
+        self.grid_dias = ttk.Frame(body)
+        self.grid_dias.pack(pady=6)
+        if self._conteos:
+            ttk.Label(body, text="Bajo cada día: mantenimientos ya programados",
+                      style="Cuerpo.TLabel").pack()
+
+        self._render()
+        self.update_idletasks()
+        try:
+            x = self.entry_obj.winfo_rootx()
+            y = self.entry_obj.winfo_rooty() + self.entry_obj.winfo_height()
+            self.geometry(f"+{x}+{y}")
+        except Exception:
+            pass
+
+    def destroy(self):
+        if self._conteos:
+            self._conteos.cancelar()
+        super().destroy()
+
+    def _prev_month(self):
+        if self.month == 1:
+            self.month = 12
+            self.year -= 1
+        else:
+            self.month -= 1
+        self._render()
+
+    def _next_month(self):
+        if self.month == 12:
+            self.month = 1
+            self.year += 1
+        else:
+            self.month += 1
+        self._render()
+
+    def _render(self):
+        for w in self.grid_dias.winfo_children():
+            w.destroy()
+        self._botones.clear()
+        self.lb_mes.config(text=f"{calendar.month_name[self.month]} {self.year}")
+
+        for i, dname in enumerate(["Lu","Ma","Mi","Ju","Vi","Sa","Do"]):
+            ttk.Label(self.grid_dias, text=dname, style="Cuerpo.TLabel").grid(row=0, column=i, padx=4, pady=4)
+
+        monthcal = calendar.Calendar(firstweekday=0).monthdayscalendar(self.year, self.month)
+        for r, week in enumerate(monthcal, start=1):
+            for c, day in enumerate(week):
+                if day == 0:
+                    ttk.Label(self.grid_dias, text=" ").grid(row=r, column=c, padx=2, pady=2)
+                    continue
+                def _mkcmd(yy=self.year, mm=self.month, dd=day):
+                    return lambda: self._elegir(yy, mm, dd)
+                boton = ttk.Button(self.grid_dias, text=str(day), width=3, style="Fantasma.TButton",
+                                   command=_mkcmd())
+                boton.grid(row=r, column=c, padx=2, pady=2)
+                self._botones[day] = boton
+        if self._conteos:
+            # lo ya recibido se pinta al momento; el mes y sus vecinos se vuelven a pedir
+            self._pintar_conteos(self._conteos.mes(self.year, self.month) or {})
+
+    def _al_llegar_conteos(self, anio, mes, conteos):
+        if (anio, mes) == (self.year, self.month):
+            self._pintar_conteos(conteos)
+
+    def _pintar_conteos(self, conteos):
+        for day, boton in self._botones.items():
+            n = conteos.get(day, 0)
+            boton.config(text=f"{day}\n{n if n else ' '}", style=f"Carga{nivel_carga(n)}.TButton")
+
+    def _elegir(self, y, m, d):
+        self.entry_obj.delete(0, "end")
+        self.entry_obj.insert(0, f"{d:02d}-{m:02d}-{y:04d}")  # DD-MM-AAAA
+        self.destroy()
+
+
+# ============================================================
+# 7.1) CARGA DE TRABAJO EN LOS CALENDARIOS
+# ============================================================
+class ConteosCalendario:
+    """Lado de la interfaz de CacheCarga: guarda los meses recibidos y pide el visible con sus vecinos.
+
+    `mes()` devuelve al instante lo que ya se tiene (None si el mes aún no llega) y siempre vuelve a
+    pedir, así que un cambio en la BD se refleja al cambiar de mes. `al_llegar(anio, mes, conteos)`
+    se llama por cada mes recibido que sea nuevo o distinto. Sin ejecutor se consulta con `con` aquí mismo.
+    """
+    def __init__(self, widget, ejecutor, al_llegar, con=None):
+        self.widget = widget
+        self.ejecutor = ejecutor
+        self.con = con
+        self.al_llegar = al_llegar
+        self._meses = {}
+
+    def mes(self, anio: int, mes: int):
+        def funcion(c):
+            return cache_carga(c).meses(c, anio, mes)
+        if self.ejecutor is None:
+            self._recibir(funcion(self.con))
+        else:
+            self.ejecutor.enviar(funcion, al_terminar=self._recibir, clave=(self.widget, "carga"))
+        return self._meses.get((anio, mes))
+
+    def cancelar(self):
+        if self.ejecutor is not None:
+            self.ejecutor.cancelar((self.widget, "carga"))
+
+    def _recibir(self, meses):
+        if not self.widget.winfo_exists():
+            return
+        for clave, conteos in meses.items():
+            if self._meses.get(clave) != conteos:
+                self._meses[clave] = conteos
+                self.al_llegar(*clave, conteos)
+
+
+class VistaCargaMensual(tk.Toplevel):
+    """Mes completo con los mantenimientos programados por día. Las celdas se crean una vez y se repintan."""
+    def __init__(self, master, ejecutor):
+        super().__init__(master)
+        self.title("Carga de trabajo")
+        aplicar_icono_aplicacion(self)
+        self.transient(master)
+        self.bind("<Escape>", lambda e: self.destroy())
+        hoy = date.today()
+        self.year, self.month = hoy.year, hoy.month
+
+        marco = ttk.Frame(self, style="Card.TFrame", padding=12)
+        marco.pack(fill="both", expand=True)
+
+        nav = ttk.Frame(marco, style="Card.TFrame")
+        nav.pack(fill="x")
+        ttk.Button(nav, text="◀", width=3, style="Fantasma.TButton",
+                   command=lambda: self._mover(-1)).pack(side="left")
+        ttk.Button(nav, text="▶", width=3, style="Fantasma.TButton",
+                   command=lambda: self._mover(1)).pack(side="left", padx=(4, 0))
+        ttk.Button(nav, text="Hoy", style="Fantasma.TButton",
+                   command=lambda: self._ir(hoy.year, hoy.month)).pack(side="left", padx=8)
+        self.lb_mes = ttk.Label(nav, text="", style="Cuerpo.TLabel")
+        self.lb_mes.pack(side="left", padx=8)
+        self.bind("<Left>", lambda e: self._mover(-1))
+        self.bind("<Right>", lambda e: self._mover(1))
+
+        rejilla = ttk.Frame(marco, style="Card.TFrame")
+        rejilla.pack(pady=8)
+        for c, nombre in enumerate(["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]):
+            ttk.Label(rejilla, text=nombre, style="Cuerpo.TLabel").grid(row=0, column=c, padx=2, pady=(0, 4))
+        self._celdas = {}   # (semana, día de la semana) -> Label; un mes ocupa hasta 6 semanas
+        for r in range(6):
+            for c in range(7):
+                celda = ttk.Label(rejilla, text="", width=12, anchor="nw", style="Cuerpo.TLabel")
+                celda.grid(row=r + 1, column=c, padx=2, pady=2, sticky="nsew")
+                self._celdas[(r, c)] = celda
+        self._dias = {}
+
+        self.lbl_resumen = ttk.Label(marco, text="", style="Cuerpo.TLabel")
+        self.lbl_resumen.pack(anchor="w")
+        leyenda = ttk.Frame(marco, style="Card.TFrame")
+        leyenda.pack(anchor="w", pady=(6, 0))
+        limites = (0, *UMBRALES_CARGA)
+        for nivel in range(1, len(limites)):
+            hasta = f"–{limites[nivel + 1] - 1}" if nivel + 1 < len(limites) else " o más"
+            ttk.Label(leyenda, text=f"{limites[nivel]}{hasta} por día", style=f"Carga{nivel}.TLabel").pack(side="left", padx=(0, 4))
+
+        self._conteos = ConteosCalendario(self, ejecutor, self._al_llegar)
+        self._render()
+
+    def destroy(self):
+        self._conteos.cancelar()
+        super().destroy()
+
+    def _mover(self, meses):
+        self._ir(*mes_vecino(self.year, self.month, meses))
+
+    def _ir(self, anio, mes):
+        self.year, self.month = anio, mes
+        self._render()
+
+    def _render(self):
+        self.lb_mes.config(text=f"{MESES[self.month - 1]} {self.year}")
+        semanas = calendar.Calendar(firstweekday=0).monthdayscalendar(self.year, self.month)
+        self._dias = {(r, c): (semanas[r][c] if r < len(semanas) else 0) for r, c in self._celdas}
+        self._pintar(self._conteos.mes(self.year, self.month))
+
+    def _al_llegar(self, anio, mes, conteos):
+        if (anio, mes) == (self.year, self.month):
+            self._pintar(conteos)
+
+    def _pintar(self, conteos):
+        for posicion, celda in self._celdas.items():
+            dia = self._dias[posicion]
+            if not dia:
+                celda.config(text="", style="Cuerpo.TLabel")
+                continue
+            n = (conteos or {}).get(dia, 0)
+            celda.config(text=f"{dia}\n{n} mant." if n else f"{dia}\n", style=f"Carga{nivel_carga(n)}.TLabel")
+        if conteos is None:
+            self.lbl_resumen.config(text="Cargando…")
+        elif conteos:
+            dia = max(conteos, key=conteos.get)
+            self.lbl_resumen.config(
+                text=f"Mantenimientos del mes: {sum(conteos.values())}  |  Días con mantenimientos: {len(conteos)}"
+                     f"  |  Día más cargado: {dia} ({conteos[dia]})")
+        else:
+            self.lbl_resumen.config(text="Sin mantenimientos en el mes.")
+
+
+# ============================================================
+# 8) DIÁLOGOS: EQUIPO / MANTENIMIENTO / USUARIO / ALERTAS
+# ============================================================
+class DialogoEquipo(tk.Toplevel):
+    def __init__(self, master, titulo="Equipo", datos=None, usuario_actual=None):
+        super().__init__(master)
+        self.title(titulo)
+        aplicar_icono_aplicacion(self)
+        self.resizable(False, False)
+        self.resultado = None
+        self.usuario_actual = usuario_actual
+
+        marco = ttk.Frame(self, style="Card.TFrame", padding=12)
+        marco.grid(row=0, column=0, sticky="nsew")
+
+        etiquetas = ["ID de equipo *", "Nombre *", "Marca", "Modelo", "Serie", "Ubicación", "Descripción"]
+        for i, txt in enumerate(etiquetas):
+            ttk.Label(marco, text=txt, style="Cuerpo.TLabel").grid(row=i, column=0, sticky="e", padx=6, pady=4)
+
+        self.e_id = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.e_nombre = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.e_marca = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.e_modelo = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.e_serie = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.e_ubic = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.t_desc = tk.Text(marco, width=38, height=4)
+
+        for w in (self.e_id, self.e_nombre, self.e_marca, self.e_modelo, self.e_serie, self.e_ubic, self.t_desc):
+            poner_caret_blanco(w)
+
+        self.e_id.grid(row=0, column=1, padx=6, pady=4)
+        self.e_nombre.grid(row=1, column=1, padx=6, pady=4)
+        self.e_marca.grid(row=2, column=1, padx=6, pady=4)
+        self.e_modelo.grid(row=3, column=1, padx=6, pady=4)
+        self.e_serie.grid(row=4, column=1, padx=6, pady=4)
+        self.e_ubic.grid(row=5, column=1, padx=6, pady=4)
+        self.t_desc.grid(row=6, column=1, padx=6, pady=4)
+
+        if datos:
+            self.e_id.insert(0, datos.get("id_equipo", ""))
+            self.e_nombre.insert(0, datos.get("nombre", ""))
+            self.e_marca.insert(0, datos.get("marca", ""))
+            self.e_modelo.insert(0, datos.get("modelo", ""))
+            self.e_serie.insert(0, datos.get("serie", ""))
+            self.e_ubic.insert(0, datos.get("ubicacion", ""))
+            self.t_desc.insert("1.0", datos.get("descripcion", "") or "")
+
+        zona_botones = ttk.Frame(marco, style="Card.TFrame")
+        zona_botones.grid(row=7, column=0, columnspan=2, pady=8)
+        ttk.Button(zona_botones, text="Guardar", command=self._on_guardar, style="Success.TButton").pack(side="left", padx=6)
+        ttk.Button(zona_botones, text="Cancelar", command=self.destroy, style="Fantasma.TButton").pack(side="left", padx=6)
+
+        self.bind("<Return>", lambda e: self._on_guardar())
+        self.grab_set()
+        self.e_id.focus_set()
 
     def _on_guardar(self):
         id_equipo = self.e_id.get().strip()
@@ -642,13 +3524,21 @@ class DialogoEquipo(tk.Toplevel):
 
 
 class DialogoMantenimiento(tk.Toplevel):
-    """ID oculto (auto). Fecha con DateEntry (tkcalendar) o fallback. registrado_en/creado_por automáticos."""
-    def __init__(self, master, titulo="Mantenimiento", ids_equipos=(), datos=None):
+    """ID oculto (auto). Fecha con DateEntry (tkcalendar) o fallback. registrado_en/creado_por automáticos.
+
+    El equipo se elige escribiendo: se sugieren coincidencias por ID, nombre o ubicación.
+    Con `ejecutor` las búsquedas van al hilo de BD y una búsqueda nueva descarta la anterior.
+    """
+    def __init__(self, master, titulo="Mantenimiento", con=None, datos=None, ejecutor=None):
         super().__init__(master)
         self.title(titulo)
         aplicar_icono_aplicacion(self)
         self.resizable(False, False)
         self.resultado = None
+        self.con = con
+        self.ejecutor = ejecutor
+        self._busqueda_pendiente = None
+        self._sugerencias = []
 
         marco = ttk.Frame(self, style="Card.TFrame", padding=12)
         marco.grid(row=0, column=0, sticky="nsew")
@@ -657,17 +3547,37 @@ class DialogoMantenimiento(tk.Toplevel):
         for i, txt in enumerate(labels):
             ttk.Label(marco, text=txt, style="Cuerpo.TLabel").grid(row=i, column=0, sticky="e", padx=6, pady=4)
 
-        self.cmb_equipo = ttk.Combobox(marco, values=[str(e) for e in ids_equipos], state="readonly", width=36, style="Combo.TCombobox")
+        # Equipo: entrada con sugerencias (búsqueda por prefijo, con retardo al teclear)
+        f_equipo = ttk.Frame(marco, style="Card.TFrame")
+        self.e_equipo = ttk.Entry(f_equipo, width=38, style="Entrada.TEntry")
+        poner_caret_blanco(self.e_equipo)
+        self.lst_equipos = tk.Listbox(f_equipo, width=52, height=5, exportselection=False)
+        self.e_equipo.pack(fill="x")
+        self.lst_equipos.pack(fill="x", pady=(4, 0))
+        self.e_equipo.bind("<KeyRelease>", self._al_teclear_equipo)
+        self.e_equipo.bind("<Down>", lambda e: self._enfocar_sugerencias())
+        self.lst_equipos.bind("<<ListboxSelect>>", lambda e: self._elegir_sugerencia())
+        self.lst_equipos.bind("<Double-Button-1>", lambda e: self._elegir_sugerencia())
 
         # Fecha: preferir DateEntry de tkcalendar
         if TKCAL_OK:
             self.e_fecha = DateEntry(marco, date_pattern='dd-mm-yyyy', locale='es_MX', width=18)
             self.e_fecha.grid(row=1, column=1, padx=6, pady=4, sticky="w")
+            # el calendario desplegable marca los días con mantenimientos (color y globo con la cuenta)
+            self._calendario = getattr(self.e_fecha, "_calendar", None)
+            self._eventos_carga = {}   # (anio, mes) -> ids de eventos de tkcalendar
+            if self._calendario is not None and (ejecutor is not None or con is not None):
+                for nivel, color in enumerate(COLORES_CARGA[1:], start=1):
+                    self._calendario.tag_config(f"carga{nivel}", background=color, foreground="#E6E8ED")
+                self._carga = ConteosCalendario(self, ejecutor, self._marcar_carga, con)
+                self._calendario.bind("<<CalendarMonthChanged>>", lambda e: self._ver_carga_mes(), add="+")
+                self.after_idle(self._ver_carga_mes)
         else:
             self.e_fecha = ttk.Entry(marco, width=27, style="Entrada.TEntry")
             poner_caret_blanco(self.e_fecha)
             btn_cal = ttk.Button(marco, text="📅", width=3, style="Fantasma.TButton",
-                                 command=lambda: DatePicker(self, self.e_fecha, self.e_fecha.get().strip()))
+                                 command=lambda: DatePicker(self, self.e_fecha, self.e_fecha.get().strip(),
+                                                            ejecutor=self.ejecutor, con=self.con))
             f_fecha = ttk.Frame(marco, style="Card.TFrame")
             f_fecha.grid(row=1, column=1, padx=6, pady=4, sticky="w")
             self.e_fecha.pack(in_=f_fecha, side="left")
@@ -682,7 +3592,7 @@ class DialogoMantenimiento(tk.Toplevel):
         self.t_notas = tk.Text(marco, width=38, height=4)
         poner_caret_blanco(self.e_prov, self.e_costo, self.t_notas)
 
-        self.cmb_equipo.grid(row=0, column=1, padx=6, pady=4, sticky="w")
+        f_equipo.grid(row=0, column=1, padx=6, pady=4, sticky="w")
         if not TKCAL_OK:
             # ya colocado arriba en grid
             pass
@@ -695,9 +3605,7 @@ class DialogoMantenimiento(tk.Toplevel):
 
         if datos:
             if datos.get("equipo_id"):
-                vals = self.cmb_equipo["values"]
-                if str(datos["equipo_id"]) in vals:
-                    self.cmb_equipo.set(str(datos["equipo_id"]))
+                self.e_equipo.insert(0, str(datos["equipo_id"]))
             # fecha ISO -> DD-MM-AAAA
             if TKCAL_OK:
                 try:
@@ -721,13 +3629,88 @@ class DialogoMantenimiento(tk.Toplevel):
 
         self.bind("<Return>", lambda e: self._on_guardar())
         self.grab_set()
-        self.cmb_equipo.focus_set()
+        self.e_equipo.focus_set()
+        self._buscar_equipos()
+
+    def _ver_carga_mes(self):
+        if not self.winfo_exists():
+            return
+        mes, anio = self._calendario.get_displayed_month()
+        conteos = self._carga.mes(anio, mes)
+        if conteos is not None:
+            self._marcar_carga(anio, mes, conteos)
+
+    def _marcar_carga(self, anio, mes, conteos):
+        anteriores = self._eventos_carga.pop((anio, mes), ())
+        if anteriores:
+            self._calendario.calevent_remove(*anteriores)
+        self._eventos_carga[(anio, mes)] = [
+            self._calendario.calevent_create(date(anio, mes, dia), f"{n} mantenimiento(s) programado(s)",
+                                             tags=[f"carga{nivel_carga(n)}"])
+            for dia, n in conteos.items()]
+
+    def _al_teclear_equipo(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        if self._busqueda_pendiente is not None:
+            self.after_cancel(self._busqueda_pendiente)
+        self._busqueda_pendiente = self.after(RETARDO_BUSQUEDA_MS, self._buscar_equipos)
+
+    def _consultar(self, funcion, al_terminar, clave="consulta"):
+        """Corre funcion(con) en el ejecutor si lo hay (descartando la anterior con la misma clave) o aquí mismo."""
+        if self.ejecutor is None:
+            al_terminar(funcion(self.con))
+        else:
+            self.ejecutor.enviar(funcion, al_terminar=al_terminar, clave=(self, clave))
+
+    def _buscar_equipos(self):
+        self._busqueda_pendiente = None
+        if not self.winfo_exists():
+            return
+        texto = self.e_equipo.get()
+        self._consultar(lambda c: cache_equipos(c).buscar(c, texto), self._mostrar_sugerencias)
+
+    def _mostrar_sugerencias(self, sugerencias):
+        if not self.winfo_exists():
+            return
+        self._sugerencias = sugerencias
+        self.lst_equipos.delete(0, "end")
+        for id_eq, nombre, ubic in self._sugerencias:
+            self.lst_equipos.insert("end", f"{id_eq} — {nombre}" + (f" · {ubic}" if ubic else ""))
+
+    def _enfocar_sugerencias(self):
+        if self._sugerencias:
+            self.lst_equipos.focus_set()
+            self.lst_equipos.selection_clear(0, "end")
+            self.lst_equipos.selection_set(0)
+            self.lst_equipos.activate(0)
+            self._elegir_sugerencia()
+
+    def _elegir_sugerencia(self):
+        sel = self.lst_equipos.curselection()
+        if not sel or sel[0] >= len(self._sugerencias):
+            return
+        self.e_equipo.delete(0, "end")
+        self.e_equipo.insert(0, self._sugerencias[sel[0]][0])
 
     def _on_guardar(self):
-        eqid = self.cmb_equipo.get().strip()
+        eqid = self.e_equipo.get().strip()
         if not eqid:
             messagebox.showwarning("Validación", "Equipo (ID) es obligatorio.")
             return
+        # una búsqueda por teclear no debe dejar obsoleta la validación
+        if self._busqueda_pendiente is not None:
+            self.after_cancel(self._busqueda_pendiente)
+            self._busqueda_pendiente = None
+        self._consultar(lambda c: cache_equipos(c).existe(c, eqid), lambda existe: self._validar_y_cerrar(eqid, existe),
+                        clave="validacion")
+
+    def _validar_y_cerrar(self, eqid, existe):
+        if not self.winfo_exists():
+            return
+        if not existe:
+            messagebox.showwarning("Validación", f"No existe un equipo con ID '{eqid}'.")
+            return
 
         fecha_txt = self.e_fecha.get().strip()  # con DateEntry ya viene 'dd-mm-yyyy'
         if not fecha_txt:
@@ -750,7 +3733,7 @@ class DialogoMantenimiento(tk.Toplevel):
             return
 
         notas = self.t_notas.get("1.0", "end").strip()
-        auto_id = f"M-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        auto_id = nuevo_id_mantenimiento()
         self.resultado = {
             "id_mantenimiento": auto_id,
             "equipo_id": eqid,
@@ -864,15 +3847,702 @@ class DialogoConfigAlertas(tk.Toplevel):
         self.destroy()
 
 
+class DialogoConfigRespaldos(tk.Toplevel):
+    def __init__(self, master, intervalo_actual: int, generaciones_actual: int):
+        super().__init__(master)
+        self.title("Respaldos automáticos")
+        aplicar_icono_aplicacion(self)
+        self.resizable(False, False)
+        self.resultado = None
+
+        marco = ttk.Frame(self, style="Card.TFrame", padding=12)
+        marco.grid(row=0, column=0, sticky="nsew")
+
+        ttk.Label(marco, text="Horas entre respaldos (0 = desactivado)", style="Cuerpo.TLabel").grid(
+            row=0, column=0, padx=8, pady=6, sticky="e")
+        self.sp_intervalo = tk.Spinbox(marco, from_=0, to=168, width=6)
+        self.sp_intervalo.grid(row=0, column=1, padx=8, pady=6, sticky="w")
+
+        ttk.Label(marco, text="Generaciones a conservar", style="Cuerpo.TLabel").grid(
+            row=1, column=0, padx=8, pady=6, sticky="e")
+        self.sp_generaciones = tk.Spinbox(marco, from_=1, to=365, width=6)
+        self.sp_generaciones.grid(row=1, column=1, padx=8, pady=6, sticky="w")
+
+        info = (f"Las copias se guardan en la carpeta '{CARPETA_RESPALDOS}' junto a la base de datos,\n"
+                "se verifican con PRAGMA integrity_check y se borran las más antiguas.")
+        ttk.Label(marco, text=info, style="Cuerpo.TLabel", justify="left").grid(
+            row=2, column=0, columnspan=2, padx=8, pady=6)
+
+        zona_botones = ttk.Frame(marco, style="Card.TFrame")
+        zona_botones.grid(row=3, column=0, columnspan=2, pady=10)
+        ttk.Button(zona_botones, text="Guardar", command=self._on_guardar, style="Success.TButton").pack(side="left", padx=6)
+        ttk.Button(zona_botones, text="Cancelar", command=self.destroy, style="Fantasma.TButton").pack(side="left", padx=6)
+
+        self.sp_intervalo.delete(0, "end"); self.sp_intervalo.insert(0, intervalo_actual)
+        self.sp_generaciones.delete(0, "end"); self.sp_generaciones.insert(0, generaciones_actual)
+        self.grab_set()
+
+    def _on_guardar(self):
+        try:
+            intervalo = int(self.sp_intervalo.get())
+            generaciones = int(self.sp_generaciones.get())
+            if not (0 <= intervalo <= 168): raise ValueError
+            if not (1 <= generaciones <= 365): raise ValueError
+        except Exception:
+            messagebox.showwarning("Validación", "Rangos válidos: horas (0–168), generaciones (1–365).")
+            return
+        self.resultado = (intervalo, generaciones)
+        self.destroy()
+
+
+class DialogoPlan(tk.Toplevel):
+    def __init__(self, master, titulo="Plan de mantenimiento", datos=None):
+        super().__init__(master)
+        self.title(titulo)
+        aplicar_icono_aplicacion(self)
+        self.resizable(False, False)
+        self.resultado = None
+
+        marco = ttk.Frame(self, style="Card.TFrame", padding=12)
+        marco.grid(row=0, column=0, sticky="nsew")
+
+        etiquetas = ["Nombre *", "Aplica a", "Equipo (ID) o categoría *", "Tipo", "Cada (meses)",
+                     "Día del mes", "Primer periodo (AAAA-MM) *", "Proveedor", "Costo", "Notas"]
+        for i, txt in enumerate(etiquetas):
+            ttk.Label(marco, text=txt, style="Cuerpo.TLabel").grid(row=i, column=0, sticky="e", padx=6, pady=4)
+
+        self.e_nombre = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.var_alcance = tk.StringVar(value="categoria")
+        zona_alcance = ttk.Frame(marco, style="Card.TFrame")
+        ttk.Radiobutton(zona_alcance, text="Categoría (nombre de equipo)", value="categoria",
+                        variable=self.var_alcance).pack(side="left", padx=4)
+        ttk.Radiobutton(zona_alcance, text="Un equipo", value="equipo",
+                        variable=self.var_alcance).pack(side="left", padx=4)
+        self.e_objetivo = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.cmb_tipo = ttk.Combobox(marco, values=["Preventivo", "Correctivo"], state="readonly", width=35, style="Combo.TCombobox")
+        self.sp_cada = tk.Spinbox(marco, from_=1, to=120, width=6)
+        self.sp_dia = tk.Spinbox(marco, from_=1, to=28, width=6)
+        self.e_inicio = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.e_proveedor = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.e_costo = ttk.Entry(marco, width=38, style="Entrada.TEntry")
+        self.t_notas = tk.Text(marco, width=38, height=3)
+        self.var_activo = tk.BooleanVar(value=True)
+
+        for w in (self.e_nombre, self.e_objetivo, self.e_inicio, self.e_proveedor, self.e_costo, self.t_notas):
+            poner_caret_blanco(w)
+
+        self.e_nombre.grid(row=0, column=1, padx=6, pady=4)
+        zona_alcance.grid(row=1, column=1, padx=6, pady=4, sticky="w")
+        self.e_objetivo.grid(row=2, column=1, padx=6, pady=4)
+        self.cmb_tipo.grid(row=3, column=1, padx=6, pady=4)
+        self.sp_cada.grid(row=4, column=1, padx=6, pady=4, sticky="w")
+        self.sp_dia.grid(row=5, column=1, padx=6, pady=4, sticky="w")
+        self.e_inicio.grid(row=6, column=1, padx=6, pady=4)
+        self.e_proveedor.grid(row=7, column=1, padx=6, pady=4)
+        self.e_costo.grid(row=8, column=1, padx=6, pady=4)
+        self.t_notas.grid(row=9, column=1, padx=6, pady=4)
+        ttk.Checkbutton(marco, text="Activo", variable=self.var_activo).grid(row=10, column=1, padx=6, pady=4, sticky="w")
+
+        datos = datos or {}
+        self.e_nombre.insert(0, datos.get("nombre", ""))
+        if datos.get("equipo_id"):
+            self.var_alcance.set("equipo")
+        self.e_objetivo.insert(0, datos.get("equipo_id") or datos.get("categoria") or "")
+        self.cmb_tipo.set(datos.get("tipo", "Preventivo"))
+        self.sp_cada.delete(0, "end"); self.sp_cada.insert(0, datos.get("cada_meses", 1))
+        self.sp_dia.delete(0, "end"); self.sp_dia.insert(0, datos.get("dia", 1))
+        self.e_inicio.insert(0, datos.get("inicio") or siguiente_periodo())
+        self.e_proveedor.insert(0, datos.get("proveedor") or "")
+        self.e_costo.insert(0, str(datos.get("costo") or 0))
+        self.t_notas.insert("1.0", datos.get("notas") or "")
+        self.var_activo.set(bool(int(datos.get("activo", 1))))
+
+        zona_botones = ttk.Frame(marco, style="Card.TFrame")
+        zona_botones.grid(row=11, column=0, columnspan=2, pady=8)
+        ttk.Button(zona_botones, text="Guardar", command=self._on_guardar, style="Success.TButton").pack(side="left", padx=6)
+        ttk.Button(zona_botones, text="Cancelar", command=self.destroy, style="Fantasma.TButton").pack(side="left", padx=6)
+
+        self.grab_set()
+        self.e_nombre.focus_set()
+
+    def _on_guardar(self):
+        objetivo = self.e_objetivo.get().strip()
+        datos = {
+            "nombre": self.e_nombre.get().strip(),
+            "equipo_id": objetivo if self.var_alcance.get() == "equipo" else "",
+            "categoria": objetivo if self.var_alcance.get() == "categoria" else "",
+            "tipo": self.cmb_tipo.get(),
+            "cada_meses": self.sp_cada.get(),
+            "dia": self.sp_dia.get(),
+            "inicio": self.e_inicio.get().strip(),
+            "proveedor": self.e_proveedor.get().strip(),
+            "costo": self.e_costo.get().strip() or "0",
+            "notas": self.t_notas.get("1.0", "end").strip(),
+            "activo": self.var_activo.get(),
+        }
+        try:
+            _validar_plan(datos)
+        except ValueError as e:
+            messagebox.showwarning("Validación", str(e))
+            return
+        self.resultado = datos
+        self.destroy()
+
+
+def abrir_con_sistema(ruta: str) -> None:
+    """Abre un archivo con la aplicación predeterminada del sistema."""
+    if sys.platform.startswith("win"):
+        os.startfile(ruta)
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", ruta])
+    else:
+        subprocess.Popen(["xdg-open", ruta])
+
+
+class DialogoAdjuntos(tk.Toplevel):
+    """Adjuntos de un mantenimiento o de un equipo. Las miniaturas se generan en un hilo aparte."""
+    INTERVALO_MS = 100
+
+    def __init__(self, master, ejecutor, usuario_actual, id_equipo=None, id_mantenimiento=None):
+        super().__init__(master)
+        self.title(f"Adjuntos — {id_mantenimiento or id_equipo}")
+        aplicar_icono_aplicacion(self)
+        self.transient(master)
+        self.ejecutor = ejecutor
+        self.usuario_actual = usuario_actual
+        self.id_equipo = id_equipo
+        self.id_mantenimiento = id_mantenimiento
+        self._imagenes = {}                # iid -> PhotoImage (Tk no conserva la referencia)
+        self._pendientes = queue.Queue()   # (iid, carpeta, sha256, tipo_mime) para el hilo de miniaturas
+        self._listas = queue.Queue()       # (iid, ruta PNG) de vuelta a la interfaz
+
+        marco = ttk.Frame(self, style="Card.TFrame", padding=12)
+        marco.pack(fill="both", expand=True)
+        if PIL_OK:
+            ttk.Style(self).configure("Adjuntos.Treeview", rowheight=LADO_MINIATURA + 8)
+        self.arbol = ttk.Treeview(marco, columns=("nombre", "tipo", "tamano", "agregado_en", "id_mantenimiento"),
+                                  show="tree headings", height=6,
+                                  style="Adjuntos.Treeview" if PIL_OK else "Treeview")
+        self.arbol.heading("#0", text="")
+        self.arbol.column("#0", width=LADO_MINIATURA + 16 if PIL_OK else 0, stretch=False)
+        cabeceras = {"nombre": "Archivo", "tipo": "Tipo", "tamano": "Tamaño", "agregado_en": "Agregado en",
+                     "id_mantenimiento": "Mantenimiento"}
+        anchos = {"nombre": 260, "tipo": 150, "tamano": 90, "agregado_en": 150, "id_mantenimiento": 160}
+        for c in self.arbol["columns"]:
+            self.arbol.heading(c, text=cabeceras[c])
+            self.arbol.column(c, width=anchos[c], anchor="w")
+        self.arbol.pack(fill="both", expand=True)
+
+        zona_botones = ttk.Frame(marco, style="Card.TFrame")
+        zona_botones.pack(pady=(8, 0))
+        ttk.Button(zona_botones, text="Agregar…", command=self._agregar, style="Primario.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Abrir", command=self._abrir, style="Fantasma.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Guardar como…", command=self._guardar_como, style="Fantasma.TButton").pack(side="left", padx=4)
+        self.btn_borrar = ttk.Button(zona_botones, text="Eliminar", command=self._eliminar, style="Danger.TButton")
+        self.btn_borrar.pack(side="left", padx=4)
+        if self.usuario_actual["rol"] != "administrador":
+            self.btn_borrar.state(["disabled"])
+
+        self._hilo = threading.Thread(target=self._generar_miniaturas, daemon=True, name="miniaturas")
+        self._hilo.start()
+        self._sondeo = self.after(self.INTERVALO_MS, self._recibir_miniaturas)
+        self._refrescar()
+
+    def destroy(self):
+        self.after_cancel(self._sondeo)
+        self.ejecutor.cancelar((self, "lista"))
+        self._pendientes.put(None)
+        super().destroy()
+
+    @staticmethod
+    def _tamano(n) -> str:
+        for unidad in ("B", "KB", "MB"):
+            if n < 1024:
+                return f"{n:.0f} {unidad}" if unidad == "B" else f"{n:.1f} {unidad}"
+            n /= 1024
+        return f"{n:.1f} GB"
+
+    def _refrescar(self):
+        self.ejecutor.enviar(lambda c: (carpeta_adjuntos(c), listar_adjuntos(c, self.id_equipo, self.id_mantenimiento)),
+                             al_terminar=self._mostrar, clave=(self, "lista"))
+
+    def _mostrar(self, resultado):
+        carpeta, filas = resultado
+        self.arbol.delete(*self.arbol.get_children())
+        self._imagenes.clear()
+        for fila in filas:
+            adjunto = dict(zip(COLUMNAS_ADJUNTO, fila))
+            iid = str(adjunto["id_adjunto"])
+            self.arbol.insert("", "end", iid=iid, values=(
+                adjunto["nombre"], adjunto["tipo_mime"], self._tamano(adjunto["bytes"]),
+                adjunto["agregado_en"], adjunto["id_mantenimiento"] or ""))
+            if PIL_OK and (adjunto["tipo_mime"] or "").startswith("image/"):
+                self._pendientes.put((iid, carpeta, adjunto["sha256"], adjunto["tipo_mime"]))
+
+    def _generar_miniaturas(self):
+        while True:
+            tarea = self._pendientes.get()
+            if tarea is None:
+                return
+            iid, carpeta, sha256, tipo_mime = tarea
+            try:
+                ruta = miniatura_adjunto(carpeta, sha256, tipo_mime)
+            except Exception as e:
+                logging.warning("No se pudo generar la miniatura de %s: %s", sha256, e)
+                continue
+            if ruta:
+                self._listas.put((iid, ruta))
+
+    def _recibir_miniaturas(self):
+        self._sondeo = self.after(self.INTERVALO_MS, self._recibir_miniaturas)
+        while True:
+            try:
+                iid, ruta = self._listas.get_nowait()
+            except queue.Empty:
+                return
+            if self.arbol.exists(iid):
+                try:
+                    self._imagenes[iid] = tk.PhotoImage(file=ruta, master=self)
+                except tk.TclError:
+                    continue
+                self.arbol.item(iid, image=self._imagenes[iid])
+
+    def _seleccionado(self):
+        sel = self.arbol.selection()
+        if not sel:
+            messagebox.showinfo("Info", "Seleccione un adjunto.", parent=self)
+            return None
+        return int(sel[0]), self.arbol.item(sel[0], "values")[0]
+
+    def _agregar(self):
+        archivos = filedialog.askopenfilenames(title="Selecciona los archivos a adjuntar", parent=self)
+        if not archivos:
+            return
+        uid = self.usuario_actual["id"]
+        self.ejecutor.enviar(
+            lambda c: [agregar_adjunto(c, a, self.id_equipo, self.id_mantenimiento, uid) for a in archivos],
+            al_terminar=lambda _: self._refrescar(),
+            al_fallar=lambda e: messagebox.showerror("Adjuntos", f"No se pudo adjuntar:\n{e}", parent=self))
+
+    def _abrir(self):
+        seleccion = self._seleccionado()
+        if not seleccion:
+            return
+        id_adjunto, _nombre = seleccion
+        self.ejecutor.enviar(lambda c: copia_para_abrir(c, id_adjunto),
+                             al_terminar=abrir_con_sistema,
+                             al_fallar=lambda e: messagebox.showerror("Adjuntos", f"No se pudo abrir:\n{e}", parent=self))
+
+    def _guardar_como(self):
+        seleccion = self._seleccionado()
+        if not seleccion:
+            return
+        id_adjunto, nombre = seleccion
+        destino = filedialog.asksaveasfilename(initialfile=nombre, title="Guardar adjunto", parent=self)
+        if destino:
+            self.ejecutor.enviar(lambda c: copiar_adjunto(c, id_adjunto, destino),
+                                 al_fallar=lambda e: messagebox.showerror("Adjuntos", f"No se pudo guardar:\n{e}", parent=self))
+
+    def _eliminar(self):
+        seleccion = self._seleccionado()
+        if not seleccion or self.usuario_actual["rol"] != "administrador":
+            return
+        id_adjunto, nombre = seleccion
+        if messagebox.askyesno("Confirmar", f"¿Eliminar el adjunto '{nombre}'?", parent=self):
+            self.ejecutor.enviar(lambda c: eliminar_adjunto(c, id_adjunto), al_terminar=lambda _: self._refrescar())
+
+
+class DialogoLineaTiempo(tk.Toplevel):
+    """Historial de un equipo (vigentes + históricos) con acumulados; las filas llegan por páginas."""
+    def __init__(self, master, ejecutor, id_equipo, nombre=""):
+        super().__init__(master)
+        self.title(f"Historial — {id_equipo}")
+        aplicar_icono_aplicacion(self)
+        self.transient(master)
+        self.ejecutor = ejecutor
+        self.nombre = nombre or id_equipo
+
+        marco = ttk.Frame(self, style="Card.TFrame", padding=12)
+        marco.pack(fill="both", expand=True)
+        self.lbl_resumen = ttk.Label(marco, text="Cargando…", style="Cuerpo.TLabel")
+        self.lbl_resumen.pack(anchor="w", pady=(0, 8))
+
+        columnas = ("numero", "fecha", "origen", "tipo", "estado", "proveedor", "costo", "costo_acumulado",
+                    "por_tipo", "notas")
+        self.arbol = ttk.Treeview(marco, columns=columnas, show="headings", height=18)
+        cabeceras = {"numero": "N.º", "fecha": "Fecha", "origen": "Registro", "tipo": "Tipo", "estado": "Estado",
+                     "proveedor": "Proveedor", "costo": "Costo", "costo_acumulado": "Costo acumulado",
+                     "por_tipo": "Prev. / Corr.", "notas": "Notas"}
+        anchos = {"numero": 60, "fecha": 100, "origen": 90, "tipo": 100, "estado": 100, "proveedor": 150,
+                  "costo": 90, "costo_acumulado": 120, "por_tipo": 100, "notas": 260}
+        for c in columnas:
+            self.arbol.heading(c, text=cabeceras[c])
+            self.arbol.column(c, width=anchos[c], anchor="w")
+        self.arbol.pack(fill="both", expand=True)
+
+        self.ejecutor.enviar(lambda c: linea_de_tiempo(c, id_equipo), al_lote=self._recibir,
+                             clave=(self, "linea"),
+                             al_fallar=lambda e: messagebox.showerror("Historial", f"No se pudo cargar:\n{e}", parent=self))
+
+    def destroy(self):
+        self.ejecutor.cancelar((self, "linea"))
+        super().destroy()
+
+    def _recibir(self, lote):
+        if isinstance(lote, dict):  # el primer lote es el resumen
+            por_tipo = lote["por_tipo"]
+            self.lbl_resumen.config(
+                text=f"{self.nombre}: {lote['servicios']} servicios  |  Preventivos: {por_tipo.get('Preventivo', 0)}"
+                     f"  |  Correctivos: {por_tipo.get('Correctivo', 0)}  |  Costo total: {lote['costo']:.2f}")
+            return
+        for fila in lote:
+            self.arbol.insert("", "end", values=(
+                fila["numero"], _a_ddmmaaaa(fila["fecha"]), "Vigente" if fila["origen"] == "M" else "Histórico",
+                fila["tipo"], fila["estado"], fila["proveedor"] or "", f"{fila['costo'] or 0:.2f}",
+                f"{fila['costo_acumulado']:.2f}",
+                f"{fila['por_tipo'].get('Preventivo', 0)} / {fila['por_tipo'].get('Correctivo', 0)}",
+                _vista_notas(fila["notas"])))
+
+
+# ============================================================
+# 8.1) EJECUTOR DE CONSULTAS EN SEGUNDO PLANO
+# ============================================================
+TAMANO_LOTE_UI = 200
+
+
+def ruta_bd(con) -> str:
+    """Archivo de la BD 'main' de una conexión abierta."""
+    return con.execute("PRAGMA database_list;").fetchone()[2]
+
+
+def por_lotes(filas, tamano=TAMANO_LOTE_UI):
+    """Generador de lotes de un cursor o lista de filas (para tareas con entrega progresiva)."""
+    filas = iter(filas)
+    while True:
+        lote = list(islice(filas, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def al_fallar_integridad(mensaje: str):
+    """Callback de error para el ejecutor: `mensaje` ante IntegrityError, aviso genérico en otro caso."""
+    def _manejar(error):
+        if isinstance(error, sqlite3.IntegrityError):
+            messagebox.showerror("Error", mensaje)
+        else:
+            EjecutorBD._fallo_por_defecto(error)
+    return _manejar
+
+
+class EjecutorBD:
+    """Hilo dedicado, con su propia conexión, que atiende consultas en cola.
+
+    Las tareas son funciones `funcion(con)` que corren en el hilo de BD; el resultado vuelve al
+    hilo de Tk mediante un sondeo con after(). Con `clave`, una tarea nueva con la misma clave
+    deja obsoleta a la anterior: si no ha empezado se omite y su resultado ya no se entrega.
+    Si se pasa `al_lote`, la función debe devolver un iterable de lotes que se entregan uno a
+    uno (render progresivo); `al_terminar` recibe entonces el número de lotes.
+    """
+    INTERVALO_MS = 30
+    PRESUPUESTO_MS = 25  # tiempo máximo por sondeo para entregar resultados a la interfaz
+
+    def __init__(self, raiz, archivo_bd, nombre="bd"):
+        self.raiz = raiz
+        self._tareas = queue.Queue()
+        self._resultados = queue.Queue()
+        self._generaciones = {}
+        self._candado = threading.Lock()
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, args=(archivo_bd,), name=nombre, daemon=True)
+        self._hilo.start()
+        self._sondeo = raiz.after(self.INTERVALO_MS, self._drenar)
+
+    def enviar(self, funcion, al_terminar=None, al_fallar=None, clave=None, al_lote=None):
+        with self._candado:
+            generacion = self._generaciones.get(clave, 0) + 1
+            if clave is not None:
+                self._generaciones[clave] = generacion
+        self._tareas.put((funcion, al_terminar, al_fallar, al_lote, clave, generacion))
+
+    def cancelar(self, clave) -> None:
+        """Deja obsoleta cualquier tarea pendiente con esa clave."""
+        with self._candado:
+            if clave in self._generaciones:
+                self._generaciones[clave] += 1
+
+    def _vigente(self, clave, generacion) -> bool:
+        if clave is None:
+            return True
+        with self._candado:
+            return self._generaciones.get(clave) == generacion
+
+    def _bucle(self, archivo_bd):
+        con = abrir_conexion(archivo_bd)
+        try:
+            while True:
+                tarea = self._tareas.get()
+                if tarea is None:
+                    return
+                funcion, al_terminar, al_fallar, al_lote, clave, generacion = tarea
+                if not self._vigente(clave, generacion):
+                    continue
+                try:
+                    resultado = funcion(con)
+                    if al_lote is not None:
+                        lotes = 0
+                        for lote in resultado:
+                            if not self._vigente(clave, generacion):
+                                break
+                            self._resultados.put((al_lote, lote, clave, generacion))
+                            lotes += 1
+                        resultado = lotes
+                    self._resultados.put((al_terminar, resultado, clave, generacion))
+                except Exception as e:
+                    if con.in_transaction:
+                        con.rollback()
+                    self._resultados.put((al_fallar or self._fallo_por_defecto, e, clave, generacion))
+        finally:
+            cerrar_conexion(con)
+
+    def _drenar(self):
+        # se reprograma antes de entregar: un callback puede abrir un diálogo modal (wait_window)
+        # y sus propias consultas deben seguir llegando mientras tanto
+        if self._activo:
+            self._sondeo = self.raiz.after(self.INTERVALO_MS, self._drenar)
+        limite = time.perf_counter() + self.PRESUPUESTO_MS / 1000
+        while time.perf_counter() < limite:
+            try:
+                callback, valor, clave, generacion = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            if callback is not None and self._vigente(clave, generacion):
+                try:
+                    callback(valor)
+                except Exception:
+                    logging.exception("Error al entregar un resultado de la BD a la interfaz")
+
+    @staticmethod
+    def _fallo_por_defecto(error):
+        logging.error("Error en consulta de fondo: %s", error)
+        messagebox.showerror("Error", f"No se pudo completar la operación:\n{error}")
+
+    def cerrar(self) -> None:
+        if not self._activo:
+            return
+        self._activo = False
+        try:
+            self.raiz.after_cancel(self._sondeo)
+        except tk.TclError:
+            pass
+        self._tareas.put(None)
+        self._hilo.join(timeout=2)
+
+
 # ============================================================
 # 9) PESTAÑAS
 # ============================================================
-class PestanaEquipos(ttk.Frame):
+INTERVALO_SONDEO_MS = 3000  # cada cuánto se consultan cambios hechos desde otra sesión o la API
+
+
+def _vista_notas(texto) -> str:
+    """Extracto de una sola línea para la celda de notas."""
+    texto = " ".join(str(texto or "").split())
+    return texto if len(texto) <= LARGO_VISTA_NOTAS else texto[:LARGO_VISTA_NOTAS - 1] + "…"
+
+
+class PanelNotas(ttk.Frame):
+    """Notas completas de la fila seleccionada (la lista solo muestra un extracto)."""
+    def __init__(self, padre, arbol, ejecutor, tabla: str):
+        super().__init__(padre, style="App.TFrame")
+        self.arbol = arbol
+        self.ejecutor = ejecutor
+        self.tabla = tabla
+        ttk.Label(self, text="Notas", style="Cuerpo.TLabel").pack(anchor="w")
+        self.texto = tk.Text(self, height=4, wrap="word", state="disabled")
+        self.texto.pack(fill="x")
+        arbol.bind("<<TreeviewSelect>>", self._al_seleccionar, add="+")
+
+    def _al_seleccionar(self, _evento=None):
+        sel = self.arbol.selection()
+        if len(sel) != 1:
+            self.ejecutor.cancelar((self, "notas"))
+            self._mostrar("")
+            return
+        id_ = str(self.arbol.item(sel[0], "values")[0])
+        self.ejecutor.enviar(lambda c: notas_completas(c, self.tabla, id_),
+                             al_terminar=self._mostrar, clave=(self, "notas"))
+
+    def _mostrar(self, texto):
+        self.texto.config(state="normal")
+        self.texto.delete("1.0", "end")
+        self.texto.insert("1.0", texto)
+        self.texto.config(state="disabled")
+
+
+def exportar_cambios(padre, ejecutor, tabla: str) -> None:
+    """Pide destino y archivo y exporta solo lo cambiado desde la última exportación a ese destino."""
+    destino = simpledialog.askstring("Exportar cambios",
+                                     "Nombre del destino (cada destino recuerda su última exportación):",
+                                     initialvalue="reporte", parent=padre)
+    if not destino or not destino.strip():
+        return
+    archivo = filedialog.asksaveasfilename(defaultextension=".xlsx",
+                                           filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")],
+                                           title=f"Guardar cambios de {tabla}")
+    if not archivo:
+        return
+
+    def _terminado(res):
+        if res["completa"]:
+            texto = f"Primera exportación a '{res['destino']}': tabla completa ({res['filas']} filas)."
+        else:
+            texto = f"Exportados {res['filas']} cambios desde la exportación anterior a '{res['destino']}'."
+        messagebox.showinfo("Excel", texto)
+
+    ejecutor.enviar(lambda c: exportar_delta(c, tabla, archivo, destino.strip()), al_terminar=_terminado,
+                    al_fallar=lambda e: messagebox.showerror("Excel", f"No se pudo exportar:\n{e}"))
+
+
+def importar_carpeta_dialogo(pestana, carpeta: str, tabla: str, usuario_id, actualizar=False) -> None:
+    """Importa una carpeta en segundo plano y muestra el reporte por archivo."""
+    def _terminado(res):
+        pestana._poner_al_dia()
+        lineas = []
+        for r in res["archivos"]:
+            if r["error"]:
+                lineas.append(f"{r['archivo']}: ERROR {r['error']}")
+            else:
+                lineas.append(f"{r['archivo']}: " + " | ".join(f"{c} {r[c]}" for c in res["totales"]))
+        if len(lineas) > 20:
+            lineas = lineas[:20] + [f"… y {len(lineas) - 20} archivos más"]
+        totales = " | ".join(f"{c} {n}" for c, n in res["totales"].items())
+        messagebox.showinfo("Importar carpeta",
+                            f"{len(res['archivos'])} archivos en {res['segundos']} s ({res['procesos']} procesos).\n"
+                            f"Totales: {totales}\n\n" + "\n".join(lineas))
+
+    pestana.ejecutor.enviar(lambda c: importar_carpeta(c, carpeta, tabla, usuario_id, actualizar=actualizar),
+                            al_terminar=_terminado,
+                            al_fallar=lambda e: messagebox.showerror("Importar carpeta", f"No se pudo importar:\n{e}"))
+
+
+class ListaIncremental:
+    """Base para pestañas cuya lista se pone al día con el diario de cambios.
+
+    Cada fila usa su clave primaria como iid; tras un cambio propio (y cada INTERVALO_SONDEO_MS)
+    solo se piden las filas que cambiaron desde la versión mostrada. La subclase define TABLA,
+    DESCENDENTE, _valores(fila) y _clave_orden(valores).
+    """
+    TABLA = ""
+    DESCENDENTE = False
+
+    def _delta(self, con, desde):
+        return delta_lista(con, self.TABLA, desde)
+
+    def _iniciar_sondeo(self):
+        self._version = None
+        self._sondeo = self.after(INTERVALO_SONDEO_MS, self._sondear)
+
+    def _sondear(self):
+        self._poner_al_dia()
+        self._sondeo = self.after(INTERVALO_SONDEO_MS, self._sondear)
+
+    def destroy(self):
+        self.after_cancel(self._sondeo)
+        super().destroy()
+
+    def _recargar(self, consulta):
+        """Carga completa por lotes. `consulta(con)` devuelve (version, filas); la versión se lee
+        antes que las filas para no perder cambios concurrentes."""
+        self.arbol.delete(*self.arbol.get_children())
+        self._version = None
+        self.ejecutor.cancelar((self, "delta"))
+        estado = {}
+
+        def _cargar(c):
+            estado["version"], filas = consulta(c)
+            return por_lotes(filas)
+
+        def _terminado(_n):
+            self._version = estado["version"]
+            self._al_actualizar()
+
+        self.ejecutor.enviar(_cargar, al_lote=self._agregar_lote, al_terminar=_terminado, clave=(self, "refrescar"))
+
+    def _agregar_lote(self, filas):
+        for fila in filas:
+            valores = self._valores(fila)
+            self.arbol.insert("", "end", iid=str(valores[0]), values=valores)
+
+    def _poner_al_dia(self):
+        """Pide al diario lo que cambió desde la versión mostrada (no hace nada durante una carga completa)."""
+        if self._version is None:
+            return
+        desde = self._version
+        self.ejecutor.enviar(lambda c: self._delta(c, desde),
+                             al_terminar=self._aplicar_delta, clave=(self, "delta"))
+
+    def _aplicar_delta(self, resultado):
+        version, filas, borrados = resultado
+        if filas is None:
+            self._refrescar()
+            return
+        for clave in borrados:
+            if self.arbol.exists(clave):
+                self.arbol.delete(clave)
+        for fila in filas:
+            valores = self._valores(fila)
+            iid = str(valores[0])
+            if self.arbol.exists(iid):
+                self.arbol.detach(iid)
+                self.arbol.item(iid, values=valores)
+                self.arbol.move(iid, "", self._posicion(valores))
+            else:
+                self.arbol.insert("", self._posicion(valores), iid=iid, values=valores)
+        self._version = version
+        if filas or borrados:
+            self._al_actualizar()
+
+    def _posicion(self, valores) -> int:
+        """Índice donde insertar para respetar el orden de la lista (búsqueda binaria)."""
+        clave = self._clave_orden(valores)
+        hijos = self.arbol.get_children()
+        bajo, alto = 0, len(hijos)
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            otra = self._clave_orden(self.arbol.item(hijos[medio], "values"))
+            if (otra < clave) if self.DESCENDENTE else (otra > clave):
+                alto = medio
+            else:
+                bajo = medio + 1
+        return bajo
+
+    def _al_actualizar(self):
+        """Gancho tras una carga completa o un incremento con cambios."""
+
+    def _claves_seleccionadas(self, aviso: str) -> list:
+        """Claves primarias de las filas seleccionadas (el iid es la clave); avisa si no hay ninguna."""
+        claves = list(self.arbol.selection())
+        if not claves:
+            messagebox.showinfo("Info", aviso)
+        return claves
+
+    def _en_lote(self, titulo: str, pregunta: str, tarea, claves: list) -> None:
+        """Aplica `tarea(con, claves)` en una transacción (confirmando si son varias) y refresca una vez."""
+        if len(claves) > 1 and not messagebox.askyesno(titulo, pregunta):
+            return
+        self.ejecutor.enviar(lambda c: tarea(c, claves), al_terminar=lambda _n: self._poner_al_dia(),
+                             al_fallar=lambda e: messagebox.showerror(titulo, f"No se pudo aplicar el cambio:\n{e}"))
+
+
+class PestanaEquipos(ListaIncremental, ttk.Frame):
     """Pestaña de gestión de equipos."""
-    def __init__(self, padre, con, usuario_actual):
+    TABLA = "equipos"
+    def __init__(self, padre, con, usuario_actual, ejecutor):
         super().__init__(padre)
         self.con = con
         self.usuario_actual = usuario_actual
+        self.ejecutor = ejecutor
 
         superior = ttk.Frame(self, style="App.TFrame")
         superior.pack(fill="x")
@@ -882,7 +4552,7 @@ class PestanaEquipos(ttk.Frame):
         self.arbol = ttk.Treeview(
             self,
             columns=("id_equipo", "nombre", "marca", "modelo", "serie", "ubicacion", "descripcion", "fecha_registro", "creado_por"),
-            show="headings", height=14
+            show="headings", height=14, selectmode="extended"  # Ctrl/Shift para cambios en lote
         )
         cabeceras = {
             "id_equipo": "ID equipo", "nombre": "Nombre", "marca": "Marca",
@@ -900,29 +4570,52 @@ class PestanaEquipos(ttk.Frame):
         zona_botones.pack(pady=4)
         ttk.Button(zona_botones, text="Agregar", command=self._agregar, style="Primario.TButton").pack(side="left", padx=4)
         ttk.Button(zona_botones, text="Editar", command=self._editar, style="Fantasma.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Mover a ubicación", command=self._mover, style="Fantasma.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Adjuntos", command=self._adjuntos, style="Fantasma.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Historial", command=self._historial, style="Fantasma.TButton").pack(side="left", padx=4)
 
         self.btn_borrar = ttk.Button(zona_botones, text="Eliminar", command=self._eliminar, style="Danger.TButton")
         self.btn_borrar.pack(side="left", padx=4)
-        if self.usuario_actual["rol"] != "administrador":
-            self.btn_borrar.state(["disabled"])
+        self.cambiar_usuario(usuario_actual)
 
         ttk.Button(zona_botones, text="Importar Excel", command=self._importar_excel, style="Fantasma.TButton").pack(side="left", padx=12)
+        ttk.Button(zona_botones, text="Importar carpeta", command=self._importar_carpeta, style="Fantasma.TButton").pack(side="left", padx=4)
         ttk.Button(zona_botones, text="Exportar Excel", command=self._exportar_excel, style="Fantasma.TButton").pack(side="left", padx=4)
 
+        self._iniciar_sondeo()
         self._refrescar()
 
+    def cambiar_usuario(self, usuario_actual):
+        """Sesión nueva sin reconstruir la pestaña: solo cambia lo que depende del rol."""
+        self.usuario_actual = usuario_actual
+        self.btn_borrar.state(["!disabled"] if usuario_actual["rol"] == "administrador" else ["disabled"])
+
     def _refrescar(self):
-        for i in self.arbol.get_children():
-            self.arbol.delete(i)
-        cur = self.con.execute("""
-            SELECT id_equipo, nombre, marca, modelo, serie, ubicacion,
-                   COALESCE(descripcion,''), COALESCE(fecha_registro,''), COALESCE(creado_por,'')
-            FROM equipos ORDER BY nombre ASC;
-        """)
-        filas = cur.fetchall()
-        for f in filas:
-            self.arbol.insert("", "end", values=f)
-        self.lbl_total.config(text=f"Total de equipos: {len(filas)}")
+        """Recarga la lista en segundo plano; las filas se agregan por lotes conforme llegan."""
+        self._total = 0
+        self.lbl_total.config(text="Total de equipos: …")
+        self._recargar(lambda c: cache_equipos(c).lista(c))
+
+    def _agregar_lote(self, filas):
+        super()._agregar_lote(filas)
+        self._total += len(filas)
+        self.lbl_total.config(text=f"Total de equipos: {self._total}…")
+
+    def _al_actualizar(self):
+        self._total = len(self.arbol.get_children())
+        self.lbl_total.config(text=f"Total de equipos: {self._total}")
+
+    @staticmethod
+    def _delta(con, desde):
+        return cache_equipos(con).delta(con, desde)
+
+    @staticmethod
+    def _valores(fila):
+        return tuple("" if v is None else v for v in fila)
+
+    @staticmethod
+    def _clave_orden(valores):
+        return str(valores[1]).lower()  # nombre sin distinguir mayúsculas, como CacheEquipos.lista
 
     def _seleccionado(self):
         sel = self.arbol.selection()
@@ -937,19 +4630,10 @@ class PestanaEquipos(ttk.Frame):
         dlg = DialogoEquipo(self, "Agregar equipo", usuario_actual=self.usuario_actual)
         self.wait_window(dlg)
         if dlg.resultado:
-            try:
-                with self.con:
-                    self.con.execute("""
-                        INSERT INTO equipos(id_equipo, nombre, marca, modelo, serie, ubicacion, descripcion, fecha_registro, creado_por)
-                        VALUES(?,?,?,?,?,?,?,?,?)
-                    """, (
-                        dlg.resultado["id_equipo"], dlg.resultado["nombre"], dlg.resultado["marca"],
-                        dlg.resultado["modelo"], dlg.resultado["serie"], dlg.resultado["ubicacion"],
-                        dlg.resultado["descripcion"], dlg.resultado["fecha_registro"], self.usuario_actual["id"]
-                    ))
-                self._refrescar()
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Error", "El ID de equipo ya existe. Usa otro.")
+            datos, uid = dlg.resultado, self.usuario_actual["id"]
+            self.ejecutor.enviar(lambda c: insertar_equipo(c, datos, uid),
+                                 al_terminar=lambda _: self._poner_al_dia(),
+                                 al_fallar=al_fallar_integridad("El ID de equipo ya existe. Usa otro."))
 
     def _editar(self):
         datos = self._seleccionado()
@@ -958,20 +4642,33 @@ class PestanaEquipos(ttk.Frame):
         dlg = DialogoEquipo(self, "Editar equipo", datos=datos, usuario_actual=self.usuario_actual)
         self.wait_window(dlg)
         if dlg.resultado:
-            try:
-                with self.con:
-                    self.con.execute("""
-                        UPDATE equipos
-                        SET id_equipo=?, nombre=?, marca=?, modelo=?, serie=?, ubicacion=?, descripcion=?
-                        WHERE id_equipo=?
-                    """, (
-                        dlg.resultado["id_equipo"], dlg.resultado["nombre"], dlg.resultado["marca"],
-                        dlg.resultado["modelo"], dlg.resultado["serie"], dlg.resultado["ubicacion"],
-                        dlg.resultado["descripcion"], datos["id_equipo"]
-                    ))
-                self._refrescar()
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Error", "El nuevo ID de equipo ya existe. Usa otro.")
+            nuevos = dlg.resultado
+            self.ejecutor.enviar(lambda c: actualizar_equipo(c, datos["id_equipo"], nuevos),
+                                 al_terminar=lambda _: self._poner_al_dia(),
+                                 al_fallar=al_fallar_integridad("El nuevo ID de equipo ya existe. Usa otro."))
+
+    def _adjuntos(self):
+        sel = self.arbol.selection()
+        if not sel:
+            messagebox.showinfo("Info", "Seleccione un equipo.")
+            return
+        DialogoAdjuntos(self, self.ejecutor, self.usuario_actual, id_equipo=sel[0])
+
+    def _historial(self):
+        sel = self.arbol.selection()
+        if not sel:
+            messagebox.showinfo("Info", "Seleccione un equipo.")
+            return
+        DialogoLineaTiempo(self, self.ejecutor, sel[0], self.arbol.item(sel[0], "values")[1])
+
+    def _mover(self):
+        ids = self._claves_seleccionadas("Seleccione uno o más equipos.")
+        if not ids:
+            return
+        ubicacion = simpledialog.askstring("Ubicación", f"Nueva ubicación para {len(ids)} equipo(s):", parent=self)
+        if ubicacion is not None:
+            self._en_lote("Ubicación", f"¿Mover {len(ids)} equipos a '{ubicacion.strip()}'?",
+                          lambda c, claves: mover_equipos(c, claves, ubicacion.strip()), ids)
 
     def _eliminar(self):
         if self.usuario_actual["rol"] != "administrador":
@@ -981,85 +4678,77 @@ class PestanaEquipos(ttk.Frame):
             return
         if not messagebox.askyesno("Confirmar", f"¿Eliminar equipo '{datos['nombre']}' (ID {datos['id_equipo']}) y sus mantenimientos?"):
             return
-        with self.con:
-            self.con.execute("DELETE FROM equipos WHERE id_equipo=?", (datos["id_equipo"],))
-        self._refrescar()
+        self.ejecutor.enviar(lambda c: eliminar_equipo(c, datos["id_equipo"]),
+                             al_terminar=lambda _: self._poner_al_dia())
 
     # Excel
     def _importar_excel(self):
-        if not PANDAS_OK:
-            messagebox.showwarning("Excel", "Instala pandas y openpyxl:  pip install pandas openpyxl")
-            return
         archivo = filedialog.askopenfilename(title="Selecciona Excel de equipos",
-                                             filetypes=[("Excel", "*.xlsx *.xls")])
+                                             filetypes=[("Excel", "*.xlsx *.xls"), ("CSV", "*.csv")])
         if not archivo:
             return
-        try:
-            df = pd.read_excel(archivo)
-            df.columns = [str(c).strip().lower() for c in df.columns]
-            df = df.dropna(how="all")  # Elimina filas completamente vacías
-        except Exception as e:
-            messagebox.showerror("Excel", f"No se pudo leer el archivo:\n{e}")
+        if falta_lector(archivo):
+            messagebox.showwarning("Excel", falta_lector(archivo))
+            return
+        actualizar = self._preguntar_actualizar()
+        if actualizar is None:
             return
 
-        for col in ["id_equipo", "nombre", "marca", "modelo", "serie", "ubicacion", "descripcion"]:
-            if col not in df.columns:
-                df[col] = ""
+        def _terminado(res):
+            self._poner_al_dia()
+            messagebox.showinfo("Excel", f"Equipos importados. Nuevos: {res['insertados']} | "
+                                         f"Actualizados: {res['actualizados']} | Sin cambios: {res['sin_cambios']} | "
+                                         f"Omitidos: {res['omitidos']}")
+
+        uid = self.usuario_actual["id"]
+        self.ejecutor.enviar(lambda c: importar_equipos(c, leer_filas(archivo), uid, actualizar=actualizar),
+                             al_terminar=_terminado,
+                             al_fallar=lambda e: messagebox.showerror("Excel", f"No se pudo leer el archivo:\n{e}"))
+
+    @staticmethod
+    def _preguntar_actualizar():
+        return messagebox.askyesnocancel(
+            "Excel",
+            "¿Actualizar también los equipos que ya existen?\n\n"
+            "Sí: agrega IDs nuevos y actualiza nombre, ubicación, modelo, descripción, etc. de los existentes.\n"
+            "No: solo agrega IDs nuevos."
+        )
 
-        nuevos = 0
-        with self.con:
-            for _, r in df.iterrows():
-                id_eq = str(r["id_equipo"]).strip()
-                nom = str(r["nombre"]).strip()
-                if not id_eq or not nom:
-                    continue
-                fecha_reg = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                try:
-                    self.con.execute("""
-                        INSERT INTO equipos(id_equipo, nombre, marca, modelo, serie, ubicacion, descripcion, fecha_registro, creado_por)
-                        VALUES(?,?,?,?,?,?,?,?,?)
-                    """, (
-                        id_eq, nom, str(r.get("marca", "") or ""), str(r.get("modelo", "") or ""),
-                        str(r.get("serie", "") or ""), str(r.get("ubicacion", "") or ""),
-                        str(r.get("descripcion", "") or ""), fecha_reg, self.usuario_actual["id"]
-                    ))
-                    nuevos += 1
-                except sqlite3.IntegrityError:
-                    pass
-        self._refrescar()
-        messagebox.showinfo("Excel", f"Equipos importados. Nuevos: {nuevos}")
+    def _importar_carpeta(self):
+        carpeta = filedialog.askdirectory(title="Selecciona la carpeta con los Excel de equipos")
+        if not carpeta:
+            return
+        actualizar = self._preguntar_actualizar()
+        if actualizar is None:
+            return
+        importar_carpeta_dialogo(self, carpeta, "equipos", self.usuario_actual["id"], actualizar)
 
     def _exportar_excel(self):
-        if not PANDAS_OK:
-            messagebox.showwarning("Excel", "Instala pandas y openpyxl:  pip install pandas openpyxl")
-            return
         archivo = filedialog.asksaveasfilename(defaultextension=".xlsx",
-                                               filetypes=[("Excel", "*.xlsx")],
+                                               filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")],
                                                title="Guardar inventario")
         if not archivo:
             return
-        try:
-            df = pd.read_sql_query("""
-                SELECT id_equipo, nombre, marca, modelo, serie, ubicacion, descripcion, fecha_registro, creado_por
-                FROM equipos ORDER BY nombre;
-            """, self.con)
-            df.to_excel(archivo, index=False)
-            messagebox.showinfo("Excel", "Inventario exportado correctamente.")
-        except Exception as e:
-            messagebox.showerror("Excel", f"No se pudo exportar:\n{e}")
+        self.ejecutor.enviar(lambda c: exportar_tabla(c, "equipos", archivo),
+                             al_terminar=lambda _: messagebox.showinfo("Excel", "Inventario exportado correctamente."),
+                             al_fallar=lambda e: messagebox.showerror("Excel", f"No se pudo exportar:\n{e}"))
 
 
-class PestanaMantenimientos(ttk.Frame):
+class PestanaMantenimientos(ListaIncremental, ttk.Frame):
     """Pestaña de gestión de mantenimientos."""
-    def __init__(self, padre, con, usuario_actual):
+    TABLA = "mantenimientos"
+    DESCENDENTE = True
+    def __init__(self, padre, con, usuario_actual, ejecutor):
         super().__init__(padre)
         self.con = con
         self.usuario_actual = usuario_actual
+        self.ejecutor = ejecutor
 
         self.arbol = ttk.Treeview(
             self,
-            columns=("id_mantenimiento", "equipo_id", "fecha", "tipo", "estado", "proveedor", "costo", "notas", "registrado_en", "creado_por"),
-            show="headings", height=14
+            columns=("id_mantenimiento", "equipo_id", "fecha", "tipo", "estado", "proveedor", "costo", "notas", "registrado_en", "creado_por", "id"),
+            displaycolumns=("id_mantenimiento", "equipo_id", "fecha", "tipo", "estado", "proveedor", "costo", "notas", "registrado_en", "creado_por"),
+            show="headings", height=14, selectmode="extended"  # Ctrl/Shift para cambios en lote
         )
         cabeceras = {
             "id_mantenimiento": "ID (oculto)", "equipo_id": "Equipo (ID)", "fecha": "Fecha",
@@ -1069,11 +4758,12 @@ class PestanaMantenimientos(ttk.Frame):
         anchos = {"id_mantenimiento": 0, "equipo_id": 140, "fecha": 110, "tipo": 110,
                   "estado": 110, "proveedor": 160, "costo": 100, "notas": 260,
                   "registrado_en": 150, "creado_por": 140}
-        for c in self.arbol["columns"]:
+        for c in self.arbol["displaycolumns"]:
             self.arbol.heading(c, text=cabeceras[c])
             self.arbol.column(c, width=anchos[c], anchor="w")
         self.arbol.column("id_mantenimiento", width=0, stretch=False, anchor="w")  # oculto
         self.arbol.pack(fill="both", expand=True, padx=8, pady=6)
+        PanelNotas(self, self.arbol, self.ejecutor, "mantenimientos").pack(fill="x", padx=8)
 
         zona_botones = ttk.Frame(self, style="App.TFrame")
         zona_botones.pack(pady=4)
@@ -1081,29 +4771,44 @@ class PestanaMantenimientos(ttk.Frame):
         ttk.Button(zona_botones, text="Editar", command=self._editar, style="Fantasma.TButton").pack(side="left", padx=4)
         ttk.Button(zona_botones, text="Completado", command=lambda: self._cambiar_estado("Completado"), style="Success.TButton").pack(side="left", padx=4)
         ttk.Button(zona_botones, text="Pendiente", command=lambda: self._cambiar_estado("Pendiente"), style="Fantasma.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Asignar proveedor", command=self._asignar_proveedor, style="Fantasma.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Adjuntos", command=self._adjuntos, style="Fantasma.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Calendario", command=lambda: VistaCargaMensual(self, self.ejecutor),
+                   style="Fantasma.TButton").pack(side="left", padx=4)
         ttk.Button(zona_botones, text="Exportar Excel", command=self._exportar_excel, style="Fantasma.TButton").pack(side="left", padx=12)
+        ttk.Button(zona_botones, text="Exportar cambios",
+                   command=lambda: exportar_cambios(self, self.ejecutor, "mantenimientos"),
+                   style="Fantasma.TButton").pack(side="left", padx=4)
         ttk.Button(zona_botones, text="Importar Excel", command=self._importar_excel, style="Fantasma.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Importar carpeta", command=self._importar_carpeta, style="Fantasma.TButton").pack(side="left", padx=4)
 
+        self._iniciar_sondeo()
         self._refrescar()
 
-    def _ids_equipos(self):
-        return [row[0] for row in self.con.execute("SELECT id_equipo FROM equipos ORDER BY id_equipo;").fetchall()]
+    def cambiar_usuario(self, usuario_actual):
+        self.usuario_actual = usuario_actual
 
     def _refrescar(self):
-        for i in self.arbol.get_children():
-            self.arbol.delete(i)
-        q = """
-        SELECT m.id_mantenimiento, m.equipo_id, m.fecha, m.tipo, m.estado,
-               COALESCE(m.proveedor,''), COALESCE(m.costo,0), COALESCE(m.notas,''),
-               COALESCE(m.registrado_en,''), COALESCE(m.creado_por,'')
-        FROM mantenimientos m
-        ORDER BY m.fecha DESC, m.id_mantenimiento DESC;
-        """
-        for fila in self.con.execute(q).fetchall():
-            # fila: (id_mant, equipo_id, fecha_iso, tipo, estado, proveedor, costo, notas, registrado_en, creado_por)
-            fila = list(fila)
-            fila[2] = _a_ddmmaaaa(fila[2])  # mostrar DD-MM-AAAA
-            self.arbol.insert("", "end", values=tuple(fila))
+        """Recarga la lista en segundo plano; las filas se agregan por lotes conforme llegan."""
+        self._recargar(lambda c: (version_tabla(c, "mantenimientos"), c.execute(SQL_LISTA_MANTENIMIENTOS)))
+
+    @staticmethod
+    def _valores(fila):
+        # fila: (id_mant, equipo_id, fecha_iso, tipo, estado, proveedor, costo, notas, registrado_en, creado_por, id)
+        fila = list(fila)
+        fila[2] = _a_ddmmaaaa(fila[2])  # mostrar DD-MM-AAAA
+        fila[7] = _vista_notas(fila[7])
+        return tuple(fila)
+
+    @staticmethod
+    def _clave_orden(valores):
+        # como el ORDER BY de la consulta: fecha DESC, id DESC (la clave entera, última columna)
+        fecha = str(valores[2])
+        try:
+            fecha = _a_iso(fecha)
+        except ValueError:
+            pass
+        return fecha, int(valores[10])
 
     def _id_seleccionado(self):
         sel = self.arbol.selection()
@@ -1114,200 +4819,128 @@ class PestanaMantenimientos(ttk.Frame):
         return str(valores[0])
 
     def _agregar(self):
-        ids = self._ids_equipos()
-        if not ids:
+        self.ejecutor.enviar(hay_equipos, al_terminar=self._abrir_alta, clave=(self, "abrir"))
+
+    def _abrir_alta(self, hay):
+        if not hay:
             messagebox.showinfo("Info", "Agregue equipos primero.")
             return
-        dlg = DialogoMantenimiento(self, "Agregar mantenimiento", ids_equipos=ids)
+        dlg = DialogoMantenimiento(self, "Agregar mantenimiento", con=self.con, ejecutor=self.ejecutor)
         self.wait_window(dlg)
         if dlg.resultado:
-            try:
-                # --- NUEVO: Mover registro anterior a historicos si existe para el mismo equipo_id ---
-                cur = self.con.execute("""
-                    SELECT * FROM mantenimientos WHERE equipo_id=? ORDER BY fecha DESC LIMIT 1
-                """, (dlg.resultado["equipo_id"],))
-                anterior = cur.fetchone()
-                if anterior:
-                    # Mapear columnas
-                    columnas = [desc[0] for desc in cur.description]
-                    datos_ant = dict(zip(columnas, anterior))
-                    id_historico = f"H-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
-                    self.con.execute("""
-                        INSERT INTO historicos(
-                            id_historico, id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo, creado_por, registrado_en
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        id_historico,
-                        datos_ant["id_mantenimiento"],
-                        datos_ant["equipo_id"],
-                        datos_ant["fecha"],
-                        datos_ant["tipo"],
-                        datos_ant["notas"],
-                        datos_ant["estado"],
-                        datos_ant["proveedor"],
-                        datos_ant["costo"],
-                        datos_ant["creado_por"],
-                        datos_ant["registrado_en"]
-                    ))
-                    # Eliminar el anterior de mantenimientos
-                    self.con.execute("DELETE FROM mantenimientos WHERE id_mantenimiento=?", (datos_ant["id_mantenimiento"],))
-                # --- FIN NUEVO ---
-
-                with self.con:
-                    self.con.execute("""
-                        INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo, creado_por, registrado_en)
-                        VALUES(?,?,?,?,?,?,?,?,?,?)
-                    """, (
-                        dlg.resultado["id_mantenimiento"], dlg.resultado["equipo_id"], dlg.resultado["fecha"],
-                        dlg.resultado["tipo"], dlg.resultado["notas"], dlg.resultado["estado"],
-                        dlg.resultado["proveedor"], dlg.resultado["costo"], self.usuario_actual["id"],
-                        dlg.resultado["registrado_en"]
-                    ))
-                self._refrescar()
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Error", "ID interno duplicado o equipo inexistente.")
+            datos, uid = dlg.resultado, self.usuario_actual["id"]
+            # el registro anterior del mismo equipo pasa a históricos
+            self.ejecutor.enviar(lambda c: insertar_mantenimiento(c, datos, uid),
+                                 al_terminar=lambda _: self._poner_al_dia(),
+                                 al_fallar=al_fallar_integridad("ID interno duplicado o equipo inexistente."))
 
     def _editar(self):
         mid = self._id_seleccionado()
         if not mid:
             return
-        fila = self.con.execute("""
-            SELECT id_mantenimiento, equipo_id, fecha, tipo, estado,
-                   COALESCE(proveedor,''), COALESCE(costo,0), COALESCE(notas,'')
-            FROM mantenimientos WHERE id_mantenimiento=?
-        """, (mid,)).fetchone()
-        if not fila:
+        self.ejecutor.enviar(lambda c: obtener_mantenimiento(c, mid),
+                             al_terminar=lambda datos: self._abrir_edicion(mid, datos), clave=(self, "abrir"))
+
+    def _abrir_edicion(self, mid, datos):
+        if not datos:
             return
-        datos = {
-            "id_mantenimiento": fila[0], "equipo_id": fila[1], "fecha": fila[2],
-            "tipo": fila[3], "estado": fila[4], "proveedor": fila[5], "costo": fila[6], "notas": fila[7]
-        }
-        ids = self._ids_equipos()
-        dlg = DialogoMantenimiento(self, "Editar mantenimiento", ids_equipos=ids, datos=datos)
+        dlg = DialogoMantenimiento(self, "Editar mantenimiento", con=self.con, datos=datos, ejecutor=self.ejecutor)
         self.wait_window(dlg)
         if dlg.resultado:
-            try:
-                with self.con:
-                    self.con.execute("""
-                        UPDATE mantenimientos
-                        SET equipo_id=?, fecha=?, tipo=?, notas=?, estado=?, proveedor=?, costo=?
-                        WHERE id_mantenimiento=?
-                    """, (
-                        dlg.resultado["equipo_id"], dlg.resultado["fecha"], dlg.resultado["tipo"],
-                        dlg.resultado["notas"], dlg.resultado["estado"], dlg.resultado["proveedor"],
-                        dlg.resultado["costo"], mid
-                    ))
-                self._refrescar()
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Error", "Datos inválidos o equipo inexistente.")
+            nuevos = dlg.resultado
+            self.ejecutor.enviar(lambda c: actualizar_mantenimiento(c, mid, nuevos),
+                                 al_terminar=lambda _: self._poner_al_dia(),
+                                 al_fallar=al_fallar_integridad("Datos inválidos o equipo inexistente."))
 
     def _cambiar_estado(self, estado: str):
-        mid = self._id_seleccionado()
-        if not mid:
+        ids = self._claves_seleccionadas("Seleccione uno o más mantenimientos.")
+        if ids:
+            self._en_lote("Estado", f"¿Marcar {len(ids)} mantenimientos como {estado}?",
+                          lambda c, claves: cambiar_estado_mantenimientos(c, claves, estado), ids)
+
+    def _asignar_proveedor(self):
+        ids = self._claves_seleccionadas("Seleccione uno o más mantenimientos.")
+        if not ids:
             return
-        with self.con:
-            self.con.execute("UPDATE mantenimientos SET estado=? WHERE id_mantenimiento=?", (estado, mid))
-        self._refrescar()
+        proveedor = simpledialog.askstring("Proveedor", f"Proveedor para {len(ids)} mantenimiento(s):", parent=self)
+        if proveedor is not None:
+            self._en_lote("Proveedor", f"¿Asignar el proveedor '{proveedor.strip()}' a {len(ids)} mantenimientos?",
+                          lambda c, claves: asignar_proveedor(c, claves, proveedor.strip()), ids)
+
+    def _adjuntos(self):
+        mid = self._id_seleccionado()
+        if mid:
+            DialogoAdjuntos(self, self.ejecutor, self.usuario_actual, id_mantenimiento=mid)
 
     # Excel
     def _exportar_excel(self):
-        if not PANDAS_OK:
-            messagebox.showwarning("Excel", "Instala pandas y openpyxl:  pip install pandas openpyxl")
-            return
         archivo = filedialog.asksaveasfilename(defaultextension=".xlsx",
-                                               filetypes=[("Excel", "*.xlsx")],
+                                               filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")],
                                                title="Guardar mantenimientos")
         if not archivo:
             return
-        consulta = """
-        SELECT id_mantenimiento, equipo_id, fecha, tipo, estado, proveedor, costo, notas, registrado_en, creado_por
-        FROM mantenimientos
-        ORDER BY fecha DESC;
-        """
-        try:
-            df = pd.read_sql_query(consulta, self.con)
-            df.to_excel(archivo, index=False)
-            messagebox.showinfo("Excel", "Mantenimientos exportados correctamente.")
-        except Exception as e:
-            messagebox.showerror("Excel", f"No se pudo exportar:\n{e}")
+        self.ejecutor.enviar(lambda c: exportar_tabla(c, "mantenimientos", archivo),
+                             al_terminar=lambda _: messagebox.showinfo("Excel", "Mantenimientos exportados correctamente."),
+                             al_fallar=lambda e: messagebox.showerror("Excel", f"No se pudo exportar:\n{e}"))
 
     def _importar_excel(self):
-        if not PANDAS_OK:
-            messagebox.showwarning("Excel", "Instala pandas y openpyxl:  pip install pandas openpyxl")
-            return
         archivo = filedialog.askopenfilename(title="Selecciona Excel de mantenimientos",
-                                             filetypes=[("Excel", "*.xlsx *.xls")])
+                                             filetypes=[("Excel", "*.xlsx *.xls"), ("CSV", "*.csv")])
         if not archivo:
             return
-        try:
-            df = pd.read_excel(archivo)
-            df.columns = [str(c).strip().lower() for c in df.columns]
-            df = df.dropna(how="all")  # Elimina filas completamente vacías
-        except Exception as e:
-            messagebox.showerror("Excel", f"No se pudo leer el archivo:\n{e}")
+        if falta_lector(archivo):
+            messagebox.showwarning("Excel", falta_lector(archivo))
             return
 
-        for col in ["id_mantenimiento", "equipo_id", "fecha", "tipo", "estado", "proveedor", "costo", "notas"]:
-            if col not in df.columns:
-                df[col] = "" if col != "costo" else 0
+        def _terminado(res):
+            self._poner_al_dia()
+            messagebox.showinfo("Excel", f"Mantenimientos importados. Nuevos: {res['insertados']} | "
+                                         f"Duplicados: {res['duplicados']} | Sin equipo: {res['sin_equipo']} | "
+                                         f"Omitidos: {res['omitidos']}")
 
-        nuevos = 0
-        with self.con:
-            for _, r in df.iterrows():
-                idm = str(r["id_mantenimiento"]).strip() or f"IMP-{uuid.uuid4().hex[:10]}"
-                eqid = str(r["equipo_id"]).strip()
-                if not eqid:
-                    continue
-
-                # Fecha normalizada: acepta DD-MM-AAAA o ISO o Timestamp
-                fecha_val = r["fecha"]
-                fecha_str = ""
-                if PANDAS_OK and isinstance(fecha_val, (pd.Timestamp,)):
-                    fecha_str = fecha_val.strftime("%Y-%m-%d")
-                else:
-                    txt = str(fecha_val).strip()
-                    if not txt:
-                        continue
-                    try:
-                        fecha_str = _a_iso(txt)  # si viene DD-MM-AAAA
-                    except Exception:
-                        try:
-                            datetime.strptime(txt, "%Y-%m-%d")
-                            fecha_str = txt
-                        except Exception:
-                            continue
-
-                tipo = str(r["tipo"])
-                if tipo not in ["Preventivo", "Correctivo"]:
-                    tipo = "Preventivo"
-                estado = str(r["estado"])
-                if estado not in ["Pendiente", "Completado"]:
-                    estado = "Pendiente"
-                proveedor = str(r.get("proveedor", "") or "")
-                try:
-                    costo = float(r.get("costo", 0) or 0)
-                except Exception:
-                    costo = 0.0
-                notas = str(r.get("notas", "") or "")
-                registrado_en = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        uid = self.usuario_actual["id"]
+        self.ejecutor.enviar(lambda c: importar_mantenimientos(c, leer_filas(archivo), uid),
+                             al_terminar=_terminado,
+                             al_fallar=lambda e: messagebox.showerror("Excel", f"No se pudo leer el archivo:\n{e}"))
 
-                try:
-                    self.con.execute("""
-                        INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, notas, estado, proveedor, costo, creado_por, registrado_en)
-                        VALUES(?,?,?,?,?,?,?,?,?,?)
-                    """, (idm, eqid, fecha_str, tipo, notas, estado, proveedor, costo, self.usuario_actual["id"], registrado_en))
-                    nuevos += 1
-                except sqlite3.IntegrityError:
-                    pass
-        self._refrescar()
-        messagebox.showinfo("Excel", f"Mantenimientos importados. Nuevos: {nuevos}")
+    def _importar_carpeta(self):
+        carpeta = filedialog.askdirectory(title="Selecciona la carpeta con los Excel de mantenimientos")
+        if carpeta:
+            importar_carpeta_dialogo(self, carpeta, "mantenimientos", self.usuario_actual["id"])
 
 
 class PestanaHistoricos(ttk.Frame):
     """Pestaña de visualización de históricos de mantenimientos."""
-    def __init__(self, padre, con):
+    def __init__(self, padre, con, ejecutor):
         super().__init__(padre)
         self.con = con
+        self.ejecutor = ejecutor
+        self._cursor = None          # (fecha, id) de la última fila mostrada
+        self._cargados = 0
+        self._total_periodo = 0
+        self._conteo_meses = {}
+
+        # Selector de periodo: abre en el año actual; otros periodos se consultan al elegirlos
+        superior = ttk.Frame(self, style="App.TFrame")
+        superior.pack(fill="x")
+        ttk.Label(superior, text="Año", style="Cuerpo.TLabel").pack(side="left", padx=(8, 4), pady=6)
+        self.cmb_anio = ttk.Combobox(superior, values=[str(date.today().year)],
+                                     state="readonly", width=8, style="Combo.TCombobox")
+        self.cmb_anio.set(str(date.today().year))
+        self.cmb_anio.pack(side="left", padx=4)
+        ttk.Label(superior, text="Mes", style="Cuerpo.TLabel").pack(side="left", padx=(12, 4))
+        self.cmb_mes = ttk.Combobox(superior, state="readonly", width=18, style="Combo.TCombobox")
+        self.cmb_mes.pack(side="left", padx=4)
+        self.lbl_total = ttk.Label(superior, text="Registros en el periodo: 0", style="Cuerpo.TLabel")
+        self.lbl_total.pack(side="left", padx=12)
+        self.btn_mas = ttk.Button(superior, text="Cargar más", command=self._cargar_pagina, style="Fantasma.TButton")
+        self.btn_mas.pack(side="right", padx=8)
+        ttk.Button(superior, text="Exportar cambios",
+                   command=lambda: exportar_cambios(self, self.ejecutor, "historicos"),
+                   style="Fantasma.TButton").pack(side="right", padx=4)
+
+        self.cmb_anio.bind("<<ComboboxSelected>>", lambda e: self._refrescar())
+        self.cmb_mes.bind("<<ComboboxSelected>>", lambda e: self._cambiar_mes())
 
         self.arbol = ttk.Treeview(
             self,
@@ -1337,30 +4970,192 @@ class PestanaHistoricos(ttk.Frame):
         self.arbol.column("id_historico", width=0, stretch=False, anchor="w")  # oculto
         self.arbol.column("id_mantenimiento", width=0, stretch=False, anchor="w")  # oculto
         self.arbol.pack(fill="both", expand=True, padx=8, pady=6)
+        PanelNotas(self, self.arbol, self.ejecutor, "historicos").pack(fill="x", padx=8, pady=(0, 8))
 
+        self._version = None
+        self._sondeo = self.after(INTERVALO_SONDEO_MS, self._sondear)
+        self.ejecutor.enviar(anios_con_historicos, al_terminar=self._poner_anios)
         self._refrescar()
 
+    def destroy(self):
+        self.after_cancel(self._sondeo)
+        super().destroy()
+
+    def _sondear(self):
+        """Si el diario registra movimientos en históricos (p. ej. un archivado) se recarga el periodo."""
+        self.ejecutor.enviar(lambda c: version_tabla(c, "historicos"),
+                             al_terminar=self._al_sondear, clave=(self, "sondeo"))
+        self._sondeo = self.after(INTERVALO_SONDEO_MS, self._sondear)
+
+    def _al_sondear(self, version):
+        if self._version is not None and version != self._version:
+            self.ejecutor.enviar(anios_con_historicos, al_terminar=self._poner_anios)
+            self._refrescar()
+        self._version = version
+
+    def _poner_anios(self, anios):
+        self.cmb_anio["values"] = [str(a) for a in anios]
+
+    def _periodo(self):
+        anio = int(self.cmb_anio.get() or date.today().year)
+        mes = self.cmb_mes.current()  # 0 = todo el año
+        return anio, (mes if mes > 0 else None)
+
     def _refrescar(self):
-        for i in self.arbol.get_children():
-            self.arbol.delete(i)
-        q = """
-        SELECT id_historico, id_mantenimiento, equipo_id, fecha, tipo, estado, proveedor, costo, notas, registrado_en, creado_por
-        FROM historicos
-        ORDER BY fecha DESC, id_historico DESC;
-        """
-        for fila in self.con.execute(q).fetchall():
+        """Recalcula el conteo por mes del año elegido y recarga la primera página."""
+        anio, mes = self._periodo()
+        self.ejecutor.cancelar((self, "pagina"))
+        self.ejecutor.enviar(lambda c: contar_historicos_por_mes(c, anio),
+                             al_terminar=lambda conteo: self._poner_conteo(conteo, mes),
+                             clave=(self, "conteo"))
+
+    def _poner_conteo(self, conteo, mes):
+        self._conteo_meses = conteo
+        etiquetas = [f"Todo el año ({sum(self._conteo_meses.values())})"]
+        etiquetas += [f"{MESES[m - 1]} ({self._conteo_meses.get(m, 0)})" for m in range(1, 13)]
+        self.cmb_mes["values"] = etiquetas
+        self.cmb_mes.current(mes or 0)
+        self._cambiar_mes()
+
+    def _cambiar_mes(self):
+        _anio, mes = self._periodo()
+        self._total_periodo = self._conteo_meses.get(mes, 0) if mes else sum(self._conteo_meses.values())
+        self.arbol.delete(*self.arbol.get_children())
+        self._cursor = None
+        self._cargados = 0
+        self._cargar_pagina()
+
+    def _cargar_pagina(self):
+        anio, mes = self._periodo()
+        cursor = self._cursor
+        self.btn_mas.state(["disabled"])
+        self.ejecutor.enviar(lambda c: listar_historicos(c, anio, mes, cursor=cursor),
+                             al_terminar=self._mostrar_pagina, clave=(self, "pagina"))
+
+    def _mostrar_pagina(self, filas):
+        for fila in filas:
             fila = list(fila)
             # fecha ISO -> DD-MM-AAAA
             fila[3] = _a_ddmmaaaa(fila[3])
-            self.arbol.insert("", "end", values=tuple(fila))
+            fila[8] = _vista_notas(fila[8])
+            self.arbol.insert("", "end", values=tuple(fila[:-1]))
+        if filas:
+            self._cursor = (filas[-1][3], filas[-1][-1])
+        self._cargados += len(filas)
+        self.lbl_total.config(text=f"Registros en el periodo: {self._total_periodo}  |  Mostrados: {self._cargados}")
+        if self._cargados >= self._total_periodo or len(filas) < TAMANO_PAGINA_HISTORICOS:
+            self.btn_mas.state(["disabled"])
+        else:
+            self.btn_mas.state(["!disabled"])
+
+
+class PestanaPlanes(ttk.Frame):
+    """Pestaña de planes de mantenimiento y generación de órdenes por periodo."""
+    def __init__(self, padre, con, usuario_actual, ejecutor):
+        super().__init__(padre)
+        self.con = con
+        self.usuario_actual = usuario_actual
+        self.ejecutor = ejecutor
+
+        self.arbol = ttk.Treeview(self, columns=COLUMNAS_PLAN, show="headings", height=12)
+        cabeceras = {
+            "id_plan": "ID", "nombre": "Plan", "equipo_id": "Equipo (ID)", "categoria": "Categoría",
+            "tipo": "Tipo", "cada_meses": "Cada (meses)", "dia": "Día", "inicio": "Desde",
+            "proveedor": "Proveedor", "costo": "Costo", "notas": "Notas", "activo": "Activo"
+        }
+        anchos = {"id_plan": 50, "nombre": 180, "equipo_id": 120, "categoria": 140, "tipo": 100, "cada_meses": 90,
+                  "dia": 50, "inicio": 80, "proveedor": 140, "costo": 80, "notas": 200, "activo": 60}
+        for c in COLUMNAS_PLAN:
+            self.arbol.heading(c, text=cabeceras[c])
+            self.arbol.column(c, width=anchos[c], anchor="w")
+        self.arbol.pack(fill="both", expand=True, padx=8, pady=8)
+
+        zona_botones = ttk.Frame(self, style="App.TFrame")
+        zona_botones.pack(pady=4)
+        ttk.Button(zona_botones, text="Agregar", command=self._agregar, style="Primario.TButton").pack(side="left", padx=4)
+        ttk.Button(zona_botones, text="Editar", command=self._editar, style="Fantasma.TButton").pack(side="left", padx=4)
+        self.btn_borrar = ttk.Button(zona_botones, text="Eliminar", command=self._eliminar, style="Danger.TButton")
+        self.btn_borrar.pack(side="left", padx=4)
+        self.cambiar_usuario(usuario_actual)
+        ttk.Button(zona_botones, text="Generar periodo", command=self._generar, style="Success.TButton").pack(side="left", padx=12)
+
+        self._refrescar()
+
+    def cambiar_usuario(self, usuario_actual):
+        """Sesión nueva sin reconstruir la pestaña: solo cambia lo que depende del rol."""
+        self.usuario_actual = usuario_actual
+        self.btn_borrar.state(["!disabled"] if usuario_actual["rol"] == "administrador" else ["disabled"])
+
+    def _refrescar(self):
+        self.ejecutor.enviar(listar_planes, al_terminar=self._mostrar, clave=(self, "refrescar"))
+
+    def _mostrar(self, filas):
+        self.arbol.delete(*self.arbol.get_children())
+        for fila in filas:
+            self.arbol.insert("", "end", iid=str(fila[0]), values=tuple("" if v is None else v for v in fila))
+
+    def _seleccionado(self):
+        sel = self.arbol.selection()
+        if not sel:
+            messagebox.showinfo("Info", "Seleccione un plan.")
+            return None
+        return dict(zip(COLUMNAS_PLAN, self.arbol.item(sel[0], "values")))
+
+    def _agregar(self):
+        dlg = DialogoPlan(self, "Agregar plan")
+        self.wait_window(dlg)
+        if dlg.resultado:
+            datos = dlg.resultado
+            self.ejecutor.enviar(lambda c: crear_plan(c, datos), al_terminar=lambda _: self._refrescar(),
+                                 al_fallar=al_fallar_integridad("El equipo indicado no existe."))
+
+    def _editar(self):
+        actual = self._seleccionado()
+        if not actual:
+            return
+        dlg = DialogoPlan(self, "Editar plan", datos=actual)
+        self.wait_window(dlg)
+        if dlg.resultado:
+            datos, id_plan = dlg.resultado, int(actual["id_plan"])
+            self.ejecutor.enviar(lambda c: actualizar_plan(c, id_plan, datos), al_terminar=lambda _: self._refrescar(),
+                                 al_fallar=al_fallar_integridad("El equipo indicado no existe."))
+
+    def _eliminar(self):
+        if self.usuario_actual["rol"] != "administrador":
+            return
+        actual = self._seleccionado()
+        if not actual:
+            return
+        if not messagebox.askyesno("Confirmar", f"¿Eliminar el plan '{actual['nombre']}'?\n"
+                                                "Las órdenes ya generadas se conservan."):
+            return
+        id_plan = int(actual["id_plan"])
+        self.ejecutor.enviar(lambda c: eliminar_plan(c, id_plan), al_terminar=lambda _: self._refrescar())
+
+    def _generar(self):
+        periodo = simpledialog.askstring("Generar periodo", "Periodo a generar (AAAA-MM):",
+                                         initialvalue=siguiente_periodo(), parent=self)
+        if not periodo:
+            return
+        try:
+            datetime.strptime(periodo.strip(), "%Y-%m")
+        except ValueError:
+            messagebox.showwarning("Validación", "El periodo debe ser AAAA-MM.")
+            return
+        uid = self.usuario_actual["id"]
+        self.ejecutor.enviar(lambda c: generar_periodo(c, periodo.strip(), uid),
+                             al_terminar=lambda res: messagebox.showinfo(
+                                 "Planes", f"Periodo {res['periodo']}: {res['generados']} órdenes nuevas "
+                                           f"({res['segundos']} s). Las ya generadas no se duplican."))
 
 
 class PestanaUsuarios(ttk.Frame):
     """Pestaña de gestión de usuarios."""
-    def __init__(self, padre, con, usuario_actual):
+    def __init__(self, padre, con, usuario_actual, ejecutor):
         super().__init__(padre)
         self.con = con
         self.usuario_actual = usuario_actual
+        self.ejecutor = ejecutor
 
         self.arbol = ttk.Treeview(self, columns=("id", "usuario", "rol"), show="headings", height=12)
         for col, txt, ancho in [("id", "ID", 60), ("usuario", "Usuario", 260), ("rol", "Rol", 160)]:
@@ -1376,11 +5171,16 @@ class PestanaUsuarios(ttk.Frame):
 
         self._refrescar()
 
+    def cambiar_usuario(self, usuario_actual):
+        self.usuario_actual = usuario_actual
+
     def _refrescar(self):
-        for i in self.arbol.get_children():
-            self.arbol.delete(i)
-        cur = self.con.execute("SELECT id, usuario, rol FROM usuarios ORDER BY id;")
-        for fila in cur.fetchall():
+        self.ejecutor.enviar(lambda c: c.execute("SELECT id, usuario, rol FROM usuarios ORDER BY id;").fetchall(),
+                             al_terminar=self._mostrar, clave=(self, "refrescar"))
+
+    def _mostrar(self, filas):
+        self.arbol.delete(*self.arbol.get_children())
+        for fila in filas:
             self.arbol.insert("", "end", values=fila)
 
     def _seleccionado(self):
@@ -1401,11 +5201,9 @@ class PestanaUsuarios(ttk.Frame):
             if not contrasena:
                 messagebox.showwarning("Validación", "La contraseña es obligatoria.")
                 return
-            try:
-                crear_usuario(self.con, usuario, contrasena, rol)
-                self._refrescar()
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Error", "El usuario ya existe.")
+            self.ejecutor.enviar(lambda c: crear_usuario(c, usuario, contrasena, rol),
+                                 al_terminar=lambda _: self._refrescar(),
+                                 al_fallar=al_fallar_integridad("El usuario ya existe."))
 
     def _editar(self):
         datos = self._seleccionado()
@@ -1417,18 +5215,9 @@ class PestanaUsuarios(ttk.Frame):
             usuario = dlg.resultado["usuario"]
             rol = dlg.resultado["rol"]
             nueva_pwd = dlg.resultado["contrasena"]
-            with self.con:
-                try:
-                    self.con.execute("UPDATE usuarios SET usuario=?, rol=? WHERE id=?", (usuario, rol, datos["id"]))
-                except sqlite3.IntegrityError:
-                    messagebox.showerror("Error", "Nombre de usuario duplicado.")
-                    return
-                if nueva_pwd:
-                    sal = secrets.token_hex(16)
-                    hash_pwd = crear_hash(nueva_pwd, sal)
-                    self.con.execute("UPDATE usuarios SET hash_contrasena=?, sal=? WHERE id=?",
-                                     (hash_pwd, sal, datos["id"]))
-            self._refrescar()
+            self.ejecutor.enviar(lambda c: actualizar_usuario(c, datos["id"], usuario, rol, nueva_pwd),
+                                 al_terminar=lambda _: self._refrescar(),
+                                 al_fallar=al_fallar_integridad("Nombre de usuario duplicado."))
 
     def _eliminar(self):
         datos = self._seleccionado()
@@ -1439,30 +5228,22 @@ class PestanaUsuarios(ttk.Frame):
             return
         if not messagebox.askyesno("Confirmar", f"¿Eliminar usuario '{datos['usuario']}'?"):
             return
-        with self.con:
-            self.con.execute("DELETE FROM usuarios WHERE id=?", (datos["id"],))
-        self._refrescar()
+        self.ejecutor.enviar(lambda c: eliminar_usuario(c, datos["id"]),
+                             al_terminar=lambda _: self._refrescar())
 
 
 # ============================================================
 # 10) VENTANAS PRINCIPALES (LOGIN con Frame centrado + APP)
 # ============================================================
-class VentanaInicioSesion(tk.Tk):
-    """Ventana de inicio de sesión (fullscreen, tarjeta centrada)."""
-    def __init__(self, con):
-        super().__init__()
+class TarjetaInicioSesion(ttk.Frame):
+    """Tarjeta de inicio de sesión centrada. `al_ingresar(usuario)` recibe el usuario verificado."""
+    def __init__(self, padre, con, al_ingresar, al_salir):
+        super().__init__(padre, style="App.TFrame")
         self.con = con
-        self.title("Login - Control de Mantenimientos")
-        aplicar_estilo_global()
-        aplicar_icono_aplicacion(self)
-        habilitar_pantalla_completa(self)
-
-        # Contenedor raíz
-        cont = ttk.Frame(self, style="App.TFrame")
-        cont.pack(fill="both", expand=True)
+        self.al_ingresar = al_ingresar
 
         # Tarjeta centrada
-        tarjeta = ttk.Frame(cont, style="Card.TFrame", padding=40)
+        tarjeta = ttk.Frame(self, style="Card.TFrame", padding=40)
         tarjeta.place(relx=0.5, rely=0.5, anchor="center")
         tarjeta.configure(width=560)
 
@@ -1484,14 +5265,19 @@ class VentanaInicioSesion(tk.Tk):
         zona_botones = ttk.Frame(tarjeta, style="Card.TFrame")
         zona_botones.grid(row=3, column=0, columnspan=2, pady=(18, 0))
         ttk.Button(zona_botones, text="Ingresar", command=self._iniciar_sesion, style="Primario.TButton").grid(row=0, column=0, padx=8)
-        ttk.Button(zona_botones, text="Salir", command=self.destroy, style="Fantasma.TButton").grid(row=0, column=1, padx=8)
+        ttk.Button(zona_botones, text="Salir", command=al_salir, style="Fantasma.TButton").grid(row=0, column=1, padx=8)
 
-        self.bind("<Return>", lambda e: self._iniciar_sesion())
-        self.e_usuario.focus_set()
+        for entrada in (self.e_usuario, self.e_contra):
+            entrada.bind("<Return>", lambda e: self._iniciar_sesion())
 
         for i in range(2):
             tarjeta.grid_columnconfigure(i, weight=1)
 
+    def limpiar(self):
+        self.e_usuario.delete(0, "end")
+        self.e_contra.delete(0, "end")
+        self.e_usuario.focus_set()
+
     def _iniciar_sesion(self):
         usuario = self.e_usuario.get().strip()
         contrasena = self.e_contra.get().strip()
@@ -1499,6 +5285,24 @@ class VentanaInicioSesion(tk.Tk):
         if not user:
             messagebox.showerror("Acceso denegado", "Usuario o contraseña incorrectos.")
             return
+        self.al_ingresar(user)
+
+
+class VentanaInicioSesion(tk.Tk):
+    """Ventana de inicio de sesión (fullscreen, tarjeta centrada)."""
+    def __init__(self, con):
+        super().__init__()
+        self.con = con
+        self.title("Login - Control de Mantenimientos")
+        aplicar_estilo_global()
+        aplicar_icono_aplicacion(self)
+        habilitar_pantalla_completa(self)
+
+        tarjeta = TarjetaInicioSesion(self, con, al_ingresar=self._entrar, al_salir=self.destroy)
+        tarjeta.pack(fill="both", expand=True)
+        tarjeta.limpiar()
+
+    def _entrar(self, user):
         self.destroy()
         app = AplicacionPrincipal(self.con, user)
         app.mainloop()
@@ -1516,17 +5320,20 @@ class AplicacionPrincipal(tk.Tk):
         aplicar_icono_aplicacion(self)
         habilitar_pantalla_completa(self)
 
+        # Las consultas de pestañas y diálogos van a un hilo con su propia conexión
+        self.ejecutor = EjecutorBD(self, ruta_bd(self.con))
+        # Los respaldos (copia + integrity_check) tienen su propio hilo y conexión: mientras corren,
+        # las pestañas siguen cargando y guardando
+        self.ejecutor_respaldos = EjecutorBD(self, ruta_bd(self.con), nombre="respaldos")
+
         # Barra superior
-        barra = ttk.Frame(self, style="App.TFrame")
+        self.barra = barra = ttk.Frame(self, style="App.TFrame")
         barra.pack(fill="x")
-        ttk.Label(
-            barra,
-            text=f"Usuario: {usuario_actual['usuario']}  |  Rol: {usuario_actual['rol']}",
-            style="Cuerpo.TLabel"
-        ).pack(side="left", padx=10, pady=8)
+        self.lbl_usuario = ttk.Label(barra, style="Cuerpo.TLabel")
+        self.lbl_usuario.pack(side="left", padx=10, pady=8)
 
         ttk.Button(barra, text="Comprobar alertas ahora",
-                   command=lambda: revisar_alertas(self.con, forzar=True),
+                   command=lambda: self._revisar_alertas(forzar=True),
                    style="Fantasma.TButton").pack(side="right", padx=6)
         ttk.Button(barra, text="Configurar alertas",
                    command=self._configurar_alertas,
@@ -1542,51 +5349,867 @@ class AplicacionPrincipal(tk.Tk):
         self.nb = ttk.Notebook(self)
         self.nb.pack(fill="both", expand=True, padx=8, pady=8)
 
-        self.tab_equipos = PestanaEquipos(self.nb, self.con, self.usuario_actual)
+        self.tab_equipos = PestanaEquipos(self.nb, self.con, self.usuario_actual, self.ejecutor)
         self.nb.add(self.tab_equipos, text="Equipos")
 
-        self.tab_mants = PestanaMantenimientos(self.nb, self.con, self.usuario_actual)
+        self.tab_mants = PestanaMantenimientos(self.nb, self.con, self.usuario_actual, self.ejecutor)
         self.nb.add(self.tab_mants, text="Mantenimientos")
 
         # --- NUEVO: Pestaña de Históricos ---
-        self.tab_historicos = PestanaHistoricos(self.nb, self.con)
+        self.tab_historicos = PestanaHistoricos(self.nb, self.con, self.ejecutor)
         self.nb.add(self.tab_historicos, text="Históricos")
         # --- FIN NUEVO ---
 
-        if self.usuario_actual["rol"] == "administrador":
-            self.tab_usuarios = PestanaUsuarios(self.nb, self.con, self.usuario_actual)
-            self.nb.add(self.tab_usuarios, text="Usuarios")
+        self.tab_planes = PestanaPlanes(self.nb, self.con, self.usuario_actual, self.ejecutor)
+        self.nb.add(self.tab_planes, text="Planes")
+
+        # Lo que depende del rol (pestaña Usuarios, menú de administración) lo arma _aplicar_usuario
+        self.tab_usuarios = None
+        self._menubar = None
+        self.tarjeta_login = None
+        self._aplicar_usuario(usuario_actual)
 
         # Revisar alertas al iniciar
-        self.after(300, lambda: revisar_alertas(self.con, forzar=False))
+        self.after(300, lambda: self._revisar_alertas(forzar=False))
+        # Respaldo automático: se revisa periódicamente si ya toca (ajuste respaldo_intervalo_horas)
+        self._respaldo_programado = self.after(5000, self._respaldo_automatico)
+        # Mantenimiento de la BD (ANALYZE, vacuum incremental) por pasos cuando nadie usa la interfaz
+        self._ultima_actividad = time.monotonic()
+        self.bind_all("<Any-KeyPress>", self._registrar_actividad, add="+")
+        self.bind_all("<Any-ButtonPress>", self._registrar_actividad, add="+")
+        self._mantenimiento_programado = self.after(INTERVALO_MANTENIMIENTO_BD_MS, self._mantenimiento_en_reposo)
+
+    # Sesión: al cambiar de usuario se conservan la ventana, las pestañas y los datos ya cargados
+    def _aplicar_usuario(self, usuario_actual):
+        self.usuario_actual = usuario_actual
+        self.title("Control de Mantenimientos")
+        self.lbl_usuario.config(text=f"Usuario: {usuario_actual['usuario']}  |  Rol: {usuario_actual['rol']}")
+        for pestana in (self.tab_equipos, self.tab_mants, self.tab_planes):
+            pestana.cambiar_usuario(usuario_actual)
 
-        # Menú
-        menubar = tk.Menu(self)
+        if usuario_actual["rol"] == "administrador":
+            if self.tab_usuarios is None:
+                self.tab_usuarios = PestanaUsuarios(self.nb, self.con, self.usuario_actual, self.ejecutor)
+            else:
+                self.tab_usuarios.cambiar_usuario(usuario_actual)
+            self.nb.add(self.tab_usuarios, text="Usuarios")  # si estaba oculta vuelve a su lugar
+        elif self.tab_usuarios is not None:
+            self.nb.hide(self.tab_usuarios)
+        self._construir_menu()
+
+    def _construir_menu(self):
+        if self._menubar is not None:
+            self._menubar.destroy()
+        self._menubar = menubar = tk.Menu(self)
         self.config(menu=menubar)
         menu_cfg = tk.Menu(menubar, tearoff=0)
         menu_cfg.add_command(label="Configurar alertas", command=self._configurar_alertas)
-        menu_cfg.add_command(label="Comprobar alertas ahora", command=lambda: revisar_alertas(self.con, forzar=True))
+        menu_cfg.add_command(label="Comprobar alertas ahora", command=lambda: self._revisar_alertas(forzar=True))
         menubar.add_cascade(label="Configuración", menu=menu_cfg)
+        menu_resp = tk.Menu(menubar, tearoff=0)
+        menu_resp.add_command(label="Respaldar ahora", command=self._respaldar_ahora)
+        menu_resp.add_command(label="Configurar respaldos automáticos", command=self._configurar_respaldos)
+        if self.usuario_actual["rol"] == "administrador":
+            menu_resp.add_separator()
+            menu_resp.add_command(label="Restaurar respaldo…", command=self._restaurar_respaldo)
+            menu_resp.add_command(label="Compactar y analizar la BD ahora", command=self._mantener_bd_ahora)
+        menubar.add_cascade(label="Respaldos", menu=menu_resp)
+
+    def _revisar_alertas(self, forzar=False):
+        self.ejecutor.enviar(lambda c: aviso_alertas(c, forzar), al_terminar=mostrar_aviso)
 
     def _configurar_alertas(self):
-        dia = int(obtener_ajuste(self.con, "dia_mantenimiento", "1") or "1")
-        pre = int(obtener_ajuste(self.con, "preaviso_dias_fin_mes", "5") or "5")
+        def _leer(c):
+            return (int(obtener_ajuste(c, "dia_mantenimiento", "1") or "1"),
+                    int(obtener_ajuste(c, "preaviso_dias_fin_mes", "5") or "5"))
+        self.ejecutor.enviar(_leer, al_terminar=lambda valores: self._abrir_config_alertas(*valores))
+
+    def _abrir_config_alertas(self, dia, pre):
         dlg = DialogoConfigAlertas(self, dia_actual=dia, preaviso_actual=pre)
         self.wait_window(dlg)
         if dlg.resultado:
             dia_nuevo, pre_nuevo = dlg.resultado
-           
-            establecer_ajuste(self.con, "dia_mantenimiento", str(dia_nuevo))
-            establecer_ajuste(self.con, "preaviso_dias_fin_mes", str(pre_nuevo))
-            messagebox.showinfo("Alertas", f"Configurado: día={dia_nuevo}, aviso previo={pre_nuevo} días antes de fin de mes.")
+
+            def _guardar(c):
+                establecer_ajuste(c, "dia_mantenimiento", str(dia_nuevo))
+                establecer_ajuste(c, "preaviso_dias_fin_mes", str(pre_nuevo))
+            self.ejecutor.enviar(_guardar, al_terminar=lambda _: messagebox.showinfo(
+                "Alertas", f"Configurado: día={dia_nuevo}, aviso previo={pre_nuevo} días antes de fin de mes."))
+
+    # Respaldos (en el hilo de respaldos, copiando por pasos)
+    def _respaldo_automatico(self):
+        def _tarea(c):
+            return respaldo_rotativo(c) if respaldo_pendiente(c) else None
+
+        def _fallo(e):
+            logging.warning("Respaldo automático fallido: %s", e)
+            messagebox.showwarning("Respaldo", f"No se pudo hacer el respaldo automático:\n{e}")
+
+        self.ejecutor_respaldos.enviar(_tarea, al_fallar=_fallo, clave=(self, "respaldo"))
+        self._respaldo_programado = self.after(INTERVALO_REVISION_RESPALDO_MS, self._respaldo_automatico)
+
+    def _respaldar_ahora(self):
+        self.ejecutor_respaldos.enviar(respaldo_rotativo, clave=(self, "respaldo"),
+                             al_terminar=lambda res: messagebox.showinfo(
+                                 "Respaldo", f"Respaldo verificado en:\n{res['destino']}\n"
+                                             f"({res['bytes'] // 1024} KB, {res['segundos']} s)"),
+                             al_fallar=lambda e: messagebox.showerror("Respaldo", f"No se pudo respaldar:\n{e}"))
+
+    def _configurar_respaldos(self):
+        def _leer(c):
+            return (int(float(obtener_ajuste(c, "respaldo_intervalo_horas", str(INTERVALO_RESPALDO_HORAS)) or 0)),
+                    int(obtener_ajuste(c, "respaldo_generaciones", str(GENERACIONES_RESPALDO))))
+        self.ejecutor.enviar(_leer, al_terminar=lambda valores: self._abrir_config_respaldos(*valores))
+
+    def _abrir_config_respaldos(self, intervalo, generaciones):
+        dlg = DialogoConfigRespaldos(self, intervalo_actual=intervalo, generaciones_actual=generaciones)
+        self.wait_window(dlg)
+        if dlg.resultado:
+            intervalo_nuevo, generaciones_nuevo = dlg.resultado
+
+            def _guardar(c):
+                establecer_ajuste(c, "respaldo_intervalo_horas", str(intervalo_nuevo))
+                establecer_ajuste(c, "respaldo_generaciones", str(generaciones_nuevo))
+            self.ejecutor.enviar(_guardar, al_terminar=lambda _: messagebox.showinfo(
+                "Respaldo", f"Configurado: cada {intervalo_nuevo} h, conservar {generaciones_nuevo} generaciones."))
+
+    def _restaurar_respaldo(self):
+        origen = filedialog.askopenfilename(title="Selecciona el respaldo a restaurar",
+                                            initialdir=carpeta_respaldos(self.con),
+                                            filetypes=[("SQLite", "*.db"), ("Todos", "*.*")])
+        if not origen:
+            return
+        if not messagebox.askyesno("Restaurar", "Se reemplazarán TODOS los datos actuales por los del respaldo.\n"
+                                                "Antes se guarda una copia del estado actual. ¿Continuar?"):
+            return
+
+        def _terminado(res):
+            for pestana in (self.tab_equipos, self.tab_mants, self.tab_historicos):
+                pestana._refrescar()
+            messagebox.showinfo("Restaurar", f"Respaldo restaurado.\nCopia del estado anterior:\n{res['previo']}")
+
+        self.ejecutor.enviar(lambda c: restaurar_bd(c, origen), al_terminar=_terminado,
+                             al_fallar=lambda e: messagebox.showerror("Restaurar", f"No se pudo restaurar:\n{e}"))
+
+    # Mantenimiento de la BD
+    def _registrar_actividad(self, _evento=None):
+        self._ultima_actividad = time.monotonic()
+
+    def _mantenimiento_en_reposo(self):
+        if time.monotonic() - self._ultima_actividad >= REPOSO_MANTENIMIENTO_BD_S:
+            self.ejecutor.enviar(mantener_bd, clave=(self, "mantenimiento_bd"),
+                                 al_fallar=lambda e: logging.warning("Mantenimiento de la BD fallido: %s", e))
+        self._mantenimiento_programado = self.after(INTERVALO_MANTENIMIENTO_BD_MS, self._mantenimiento_en_reposo)
+
+    def _mantener_bd_ahora(self):
+        self.ejecutor.enviar(lambda c: mantener_bd(c, None, compactar=True, analizar=True),
+                             clave=(self, "mantenimiento_bd"),
+                             al_terminar=lambda res: messagebox.showinfo(
+                                 "Base de datos", f"Listo en {res['segundos']} s.\n"
+                                                  f"Tamaño: {res['bytes_antes'] // 1024} KB → {res['bytes_despues'] // 1024} KB"),
+                             al_fallar=lambda e: messagebox.showerror("Base de datos", f"No se pudo completar:\n{e}"))
+
+    def destroy(self):
+        self.after_cancel(self._respaldo_programado)
+        self.after_cancel(self._mantenimiento_programado)
+        self.ejecutor_respaldos.cerrar()
+        self.ejecutor.cerrar()
+        super().destroy()
 
     def _cerrar_sesion(self):
-        self.destroy()
-        ejecutar_login(self.con)
+        """Muestra la tarjeta de inicio de sesión en esta misma ventana; nada se recarga al volver a entrar."""
+        pendientes = list(self.winfo_children())
+        while pendientes:  # diálogos abiertos por el usuario que sale
+            hijo = pendientes.pop()
+            if isinstance(hijo, tk.Toplevel):
+                hijo.destroy()
+            else:
+                pendientes.extend(hijo.winfo_children())
+        self.barra.pack_forget()
+        self.nb.pack_forget()
+        self.config(menu="")
+        if self.tarjeta_login is None:
+            self.tarjeta_login = TarjetaInicioSesion(self, self.con, al_ingresar=self._iniciar_sesion, al_salir=self.destroy)
+        self.title("Login - Control de Mantenimientos")
+        self.tarjeta_login.pack(fill="both", expand=True)
+        self.tarjeta_login.limpiar()
+
+    def _iniciar_sesion(self, usuario):
+        self.tarjeta_login.pack_forget()
+        self.barra.pack(fill="x")
+        self.nb.pack(fill="both", expand=True, padx=8, pady=8)
+        self._aplicar_usuario(usuario)
+        self._registrar_actividad()
+        self._revisar_alertas(forzar=False)
+
+
+# ============================================================
+# 11) SERVICIO HTTP LOCAL (API JSON)
+# ============================================================
+PUERTO_API = 8765
+TRABAJADORES_API = 4
+LIMITE_PAGINA_API = 50
+MAXIMO_PAGINA_API = 500
+
+RECURSOS_API = COLUMNAS_TABLAS
+
+
+class ErrorAPI(Exception):
+    """Error con código HTTP para responder al cliente."""
+    def __init__(self, codigo: int, mensaje: str):
+        super().__init__(mensaje)
+        self.codigo = codigo
+        self.mensaje = mensaje
+
+
+def _api_listar(con, recurso: str, query: dict) -> dict:
+    """Página ordenada por la clave primaria; `despues` es la última clave recibida."""
+    clave, columnas = RECURSOS_API[recurso]
+    try:
+        limite = min(max(int(query.get("limite", [LIMITE_PAGINA_API])[0]), 1), MAXIMO_PAGINA_API)
+    except ValueError:
+        raise ErrorAPI(400, "'limite' debe ser un entero.")
+    despues = query.get("despues", [None])[0]
+    sql = f"SELECT {', '.join(columnas)} FROM {recurso} "
+    if despues is None:
+        filas = con.execute(sql + f"ORDER BY {clave} LIMIT ?;", (limite,)).fetchall()
+    else:
+        filas = con.execute(sql + f"WHERE {clave} > ? ORDER BY {clave} LIMIT ?;", (despues, limite)).fetchall()
+    datos = [dict(zip(columnas, f)) for f in filas]
+    return {"datos": datos, "siguiente": datos[-1][clave] if len(datos) == limite else None}
+
+
+def _api_obtener(con, recurso: str, id_: str) -> dict:
+    clave, columnas = RECURSOS_API[recurso]
+    fila = con.execute(f"SELECT {', '.join(columnas)} FROM {recurso} WHERE {clave}=?;", (id_,)).fetchone()
+    if not fila:
+        raise ErrorAPI(404, f"No existe {recurso[:-1]} '{id_}'.")
+    return dict(zip(columnas, fila))
+
+
+def _api_cambios(con, query: dict) -> dict:
+    """Entradas del diario después de `desde`; `version` es el cursor para la siguiente llamada."""
+    try:
+        desde = int(query.get("desde", ["0"])[0])
+        limite = min(max(int(query.get("limite", [MAXIMO_PAGINA_API])[0]), 1), MAXIMO_PAGINA_API)
+    except ValueError:
+        raise ErrorAPI(400, "'desde' y 'limite' deben ser enteros.")
+    tablas = [t for t in ",".join(query.get("tablas", [])).split(",") if t]
+    if any(t not in TABLAS_CON_DIARIO for t in tablas):
+        raise ErrorAPI(400, f"tablas válidas: {', '.join(TABLAS_CON_DIARIO)}.")
+    filas = cambios_desde(con, desde, tablas, limite)
+    datos = [dict(zip(("version", "tabla", "clave", "operacion", "instante"), f)) for f in filas]
+    return {"datos": datos, "version": filas[-1][0] if filas else desde, "completo": len(filas) < limite}
+
+
+def _api_crear_equipo(con, usuario: dict, cuerpo: dict):
+    fila = _fila_equipo(cuerpo)
+    if fila is None:
+        raise ErrorAPI(422, "id_equipo y nombre son obligatorios.")
+    datos = dict(zip(("id_equipo",) + COLUMNAS_EQUIPO_IMPORTABLES, fila))
+    try:
+        insertar_equipo(con, datos, usuario["id"])
+    except sqlite3.IntegrityError:
+        raise ErrorAPI(409, f"El equipo '{datos['id_equipo']}' ya existe.")
+    return 201, _api_obtener(con, "equipos", datos["id_equipo"])
+
+
+def _api_crear_mantenimiento(con, usuario: dict, cuerpo: dict):
+    fila = _fila_mantenimiento({**cuerpo, "id_mantenimiento": nuevo_id_mantenimiento()})
+    if fila is None:
+        raise ErrorAPI(422, "equipo_id y una fecha válida (AAAA-MM-DD o DD-MM-AAAA) son obligatorios.")
+    datos = dict(zip(("id_mantenimiento", "equipo_id", "fecha", "tipo", "notas", "estado", "proveedor", "costo"), fila))
+    datos["registrado_en"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        insertar_mantenimiento(con, datos, usuario["id"])
+    except sqlite3.IntegrityError:
+        raise ErrorAPI(409, f"El equipo '{datos['equipo_id']}' no existe.")
+    return 201, _api_obtener(con, "mantenimientos", datos["id_mantenimiento"])
+
+
+def atender_api(con, usuario: dict, metodo: str, partes: list, query: dict, cuerpo=None):
+    """Enruta una petición ya autenticada. Devuelve (código HTTP, dict JSON).
+
+    GET  /<recurso>[?limite=&despues=]        equipos | mantenimientos | historicos
+    GET  /<recurso>/<id>
+    GET  /cambios?desde=N[&tablas=&limite=]   diario de cambios posterior a la versión N
+    POST /equipos                             crea un equipo
+    POST /mantenimientos                      crea un mantenimiento (el anterior pasa a históricos)
+    POST /mantenimientos/<id>/estado          {"estado": "Pendiente" | "Completado"}
+    POST /historicos/archivar                 {"antes_de": "AAAA-MM-DD"} mueve Completados antiguos
+    """
+    if metodo == "GET" and partes == ["cambios"]:
+        return 200, _api_cambios(con, query)
+    if not partes or partes[0] not in RECURSOS_API:
+        raise ErrorAPI(404, "Recurso no encontrado.")
+    recurso = partes[0]
+    if metodo == "GET":
+        if len(partes) == 1:
+            return 200, _api_listar(con, recurso, query)
+        if len(partes) == 2:
+            return 200, _api_obtener(con, recurso, partes[1])
+        raise ErrorAPI(404, "Ruta no encontrada.")
+
+    cuerpo = cuerpo or {}
+    if partes == ["equipos"]:
+        return _api_crear_equipo(con, usuario, cuerpo)
+    if partes == ["mantenimientos"]:
+        return _api_crear_mantenimiento(con, usuario, cuerpo)
+    if recurso == "mantenimientos" and len(partes) == 3 and partes[2] == "estado":
+        estado = cuerpo.get("estado")
+        if estado not in ("Pendiente", "Completado"):
+            raise ErrorAPI(422, "estado debe ser 'Pendiente' o 'Completado'.")
+        if not cambiar_estado_mantenimiento(con, partes[1], estado):
+            raise ErrorAPI(404, f"No existe mantenimiento '{partes[1]}'.")
+        return 200, _api_obtener(con, "mantenimientos", partes[1])
+    if partes == ["historicos", "archivar"]:
+        antes_de = _fecha_celda(cuerpo.get("antes_de"))
+        if not antes_de:
+            raise ErrorAPI(422, "antes_de debe ser una fecha válida.")
+        return 200, {"antes_de": antes_de, "archivados": archivar_mantenimientos(con, antes_de)}
+    raise ErrorAPI(405, "Método no permitido en esta ruta.")
+
+
+class ManejadorAPI(http.server.BaseHTTPRequestHandler):
+    """Traduce HTTP <-> atender_api. Autenticación Basic contra `usuarios` (verificar_usuario)."""
+    server_version = "MantenimientosAPI/1.0"
+
+    def log_message(self, formato, *args):
+        logging.info("API %s - %s", self.address_string(), formato % args)
+
+    def do_GET(self):
+        self._despachar("GET")
+
+    def do_POST(self):
+        self._despachar("POST")
+
+    def _autenticar(self, con):
+        cabecera = self.headers.get("Authorization", "")
+        if not cabecera.startswith("Basic "):
+            return None
+        try:
+            usuario, _, contrasena = base64.b64decode(cabecera[6:]).decode("utf-8").partition(":")
+        except (ValueError, UnicodeDecodeError):
+            return None
+        return verificar_usuario(con, usuario, contrasena)
+
+    def _despachar(self, metodo: str):
+        con = self.server.conexion()
+        usuario = self._autenticar(con)
+        if not usuario:
+            self._responder(401, {"error": "Credenciales inválidas."},
+                            {"WWW-Authenticate": 'Basic realm="mantenimientos"'})
+            return
+        url = urlsplit(self.path)
+        partes = [unquote(p) for p in url.path.split("/") if p]
+        try:
+            cuerpo = None
+            if metodo == "POST":
+                try:
+                    largo = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    raise ErrorAPI(400, "Content-Length inválido.") from None
+                if largo < 0:   # rfile.read(-1) esperaría a que el cliente cierre la conexión
+                    raise ErrorAPI(400, "Content-Length inválido.")
+                cuerpo = json.loads(self.rfile.read(largo) or b"{}")
+                if not isinstance(cuerpo, dict):
+                    raise ErrorAPI(400, "El cuerpo debe ser un objeto JSON.")
+            codigo, respuesta = atender_api(con, usuario, metodo, partes, parse_qs(url.query), cuerpo)
+        except ErrorAPI as e:
+            codigo, respuesta = e.codigo, {"error": e.mensaje}
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            codigo, respuesta = 400, {"error": "JSON inválido."}
+        except ValueError as e:   # datos que la capa de BD rechaza
+            codigo, respuesta = 422, {"error": str(e)}
+        except sqlite3.OperationalError as e:
+            codigo, respuesta = 503, {"error": f"Base de datos ocupada: {e}"}
+        self._responder(codigo, respuesta)
+
+    def _responder(self, codigo: int, cuerpo: dict, cabeceras=None):
+        datos = json.dumps(cuerpo, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        for k, v in (cabeceras or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(datos)
+
+
+class ServidorAPI(http.server.HTTPServer):
+    """Servidor HTTP con un grupo fijo de hilos; cada hilo usa su propia conexión SQLite."""
+    def __init__(self, direccion, archivo_bd=ARCHIVO_BD, trabajadores=TRABAJADORES_API):
+        super().__init__(direccion, ManejadorAPI)
+        self.archivo_bd = archivo_bd
+        self._local = threading.local()
+        self._conexiones = []
+        self._candado = threading.Lock()
+        self._grupo = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="api")
+
+    def conexion(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = abrir_conexion(self.archivo_bd, check_same_thread=False)
+            with self._candado:
+                self._conexiones.append(con)
+        return con
+
+    def process_request(self, request, client_address):
+        self._grupo.submit(self._procesar, request, client_address)
+
+    def _procesar(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._grupo.shutdown(wait=True)
+        for con in self._conexiones:
+            cerrar_conexion(con)
+
+
+def _percentil(ordenados: list, p: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)]
+
+
+def prueba_carga_api(solicitudes=2000, concurrencia=8, trabajadores=TRABAJADORES_API, equipos=1000) -> dict:
+    """Levanta el servicio sobre una BD temporal y mide peticiones por segundo.
+
+    Mezcla: 60 % listados, 30 % consultas por ID y 10 % cambios de estado.
+    """
+    carpeta = tempfile.mkdtemp(prefix="api-carga-")
+    archivo = os.path.join(carpeta, "carga.db")
+    try:
+        con = iniciar_bd(archivo)
+        importar_equipos(con, ({"id_equipo": f"EQ-{i:05d}", "nombre": f"Equipo {i}", "ubicacion": f"Lab {i % 20}"}
+                               for i in range(equipos)))
+        with con:
+            con.executemany("""
+                INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, estado)
+                VALUES(?, ?, '2025-01-15', 'Preventivo', 'Pendiente')
+            """, [(f"M-{i:05d}", f"EQ-{i:05d}") for i in range(equipos)])
+        con.close()
+
+        servidor = ServidorAPI(("127.0.0.1", 0), archivo, trabajadores)
+        hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+        hilo.start()
+        puerto = servidor.server_address[1]
+        auth = {"Authorization": "Basic " + base64.b64encode(b"Admin:1234").decode()}
+        latencias, errores = [], []
+
+        def cliente(n_peticiones: int, semilla: int):
+            propias = []
+            for k in range(n_peticiones):
+                i = (semilla * 7919 + k * 104729) % equipos
+                ruta, metodo, cuerpo = f"/equipos?limite=50&despues=EQ-{i:05d}", "GET", None
+                if k % 10 >= 6:
+                    ruta = f"/mantenimientos/M-{i:05d}"
+                if k % 10 == 9:
+                    ruta, metodo = f"/mantenimientos/M-{i:05d}/estado", "POST"
+                    cuerpo = json.dumps({"estado": "Completado" if k % 20 else "Pendiente"})
+                t0 = time.perf_counter()
+                cx = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+                cx.request(metodo, ruta, body=cuerpo, headers={**auth, "Content-Type": "application/json"})
+                resp = cx.getresponse()
+                resp.read()
+                cx.close()
+                propias.append(time.perf_counter() - t0)
+                if resp.status >= 400:
+                    errores.append(resp.status)
+            latencias.extend(propias)
+
+        por_cliente = max(solicitudes // concurrencia, 1)
+        t0 = time.perf_counter()
+        try:
+            hilos = [threading.Thread(target=cliente, args=(por_cliente, c)) for c in range(concurrencia)]
+            for h in hilos:
+                h.start()
+            for h in hilos:
+                h.join()
+            total = time.perf_counter() - t0
+        finally:
+            servidor.shutdown()
+            servidor.server_close()
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    latencias.sort()
+    return {
+        "solicitudes": len(latencias),
+        "concurrencia": concurrencia,
+        "trabajadores": trabajadores,
+        "segundos": round(total, 3),
+        "solicitudes_por_segundo": round(len(latencias) / total, 1) if total else 0.0,
+        "latencia_ms": {p: round(_percentil(latencias, q) * 1000, 2)
+                        for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "errores": len(errores),
+    }
+
+
+# ============================================================
+# 12) LÍNEA DE COMANDOS (SIN INTERFAZ, PARA CRON / PROGRAMADOR DE TAREAS)
+# ============================================================
+SALIDA_OK = 0
+SALIDA_ERROR = 1
+SALIDA_USO = 2        # argumentos inválidos (argparse)
+SALIDA_ALERTA = 3     # `alertas`: hay avisos activos hoy
+
+# Con `--bd` inexistente solo estos comandos crean la BD; los demás fallan (un --bd mal escrito no
+# debe dejar una BD nueva con datos de ejemplo). Los de prueba/medición trabajan en su BD temporal.
+COMANDOS_QUE_CREAN_BD = ("importar", "importar-carpeta", "restaurar")
+COMANDOS_SIN_BD = ("prueba-api", "prueba-contencion", "medir-cache", "medir-claves", "verificar-consultas")
+
+
+def _id_usuario_cli(con, nombre):
+    if not nombre:
+        return None
+    fila = con.execute("SELECT id FROM usuarios WHERE usuario=?", (nombre,)).fetchone()
+    if not fila:
+        raise ValueError(f"El usuario '{nombre}' no existe.")
+    return fila[0]
+
+
+def _cli_importar(con, args):
+    usuario_id = _id_usuario_cli(con, args.usuario)
+    if args.tabla == "equipos":
+        res = importar_equipos(con, leer_filas(args.archivo), usuario_id, actualizar=args.actualizar)
+    else:
+        res = importar_mantenimientos(con, leer_filas(args.archivo), usuario_id)
+    return SALIDA_OK, {"tabla": args.tabla, "archivo": args.archivo, **res}
+
+
+def _cli_importar_carpeta(con, args):
+    res = importar_carpeta(con, args.carpeta, args.tabla, _id_usuario_cli(con, args.usuario),
+                           actualizar=args.actualizar, procesos=args.procesos)
+    return (SALIDA_ERROR if any(r["error"] for r in res["archivos"]) else SALIDA_OK), res
+
+
+def _cli_exportar(con, args):
+    if args.delta:
+        return SALIDA_OK, exportar_delta(con, args.tabla, args.archivo, args.delta)
+    filas = exportar_tabla(con, args.tabla, args.archivo)
+    return SALIDA_OK, {"tabla": args.tabla, "archivo": args.archivo, "filas": filas}
+
+
+def _cli_alertas(con, args):
+    alertas = calcular_alertas(con, detallado=True)
+    return (SALIDA_ALERTA if alertas["mensajes"] else SALIDA_OK), alertas
+
+
+def _cli_archivar(con, args):
+    antes_de = args.antes_de or date.today().replace(day=1).strftime("%Y-%m-%d")
+    datetime.strptime(antes_de, "%Y-%m-%d")  # valida el formato
+    return SALIDA_OK, {"antes_de": antes_de, "archivados": archivar_mantenimientos(con, antes_de)}
+
+
+def _cli_respaldar(con, args):
+    if args.destino:
+        return SALIDA_OK, {"destino": respaldar_bd(con, args.destino)}
+    return SALIDA_OK, respaldo_rotativo(con, generaciones=args.generaciones)
+
+
+def _cli_restaurar(con, args):
+    if args.listar:
+        return SALIDA_OK, {"respaldos": listar_respaldos(con)}
+    origen = args.origen
+    if not origen:
+        respaldos = listar_respaldos(con)
+        if not respaldos:
+            raise FileNotFoundError(f"No hay respaldos en '{carpeta_respaldos(con)}'.")
+        origen = respaldos[0]
+    return SALIDA_OK, restaurar_bd(con, origen)
+
+
+def _cli_cambios(con, args):
+    filas = cambios_desde(con, args.desde, args.tabla, args.limite)
+    return SALIDA_OK, {
+        "desde": args.desde,
+        "version": filas[-1][0] if filas else args.desde,
+        "version_actual": version_actual(con),
+        "cambios": [dict(zip(("version", "tabla", "clave", "operacion", "instante"), f)) for f in filas],
+    }
+
+
+def _cli_generar(con, args):
+    periodo = args.periodo or siguiente_periodo()
+    return SALIDA_OK, generar_periodo(con, periodo, _id_usuario_cli(con, args.usuario))
+
+
+def _cli_servir(con, args):
+    servidor = ServidorAPI((args.host, args.puerto), args.bd, args.trabajadores)
+    print(json.dumps({"escuchando": f"http://{args.host}:{servidor.server_address[1]}"}), flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return SALIDA_OK, {"detenido": True}
+
+
+def _cli_prueba_api(con, args):
+    return SALIDA_OK, prueba_carga_api(args.solicitudes, args.concurrencia, args.trabajadores)
+
+
+def _cli_prueba_contencion(con, args):
+    return SALIDA_OK, prueba_contencion(args.procesos, args.operaciones, args.modos, args.esperas)
+
+
+def _cli_medir_claves(con, args):
+    return SALIDA_OK, medir_claves_enteras(args.filas, args.busquedas)
+
+
+def _cli_medir_cache(con, args):
+    return SALIDA_OK, medir_cache_equipos(args.equipos)
+
+
+def _cli_historial(con, args):
+    lotes = linea_de_tiempo(con, args.equipo)
+    resumen = next(lotes)
+    return SALIDA_OK, {"equipo": args.equipo, **resumen, "linea": [fila for pagina in lotes for fila in pagina]}
+
+
+def _cli_carga(con, args):
+    try:
+        anio, mes = (int(p) for p in args.mes.split("-")) if args.mes else (date.today().year, date.today().month)
+        inicio, _fin = rango_periodo(anio, mes)
+    except ValueError:
+        raise ValueError("El mes debe tener la forma AAAA-MM.") from None
+    conteos = conteo_por_dia(con, anio, mes)
+    return SALIDA_OK, {"mes": inicio[:7], "total": sum(conteos.values()),
+                       "dias": {f"{inicio[:8]}{dia:02d}": n for dia, n in sorted(conteos.items())}}
+
+
+def _cli_adjuntar(con, args):
+    id_adjunto = agregar_adjunto(con, args.archivo, args.equipo, args.mantenimiento, _id_usuario_cli(con, args.usuario))
+    return SALIDA_OK, obtener_adjunto(con, id_adjunto)
+
+
+def _cli_adjuntos(con, args):
+    if args.limpiar:
+        return SALIDA_OK, limpiar_adjuntos(con)
+    if not (args.equipo or args.mantenimiento):
+        raise ValueError("Indica --equipo, --mantenimiento o --limpiar.")
+    filas = listar_adjuntos(con, args.equipo, args.mantenimiento)
+    return SALIDA_OK, {"adjuntos": [dict(zip(COLUMNAS_ADJUNTO, f)) for f in filas]}
+
+
+def _cli_federacion(con, args):
+    if args.agregar:
+        return SALIDA_OK, {"labs": configurar_lab(con, args.agregar[0], args.agregar[1])}
+    if args.quitar:
+        return SALIDA_OK, {"labs": configurar_lab(con, args.quitar)}
+    return SALIDA_OK, {"labs": labs_federados(con)}
+
+
+def _cli_campus(con, args):
+    federada, esquemas = abrir_federacion(labs_federados(con))
+    try:
+        if args.sql:
+            return SALIDA_OK, consulta_federada(federada, args.sql)
+        return SALIDA_OK, reporte_federado(federada, esquemas, args.reporte, args.anio)
+    finally:
+        federada.close()
+
+
+def _cli_replica(con, args):
+    return SALIDA_OK, crear_replica(con, args.destino)
+
+
+def _cli_sincronizar(con, args):
+    if not os.path.exists(args.otra):
+        raise FileNotFoundError(f"No existe la base de datos '{args.otra}'.")
+    return SALIDA_OK, sincronizar(con, args.otra)
+
+
+def _cli_mantener_bd(con, args):
+    return SALIDA_OK, mantener_bd(con, args.paginas, compactar=True, analizar=args.analizar)
+
+
+def _cli_verificar_consultas(con, args):
+    res = verificar_consultas(args.equipos, args.holgura)
+    return (SALIDA_ERROR if res["fallas"] else SALIDA_OK), res
+
+
+def crear_parser_cli() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="mantenimientos",
+        description="Control de Mantenimientos sin interfaz gráfica. La salida es JSON."
+    )
+    parser.add_argument("--bd", default=ARCHIVO_BD, help=f"archivo SQLite (por defecto {ARCHIVO_BD}); debe existir salvo al importar o restaurar")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("importar", help="importa equipos o mantenimientos desde Excel/CSV")
+    p.add_argument("tabla", choices=["equipos", "mantenimientos"])
+    p.add_argument("archivo")
+    p.add_argument("--actualizar", action="store_true", help="equipos: actualiza también los IDs existentes")
+    p.add_argument("--usuario", help="nombre de usuario que queda como 'creado_por'")
+    p.set_defaults(funcion=_cli_importar)
+
+    p = sub.add_parser("importar-carpeta",
+                       help="importa todos los Excel/CSV de una carpeta (código 1 si alguno no se pudo leer)")
+    p.add_argument("tabla", choices=["equipos", "mantenimientos"])
+    p.add_argument("carpeta")
+    p.add_argument("--actualizar", action="store_true", help="equipos: actualiza también los IDs existentes")
+    p.add_argument("--usuario", help="nombre de usuario que queda como 'creado_por'")
+    p.add_argument("--procesos", type=int, help="procesos para leer archivos (por defecto uno por núcleo)")
+    p.set_defaults(funcion=_cli_importar_carpeta)
+
+    p = sub.add_parser("exportar", help="exporta una tabla a .xlsx o .csv")
+    p.add_argument("tabla", choices=sorted(CONSULTAS_EXPORTACION))
+    p.add_argument("archivo")
+    p.add_argument("--delta", metavar="DESTINO",
+                   help="solo lo cambiado desde la última exportación a DESTINO (altas, ediciones y bajas)")
+    p.set_defaults(funcion=_cli_exportar)
+
+    p = sub.add_parser("alertas", help=f"revisa las alertas del día (código {SALIDA_ALERTA} si hay avisos)")
+    p.set_defaults(funcion=_cli_alertas)
+
+    p = sub.add_parser("archivar", help="mueve a históricos los mantenimientos Completados antiguos")
+    p.add_argument("--antes-de", help="fecha AAAA-MM-DD (por defecto, el día 1 del mes actual)")
+    p.set_defaults(funcion=_cli_archivar)
+
+    p = sub.add_parser("respaldar", help="copia en caliente y verificada de la base de datos")
+    p.add_argument("--destino", help="archivo destino (por defecto una generación nueva en respaldos/)")
+    p.add_argument("--generaciones", type=int, help="generaciones a conservar (por defecto el ajuste respaldo_generaciones)")
+    p.set_defaults(funcion=_cli_respaldar)
+
+    p = sub.add_parser("restaurar", help="reemplaza la base de datos por un respaldo verificado")
+    p.add_argument("origen", nargs="?", help="archivo de respaldo (por defecto la generación más reciente)")
+    p.add_argument("--listar", action="store_true", help="solo lista las generaciones disponibles")
+    p.set_defaults(funcion=_cli_restaurar)
+
+    p = sub.add_parser("generar", help="crea las órdenes Pendientes que deben los planes en un periodo (idempotente)")
+    p.add_argument("--periodo", help="AAAA-MM (por defecto el mes siguiente)")
+    p.add_argument("--usuario", help="nombre de usuario que queda como 'creado_por'")
+    p.set_defaults(funcion=_cli_generar)
+
+    p = sub.add_parser("cambios", help="diario de cambios posterior a una versión")
+    p.add_argument("--desde", type=int, default=0, help="última versión ya procesada (por defecto 0)")
+    p.add_argument("--tabla", action="append", choices=sorted(TABLAS_CON_DIARIO), help="repetible; por defecto todas")
+    p.add_argument("--limite", type=int, default=LIMITE_CAMBIOS)
+    p.set_defaults(funcion=_cli_cambios)
+
+    p = sub.add_parser("servir", help="servicio HTTP local con API JSON (Ctrl+C para detener)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--puerto", type=int, default=PUERTO_API)
+    p.add_argument("--trabajadores", type=int, default=TRABAJADORES_API)
+    p.set_defaults(funcion=_cli_servir)
+
+    p = sub.add_parser("prueba-api", help="prueba de carga del servicio HTTP sobre una BD temporal")
+    p.add_argument("--solicitudes", type=int, default=2000)
+    p.add_argument("--concurrencia", type=int, default=8)
+    p.add_argument("--trabajadores", type=int, default=TRABAJADORES_API)
+    p.set_defaults(funcion=_cli_prueba_api)
+
+    p = sub.add_parser("prueba-contencion",
+                       help="varios procesos escribiendo en la misma BD temporal, por modo de diario y busy_timeout")
+    p.add_argument("--procesos", type=int, default=4)
+    p.add_argument("--operaciones", type=int, default=300, help="operaciones por proceso")
+    p.add_argument("--modos", nargs="+", default=list(MODOS_DIARIO_CONTENCION),
+                   choices=["delete", "truncate", "persist", "wal"])
+    p.add_argument("--esperas", nargs="+", type=int, default=list(ESPERAS_CONTENCION_MS), metavar="MS",
+                   help="valores de busy_timeout en milisegundos")
+    p.set_defaults(funcion=_cli_prueba_contencion)
+
+    p = sub.add_parser("medir-cache", help="memoria y tiempos de la caché de equipos sobre una BD temporal")
+    p.add_argument("--equipos", type=int, default=100_000)
+    p.set_defaults(funcion=_cli_medir_cache)
+
+    p = sub.add_parser("medir-claves", help="índices y búsquedas con clave de texto frente a clave entera (BD temporal)")
+    p.add_argument("--filas", type=int, default=200_000)
+    p.add_argument("--busquedas", type=int, default=20_000)
+    p.set_defaults(funcion=_cli_medir_claves)
+
+    p = sub.add_parser("historial", help="línea de tiempo de un equipo (vigentes + históricos) con acumulados")
+    p.add_argument("equipo", help="ID del equipo")
+    p.set_defaults(funcion=_cli_historial)
+
+    p = sub.add_parser("carga", help="mantenimientos programados por día de un mes")
+    p.add_argument("--mes", help="AAAA-MM (por defecto el actual)")
+    p.set_defaults(funcion=_cli_carga)
+
+    p = sub.add_parser("adjuntar", help="guarda un archivo como adjunto de un equipo o mantenimiento")
+    p.add_argument("archivo")
+    destino = p.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--equipo", help="ID del equipo")
+    destino.add_argument("--mantenimiento", help="ID del mantenimiento (vigente o en históricos)")
+    p.add_argument("--usuario", help="nombre de usuario que queda como 'agregado_por'")
+    p.set_defaults(funcion=_cli_adjuntar)
+
+    p = sub.add_parser("adjuntos", help="lista los adjuntos o borra del disco los contenidos huérfanos")
+    p.add_argument("--equipo", help="todos los del equipo (incluye los de sus mantenimientos)")
+    p.add_argument("--mantenimiento")
+    p.add_argument("--limpiar", action="store_true", help="borra contenidos que ningún adjunto usa")
+    p.set_defaults(funcion=_cli_adjuntos)
+
+    p = sub.add_parser("federacion", help="laboratorios (otras BD) que forman la federación del campus")
+    p.add_argument("--agregar", nargs=2, metavar=("LAB", "ARCHIVO"))
+    p.add_argument("--quitar", metavar="LAB")
+    p.set_defaults(funcion=_cli_federacion)
+
+    p = sub.add_parser("campus", help="reportes sobre todos los laboratorios de la federación (solo lectura)")
+    p.add_argument("reporte", nargs="?", choices=sorted(REPORTES_FEDERADOS), default="inventario")
+    p.add_argument("--anio", type=int, help="año de los reportes por periodo (por defecto el actual)")
+    p.add_argument("--sql", help="SELECT libre sobre fed_equipos, fed_mantenimientos y fed_historicos")
+    p.set_defaults(funcion=_cli_campus)
+
+    p = sub.add_parser("replica", help="copia de la BD para trabajar fuera de línea y luego sincronizar")
+    p.add_argument("destino")
+    p.set_defaults(funcion=_cli_replica)
+
+    p = sub.add_parser("sincronizar", help="intercambia con otra copia solo lo cambiado desde la última sincronización")
+    p.add_argument("otra", help="archivo de la otra copia (réplica o BD de la que se copió)")
+    p.set_defaults(funcion=_cli_sincronizar)
+
+    p = sub.add_parser("mantener-bd", help="ANALYZE si hace falta, migra a auto_vacuum incremental y libera páginas")
+    p.add_argument("--paginas", type=int, help="máximo de páginas a liberar (por defecto todas)")
+    p.add_argument("--analizar", action="store_true", help="ANALYZE aunque las estadísticas no estén viejas")
+    p.set_defaults(funcion=_cli_mantener_bd)
+
+    p = sub.add_parser("verificar-consultas",
+                       help="planes y tiempos de las consultas calientes sobre una BD temporal (código 1 si alguna falla)")
+    p.add_argument("--equipos", type=int, default=20_000,
+                   help="tamaño del conjunto sintético (5 mantenimientos y 5 históricos por equipo)")
+    p.add_argument("--holgura", type=float, default=1.0,
+                   help="multiplica los presupuestos (equipos lentos o conjuntos más grandes)")
+    p.set_defaults(funcion=_cli_verificar_consultas)
+    return parser
+
+
+def ejecutar_cli(argv) -> int:
+    """Ejecuta un comando sin Tk; imprime un JSON con 'ok' y devuelve el código de salida."""
+    args = crear_parser_cli().parse_args(argv)
+    con = None
+    try:
+        if args.comando not in COMANDOS_SIN_BD:
+            if args.comando not in COMANDOS_QUE_CREAN_BD and not os.path.isfile(args.bd):
+                raise FileNotFoundError(f"No existe la base de datos '{args.bd}'.")
+            con = iniciar_bd(args.bd)
+    except (sqlite3.Error, FileNotFoundError) as e:
+        print(json.dumps({"ok": False, "comando": args.comando, "error": str(e)}, ensure_ascii=False))
+        return SALIDA_ERROR
+    try:
+        codigo, datos = args.funcion(con, args)
+        print(json.dumps({"ok": True, "comando": args.comando, **datos}, ensure_ascii=False, default=str))
+        return codigo
+    except Exception as e:
+        logging.debug("Fallo en comando %s", args.comando, exc_info=True)
+        print(json.dumps({"ok": False, "comando": args.comando, "error": str(e)}, ensure_ascii=False))
+        return SALIDA_ERROR
+    finally:
+        if con is not None:
+            cerrar_conexion(con)
 
 
 # ============================================================
-# 11) ARRANQUE
+# 13) ARRANQUE
 # ============================================================
 def ejecutar_login(con):
     login = VentanaInicioSesion(con)
@@ -1594,5 +6217,8 @@ def ejecutar_login(con):
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(ejecutar_cli(sys.argv[1:]))
     conexion = iniciar_bd()
     ejecutar_login(conexion)
+    cerrar_conexion(conexion)
@@ -0,0 +1,18 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+RUTA_PROGRAMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Mantenimientos - respaldo.py")
+
+
+@pytest.fixture(scope="session")
+def app():
+    """El programa como módulo (su nombre de archivo no es importable directamente)."""
+    if "mantenimientos_app" not in sys.modules:
+        spec = importlib.util.spec_from_file_location("mantenimientos_app", RUTA_PROGRAMA)
+        modulo = importlib.util.module_from_spec(spec)
+        sys.modules["mantenimientos_app"] = modulo
+        spec.loader.exec_module(modulo)
+    return sys.modules["mantenimientos_app"]
@@ -0,0 +1,15 @@
+import json
+
+
+def test_bd_inexistente_falla_sin_crearla(app, tmp_path, capsys):
+    ruta = tmp_path / "mal-escrita.db"
+    assert app.ejecutar_cli(["--bd", str(ruta), "alertas"]) == app.SALIDA_ERROR
+    assert json.loads(capsys.readouterr().out)["ok"] is False
+    assert not ruta.exists()
+
+
+def test_bd_existente_se_usa(app, tmp_path, capsys):
+    ruta = tmp_path / "lab.db"
+    app.iniciar_bd(str(ruta)).close()
+    assert app.ejecutar_cli(["--bd", str(ruta), "cambios"]) == app.SALIDA_OK
+    assert json.loads(capsys.readouterr().out)["ok"] is True
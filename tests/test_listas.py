@@ -0,0 +1,33 @@
+import pytest
+
+
+@pytest.fixture
+def restaurada(app, tmp_path):
+    """BD restaurada a un respaldo anterior: (con, versión de equipos que mostraba una lista antes)."""
+    con = app.iniciar_bd(str(tmp_path / "lab.db"))
+    with con:
+        con.execute("INSERT INTO equipos(id_equipo, nombre) VALUES('E1', 'Centrífuga')")
+    respaldo = app.respaldar_bd(con, str(tmp_path / "respaldo.db"))
+    with con:
+        con.executemany("INSERT INTO equipos(id_equipo, nombre) VALUES(?, ?)", [("E2", "Balanza"), ("E3", "Horno")])
+        con.execute("UPDATE equipos SET nombre='Centrífuga 2' WHERE id_equipo='E1'")
+    mostrada = app.version_tabla(con, "equipos")
+    app.cache_equipos(con).lista(con)
+    app.restaurar_bd(con, respaldo)
+    yield con, mostrada
+    con.close()
+
+
+def test_delta_tras_restaurar_pide_recarga_completa(app, restaurada):
+    con, mostrada = restaurada
+    version, filas, borrados = app.delta_lista(con, "equipos", mostrada)
+    assert version < mostrada
+    assert filas is None and borrados is None
+
+
+def test_delta_de_la_cache_tras_restaurar_pide_recarga_completa(app, restaurada):
+    con, mostrada = restaurada
+    version, filas, borrados = app.cache_equipos(con).delta(con, mostrada)
+    assert version < mostrada
+    assert filas is None and borrados is None
+    assert [f[0] for f in app.cache_equipos(con).lista(con)[1]] == ["E1"]
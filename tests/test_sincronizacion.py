@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+
+def _replicas(app, tmp_path):
+    """BD con un mantenimiento Completado antiguo (M1) y una réplica recién hecha de ella."""
+    a = app.iniciar_bd(str(tmp_path / "a.db"))
+    with a:
+        a.execute("INSERT INTO equipos(id_equipo, nombre) VALUES('E1', 'Microscopio')")
+        a.execute("INSERT INTO mantenimientos(id_mantenimiento, equipo_id, fecha, tipo, estado) "
+                  "VALUES('M1', 'E1', '2020-01-10', 'Preventivo', 'Completado')")
+    b_ruta = str(tmp_path / "b.db")
+    app.crear_replica(a, b_ruta)
+    return a, b_ruta
+
+
+def _estado(app, ruta):
+    con = app.abrir_conexion(ruta)
+    try:
+        return (con.execute("SELECT id_mantenimiento, estado, notas FROM mantenimientos ORDER BY 1").fetchall(),
+                con.execute("SELECT id_mantenimiento, estado, notas FROM historicos ORDER BY 1").fetchall())
+    finally:
+        con.close()
+
+
+def _editar(app, ruta, notas):
+    con = app.abrir_conexion(ruta)
+    with con:
+        con.execute("UPDATE mantenimientos SET notas=? WHERE id_mantenimiento='M1'", (notas,))
+    con.close()
+
+
+@pytest.mark.parametrize("archiva_despues", [False, True])
+def test_archivar_contra_edicion_decide_el_mantenimiento_completo(app, tmp_path, archiva_despues):
+    a, b_ruta = _replicas(app, tmp_path)
+    if archiva_despues:
+        _editar(app, b_ruta, "editado en b")
+        time.sleep(0.01)
+        assert app.archivar_mantenimientos(a, "2021-01-01") == 1
+    else:
+        assert app.archivar_mantenimientos(a, "2021-01-01") == 1
+        time.sleep(0.01)
+        _editar(app, b_ruta, "editado en b")
+
+    informe = app.sincronizar(a, b_ruta)
+    a.commit()
+
+    vigentes, historicos = _estado(app, app.ruta_bd(a))
+    assert (vigentes, historicos) == _estado(app, b_ruta)
+    if archiva_despues:   # gana el archivado: M1 solo en históricos
+        assert vigentes == [] and [h[0] for h in historicos] == ["M1"]
+    else:                 # gana la edición: M1 sigue vigente y el histórico se descarta
+        assert vigentes == [("M1", "Completado", "editado en b")] and historicos == []
+    assert {c["tabla"] for c in informe["conflictos"]} == {"mantenimientos", "historicos"}
+    assert len({c["gana"] for c in informe["conflictos"]}) == 1
+    assert all(sum(v.values()) == 0 for v in app.sincronizar(a, b_ruta)["tablas"].values())
+    a.close()